@@ -0,0 +1,246 @@
+"""
+Offline benchmark of the parsing path: page parsing, summary extraction,
+history table extraction and unit conversion over the fixture corpus.
+Memory is the peak RSS a stage adds, measured in a separate process per stage.
+
+    python -m benchmarks.bench_parser                      # run and print the report
+    python -m benchmarks.bench_parser --save-baseline      # store the results as baseline
+    python -m benchmarks.bench_parser --compare            # fail on regressions against the baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import lxml.html as lh
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks import fixtures
+from util.Parser import Parser
+from util.JsonHistory import JsonHistory
+from util.UnitConverter import ConvertToSystem
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+# ru_maxrss is in kilobytes, except on macOS
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def stages(kind, date_string, content, converter):
+    """
+    Returns [(stage name, function)] for a page, each function returns the
+    number of rows it produced. Later stages reuse the output of earlier ones.
+    """
+    if kind == 'json':
+        return json_stages(content, converter)
+    doc = Parser.parse_page(content)
+    rows = Parser.parse_html_table(date_string, [doc]) if kind == 'daily' else []
+
+    def full_parse():
+        lh.fromstring(content)
+        return 0
+
+    def parse_page():
+        Parser.parse_page(content)
+        return 0
+
+    def parse_summary_table():
+        Parser.parse_summary_table(doc)
+        return 0
+
+    def parse_html_table():
+        return len(Parser.parse_html_table(date_string, [doc]))
+
+    def clean_and_convert():
+        return len(converter.clean_and_convert(rows))
+
+    def iter_html_table():
+        return sum(1 for _ in Parser.iter_html_table(date_string, [doc]))
+
+    def convert_records():
+        # streaming path of ParsePool.parse_day: records straight into columns
+        columns = converter.convert_columns(converter.columns_from_rows(Parser.iter_html_table(date_string, [doc])))
+        return len(columns.get('Time', ()))
+
+    def parse_range_table():
+        return len(Parser.parse_html_table(date_string, [doc], period=kind))
+
+    result = [full_parse, parse_page, parse_summary_table]
+    if kind == 'daily':
+        result += [parse_html_table, clean_and_convert, iter_html_table, convert_records]
+    else:
+        result += [parse_range_table]
+    return [(function.__name__, function) for function in result]
+
+
+def json_stages(content, converter):
+    """The stages of the JSON source: decoding, daily summary, rows and conversion."""
+    observations = JsonHistory.parse(content)
+    rows = JsonHistory.rows(observations)
+
+    def json_parse():
+        return len(JsonHistory.parse(content))
+
+    def json_summary():
+        JsonHistory.summary(observations)
+        return 0
+
+    def json_rows():
+        return len(JsonHistory.rows(observations))
+
+    def clean_and_convert():
+        return len(converter.clean_and_convert(rows))
+
+    return [(function.__name__, function) for function in (json_parse, json_summary, json_rows, clean_and_convert)]
+
+
+def measure(function, min_time):
+    """Runs function for at least min_time seconds, returns (runs, seconds, rows per run)."""
+    rows = function()
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+    return runs, elapsed, rows
+
+
+def peak_rss(key):
+    """
+    Peak RSS in bytes of a fresh interpreter that renders the page of key ('page/stage'),
+    builds the inputs of its stages and runs the stage once ('page/setup' runs none).
+    Unlike tracemalloc this includes libxml2's own allocations.
+    Returns None where the resource module is missing.
+    """
+    if resource is None:
+        return None
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_parser', '--rss-stage', key],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f'Error measuring the RSS of {key}: {result.stderr.strip()}')
+        return None
+    return int(result.stdout)
+
+
+def rss_stage(key):
+    """
+    Child side of peak_rss. The work runs in a forked grandchild: an exec'd child
+    inherits the peak RSS of the benchmark process, a fork of this fresh interpreter
+    starts from its small current size.
+    """
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            name, stage = key.split('/')
+            (_, kind, date_string, content), = fixtures.corpus([name])
+            functions = dict(stages(kind, date_string, content, ConvertToSystem('metric')))
+            if stage != 'setup':
+                functions[stage]()
+            status = 0
+        finally:
+            os._exit(status)
+    _, status = os.waitpid(pid, 0)
+    if status != 0:
+        raise SystemExit(f'measuring {key} failed')
+    print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * RSS_UNIT)
+
+
+def run(min_time, only=None):
+    converter = ConvertToSystem('metric')
+    results = {}
+    for name, kind, date_string, content in fixtures.corpus():
+        if only and only not in name:
+            continue
+        # the stages share the page and its parsed inputs, the setup process holds just those
+        setup_rss = peak_rss(f'{name}/setup')
+        for stage, function in stages(kind, date_string, content, converter):
+            runs, elapsed, rows = measure(function, min_time)
+            rss = peak_rss(f'{name}/{stage}')
+            results[f'{name}/{stage}'] = {
+                'page_bytes': len(content),
+                'pages_per_sec': round(runs / elapsed, 2),
+                'rows_per_sec': round(rows * runs / elapsed, 2),
+                # peak RSS the stage adds to the setup process
+                'rss_stage_kb': round(max(0, rss - setup_rss) / 1024, 1) if rss and setup_rss else None,
+            }
+    return results
+
+
+def print_report(results, baseline=None):
+    print(f'{"page/stage":<42}{"KB":>8}{"pages/s":>12}{"rows/s":>12}{"RSS +KB":>12}{"vs base":>9}')
+    for key, result in results.items():
+        change = ''
+        if baseline and key in baseline:
+            change = f'{result["pages_per_sec"] / baseline[key]["pages_per_sec"] - 1:+.0%}'
+        rss = result.get('rss_stage_kb')
+        print(f'{key:<42}{result["page_bytes"] / 1024:>8.0f}{result["pages_per_sec"]:>12.1f}'
+              f'{result["rows_per_sec"]:>12.0f}{"-" if rss is None else rss:>12}{change:>9}')
+
+
+def regressions(results, baseline, tolerance):
+    """Returns the keys whose throughput dropped more than tolerance below the baseline."""
+    slower = []
+    for key, result in results.items():
+        if key in baseline and result['pages_per_sec'] < baseline[key]['pages_per_sec'] * (1 - tolerance):
+            slower.append(key)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent per page and stage')
+    parser.add_argument('--only', help='only pages whose name contains this string')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results to the baseline file')
+    parser.add_argument('--compare', action='store_true', help='exit with 1 when a stage regressed')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before --compare fails')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--rss-stage', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rss_stage:
+        rss_stage(args.rss_stage)
+        return 0
+
+    results = run(args.min_time, args.only)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f'Baseline written to {args.baseline}')
+
+    if args.compare:
+        if baseline is None:
+            print(f'No baseline at {args.baseline}, run with --save-baseline first')
+            return 1
+        slower = regressions(results, baseline, args.tolerance)
+        for key in slower:
+            print(f'REGRESSION {key}: {results[key]["pages_per_sec"]} pages/s, '
+                  f'baseline {baseline[key]["pages_per_sec"]} pages/s')
+        if slower:
+            return 1
+        print(f'No regressions beyond {args.tolerance:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Wunderground-like history pages rendered from templates.
+
+The pages follow the markup the parsers rely on: a <lib-history> element holding the
+summary tables and the <lib-history-table> history table, surrounded by scripts and
+Angular markup. Saved real pages can be added to the corpus by dropping them in
+benchmarks/pages/ as daily_<name>.html or monthly_<name>.html, recorded PWS history
+API responses as json_<name>.json.
+"""
+import json
+import os
+import random
+from datetime import date, timedelta
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+DAILY_HEADERS = ['Time', 'Temperature', 'Dew Point', 'Humidity', 'Wind', 'Speed', 'Gust',
+                 'Pressure', 'Precip. Rate.', 'Precip. Accum.', 'UV', 'Solar']
+# (group header, unit, sub headers)
+MONTHLY_GROUPS = [
+    ('Temperature', '°F', ['High', 'Avg', 'Low']),
+    ('Dew Point', '°F', ['High', 'Avg', 'Low']),
+    ('Humidity', '%', ['High', 'Avg', 'Low']),
+    ('Speed', 'mph', ['High', 'Avg', 'Low']),
+    ('Gust', 'mph', ['High', 'Avg', 'Low']),
+    ('Pressure', 'in', ['High', 'Low']),
+    ('Precip. Accum.', 'in', ['Sum']),
+]
+WIND_DIRECTIONS = ['North', 'NNE', 'NE', 'ENE', 'East', 'ESE', 'SE', 'SSE',
+                   'South', 'SSW', 'SW', 'WSW', 'West', 'WNW', 'NW', 'NNW']
+
+
+def value(number, unit):
+    """A cell value the way Wunderground renders it."""
+    return (f'<lib-display-unit><span class="wu-value wu-value-to">{number}</span>'
+            f'<span class="wu-label">&nbsp;{unit}</span></lib-display-unit>')
+
+
+def padding(kilobytes):
+    """Scripts and Angular markup around the history component."""
+    blocks = []
+    size = 0
+    i = 0
+    while size < kilobytes * 1024:
+        block = (f'<script>window.__state{i} = {{"id": {i}, "payload": "{"x" * 400}"}};</script>'
+                 f'<div class="ng-tns-c{i}-0"><a href="/dashboard/{i}"><span>Link {i}</span></a>'
+                 + ''.join(f'<li class="ng-star-inserted"><span>item {j}</span></li>' for j in range(8))
+                 + '</div>')
+        blocks.append(block)
+        size += len(block)
+        i += 1
+    return ''.join(blocks)
+
+
+def page(summary_rows, table, padding_kb):
+    head = padding(padding_kb // 2)
+    tail = padding(padding_kb - padding_kb // 2)
+    summary = ''.join(
+        f'<tr><th><span>{label}</span></th>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>'
+        for label, cells in summary_rows)
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Weather History</title>' + head + '</head>'
+        '<body><app-root><div id="main-page-content"><div><div><div>'
+        '<lib-history><div><lib-history-summary><div class="summary-table">'
+        '<table><thead><tr><th></th><th>High</th><th>Low</th><th>Average</th></tr></thead>'
+        '<tbody>' + summary + '</tbody></table></div></lib-history-summary></div>'
+        '<div><lib-history-table><div><div><div>' + table + '</div></div></div></lib-history-table></div>'
+        '</lib-history></div></div></div></div></app-root>' + tail + '</body></html>'
+    ).encode('utf-8')
+
+
+def daily_page(rows=288, missing=0.0, short_rows=0, padding_kb=400, seed=0):
+    """
+    A daily page with `rows` 5-minute observations. `missing` is the share of empty
+    cells, `short_rows` the number of rows with a cell dropped entirely.
+    """
+    rng = random.Random(seed)
+    step = max(1, 1440 // max(1, rows))
+    body = []
+    temperatures, gusts = [], []
+    for i in range(rows):
+        minutes = i * step
+        hour, minute = divmod(minutes, 60)
+        clock = f'{hour % 12 or 12}:{minute:02d} {"AM" if hour < 12 else "PM"}'
+        temperature = round(60 + 15 * rng.random(), 1)
+        gust = round(20 * rng.random(), 1)
+        temperatures.append(temperature)
+        gusts.append(gust)
+        cells = [
+            f'<strong>{clock}</strong>',
+            value(temperature, '°F'),
+            value(round(temperature - 8, 1), '°F'),
+            value(rng.randint(40, 99), '%'),
+            rng.choice(WIND_DIRECTIONS),
+            value(round(gust / 2, 1), 'mph'),
+            value(gust, 'mph'),
+            value(round(29.8 + rng.random() / 2, 2), 'in'),
+            value(0.0, 'in'),
+            value(round(i * 0.001, 2), 'in'),
+            str(rng.randint(0, 9)),
+            value(rng.randint(0, 900), 'w/m²'),
+        ]
+        for j in range(1, len(cells)):
+            if rng.random() < missing:
+                cells[j] = ''
+        if i < short_rows:
+            cells.pop()
+        body.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+
+    table = ('<table class="history-table desktop-table"><thead><tr>'
+             + ''.join(f'<th>{header}</th>' for header in DAILY_HEADERS)
+             + '</tr></thead><tbody>' + ''.join(body) + '</tbody></table>')
+    summary_rows = [
+        ('Temperature', [value(max(temperatures or [0]), '°F'), value(min(temperatures or [0]), '°F'), value(68.0, '°F')]),
+        ('Dew Point', [value(60.0, '°F'), value(50.0, '°F'), value(55.0, '°F')]),
+        ('Humidity', [value(99, '%'), value(40, '%'), value(70, '%')]),
+        ('Precipitation', [value(round(rows * 0.001, 2), 'in'), '--', '--']),
+        ('Wind Speed', [value(10.0, 'mph'), value(0.0, 'mph'), value(4.0, 'mph')]),
+        ('Wind Gust', [value(max(gusts or [0]), 'mph'), value(0.0, 'mph'), value(5.0, 'mph')]),
+        ('Pressure', [value(30.2, 'in'), value(29.8, 'in'), '--']),
+    ]
+    return page(summary_rows, table, padding_kb)
+
+
+def monthly_page(start_date, days=31, missing=0.0, padding_kb=400, seed=0):
+    """A monthly page with one row of daily statistics per day from start_date."""
+    rng = random.Random(seed)
+    first_header = '<th>Date</th>' + ''.join(
+        f'<th colspan="{len(subs)}">{label}</th>' for label, _, subs in MONTHLY_GROUPS)
+    second_header = '<th></th>' + ''.join(
+        f'<th>{sub}</th>' for _, _, subs in MONTHLY_GROUPS for sub in subs)
+    body = []
+    for i in range(days):
+        day = start_date + timedelta(days=i)
+        cells = [f'{day.month}/{day.day}/{day.year}']
+        for label, unit, subs in MONTHLY_GROUPS:
+            high = round(50 + 40 * rng.random(), 1)
+            for n, sub in enumerate(subs):
+                cells.append(value(round(high - 5 * n, 1) if sub != 'Sum' else round(rng.random(), 2), unit))
+        for j in range(1, len(cells)):
+            if rng.random() < missing:
+                cells[j] = ''
+        body.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+
+    table = ('<table class="history-table desktop-table"><thead><tr>' + first_header + '</tr><tr>'
+             + second_header + '</tr></thead><tbody>' + ''.join(body) + '</tbody></table>')
+    summary_rows = [
+        ('Temperature', [value(90.0, '°F'), value(40.0, '°F'), value(65.0, '°F')]),
+        ('Precipitation', [value(3.2, 'in'), '--', '--']),
+        ('Wind Gust', [value(35.0, 'mph'), value(0.0, 'mph'), value(9.0, 'mph')]),
+    ]
+    return page(summary_rows, table, padding_kb)
+
+
+def history_json(date_string, rows=288, missing=0.0, seed=0):
+    """A day of observations the way the PWS history API (units=e) returns them."""
+    rng = random.Random(seed)
+    step = max(1, 1440 // max(1, rows))
+    observations = []
+    precip_total = 0.0
+    for i in range(rows):
+        hour, minute = divmod(i * step, 60)
+        temperature = round(60 + 15 * rng.random(), 1)
+        gust = round(20 * rng.random(), 1)
+        precip_total = round(precip_total + (0.01 if rng.random() < 0.05 else 0.0), 2)
+        imperial = {
+            'tempHigh': round(temperature + 0.4, 1), 'tempLow': round(temperature - 0.4, 1), 'tempAvg': temperature,
+            'dewptHigh': round(temperature - 8, 1), 'dewptLow': round(temperature - 9, 1), 'dewptAvg': round(temperature - 8.5, 1),
+            'windspeedHigh': round(gust / 2 + 1, 1), 'windspeedLow': 0.0, 'windspeedAvg': round(gust / 2, 1),
+            'windgustHigh': gust, 'windgustLow': 0.0, 'windgustAvg': round(gust / 2, 1),
+            'pressureMax': round(29.8 + rng.random() / 2, 2), 'pressureMin': 29.8, 'pressureTrend': 0.0,
+            'precipRate': 0.0, 'precipTotal': precip_total,
+            'heatindexHigh': temperature, 'heatindexLow': temperature, 'heatindexAvg': temperature,
+            'windchillHigh': temperature, 'windchillLow': temperature, 'windchillAvg': temperature,
+        }
+        for key in imperial:
+            if rng.random() < missing:
+                imperial[key] = None
+        observations.append({
+            'stationID': 'ISTANDIN', 'tz': 'America/New_York',
+            'obsTimeUtc': f'{date_string}T{hour:02d}:{minute:02d}:00Z',
+            'obsTimeLocal': f'{date_string} {hour:02d}:{minute:02d}:00',
+            'epoch': i * step * 60, 'lat': 0.0, 'lon': 0.0,
+            'solarRadiationHigh': rng.randint(0, 900), 'uvHigh': rng.randint(0, 9),
+            'winddirAvg': rng.randint(0, 359),
+            'humidityHigh': 99, 'humidityLow': 40, 'humidityAvg': rng.randint(40, 99),
+            'qcStatus': 1, 'imperial': imperial,
+        })
+    return json.dumps({'observations': observations}).encode('utf-8')
+
+
+def corpus(names=None):
+    """
+    Returns [(name, kind, date_string, content)] of the templated pages
+    plus the saved pages in benchmarks/pages/; names limits it to these pages
+    (and renders only them).
+    """
+    templates = [
+        ('daily_small', 'daily', '2024-01-15', lambda: daily_page(rows=48, padding_kb=50, seed=1)),
+        ('daily_medium', 'daily', '2024-01-15', lambda: daily_page(rows=288, padding_kb=400, seed=2)),
+        ('daily_large', 'daily', '2024-01-15', lambda: daily_page(rows=288, padding_kb=1500, seed=3)),
+        ('daily_missing', 'daily', '2024-01-15', lambda: daily_page(rows=288, missing=0.15, short_rows=10, seed=4)),
+        ('daily_empty', 'daily', '2024-01-15', lambda: daily_page(rows=0, padding_kb=400, seed=5)),
+        ('monthly', 'monthly', '2024-01-01', lambda: monthly_page(date(2024, 1, 1), days=31, seed=6)),
+        ('monthly_missing', 'monthly', '2024-01-01',
+         lambda: monthly_page(date(2024, 1, 1), days=31, missing=0.15, seed=7)),
+        ('history_json', 'json', '2024-01-15', lambda: history_json('2024-01-15', rows=288, seed=8)),
+    ]
+    pages = [(name, kind, date_string, render()) for name, kind, date_string, render in templates
+             if names is None or name in names]
+    if os.path.isdir(PAGES_DIR):
+        for filename in sorted(os.listdir(PAGES_DIR)):
+            name, extension = os.path.splitext(filename)
+            kind = name.split('_')[0]
+            if (extension, kind) not in (('.html', 'daily'), ('.html', 'monthly'), ('.json', 'json')):
+                continue
+            if names is not None and name not in names:
+                continue
+            with open(os.path.join(PAGES_DIR, filename), 'rb') as f:
+                # saved pages carry no date, rows are dated on an arbitrary day
+                pages.append((name, kind, '2024-01-15', f.read()))
+    return pages
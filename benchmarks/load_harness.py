@@ -0,0 +1,153 @@
+"""
+End-to-end load test of the weather_scraper pipeline against the local stand-in server:
+fetch, parse, aggregate, JSON write and git commit/push into a throwaway repository.
+
+    python -m benchmarks.load_harness --stations 50 --days 7 --workers 16 --latency 80 --rate-429 0.02
+
+Page cache, progress store and observation store are switched off so every day
+goes through the network path.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks.standin_server import StandinServer, add_arguments, config_from_args
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def git(cwd, *args):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True)
+
+
+def make_game_repo(root):
+    """Creates a weather-game clone with backend/data and a local bare remote."""
+    remote = os.path.join(root, 'remote.git')
+    repo = os.path.join(root, 'weather-game')
+    git(root, 'init', '--bare', '-q', remote)
+    git(root, 'clone', '-q', remote, repo)
+    git(repo, 'config', 'user.name', 'Load Harness')
+    git(repo, 'config', 'user.email', 'harness@localhost')
+    os.makedirs(os.path.join(repo, 'backend', 'data'))
+    with open(os.path.join(repo, 'README.md'), 'w') as f:
+        f.write('load harness\n')
+    git(repo, 'add', 'README.md')
+    git(repo, 'commit', '-q', '-m', 'init')
+    git(repo, 'push', '-q', '-u', 'origin', 'HEAD')
+    return repo
+
+
+def run(args):
+    # imported here so the scraper picks up the working directory of the harness
+    import weather_scraper
+    from util.GitHelper import GitHelper
+    from util.ParsePool import ParsePool
+    from util.Utils import Utils
+
+    server = StandinServer(('127.0.0.1', 0), config_from_args(args))
+    server.start()
+
+    root = tempfile.mkdtemp(prefix='weather-harness-')
+    try:
+        repo = make_game_repo(root)
+        end_date = date.today() - timedelta(days=1)
+        urls = [server.station_url(f'ILOAD{i:04d}') for i in range(args.stations)]
+
+        weather_scraper.START_DATE = end_date - timedelta(days=args.days - 1)
+        weather_scraper.END_DATE = end_date
+        weather_scraper.FIND_FIRST_DATE = False
+        weather_scraper.OUTPUT_DIR = os.path.join(repo, 'backend', 'data')
+        weather_scraper.DATE_WINDOW = args.window
+        weather_scraper.OBSERVATION_STORE = None
+        weather_scraper.PROGRESS_DB = None
+        weather_scraper.OBSERVATION_DB_PATH = None
+        weather_scraper.RESUME = False
+        weather_scraper.PARSE_POOL = ParsePool(args.parse_processes, args.parse_queue)
+        Utils.cache.enabled = False
+
+        # client side latency of every day: fetch, parse and extraction
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+        scrap_day = weather_scraper.scrap_day
+
+        def timed_scrap_day(*day_args, **day_kwargs):
+            start = time.perf_counter()
+            try:
+                return scrap_day(*day_args, **day_kwargs)
+            except Exception as e:
+                with lock:
+                    failures.append(type(e).__name__)
+                raise
+            finally:
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        weather_scraper.scrap_day = timed_scrap_day
+
+        start = time.perf_counter()
+        results = weather_scraper.scrap_stations(urls, max_workers=args.workers)
+        scrape_seconds = time.perf_counter() - start
+        json_files = weather_scraper.save_stations(results)
+        weather_scraper.PARSE_POOL.close()
+
+        created = [os.path.join('backend', 'data', os.path.basename(f)) for f in json_files]
+        start = time.perf_counter()
+        if not created:
+            pushed = False
+        elif args.git_publish == 'plumbing':
+            pushed = GitHelper.publish(repo, created, end_date)
+        else:
+            pushed = GitHelper.commit_and_push(repo, created, end_date)
+        git_seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    days = args.stations * args.days
+    print('\n' + '=' * 60)
+    print(f'stations x days      {args.stations} x {args.days} = {days}')
+    print(f'workers / window     {args.workers} / {args.window}')
+    print(f'parse processes      {args.parse_processes or "inline"}')
+    print(f'server responses     {dict(server.stats)}')
+    print(f'failed days          {len(failures)} {dict((name, failures.count(name)) for name in set(failures))}')
+    print(f'scrape time          {scrape_seconds:.2f} s ({days / scrape_seconds:.1f} days/s)')
+    print(f'day latency p50      {percentile(latencies, 0.50) * 1000:.0f} ms')
+    print(f'day latency p90      {percentile(latencies, 0.90) * 1000:.0f} ms')
+    print(f'day latency p99      {percentile(latencies, 0.99) * 1000:.0f} ms')
+    print(f'day latency max      {max(latencies or [0]) * 1000:.0f} ms')
+    print(f'JSON files           {len(created)}')
+    print(f'git commit + push    {git_seconds:.2f} s {args.git_publish} ({"ok" if pushed else "failed"})')
+    if args.keep:
+        print(f'work directory       {root}')
+    return 0 if pushed else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=8, help='stations scraped in parallel')
+    parser.add_argument('--window', type=int, default=8, help='dates fetched in parallel per station')
+    parser.add_argument('--parse-processes', type=int, default=0, help='parse processes (0 = parse in the fetching threads)')
+    parser.add_argument('--parse-queue', type=int, default=32, help='pages fetched but not yet parsed')
+    parser.add_argument('--git-publish', choices=('plumbing', 'porcelain'), default='plumbing')
+    parser.add_argument('--keep', action='store_true', help='keep the throwaway repositories')
+    add_arguments(parser)
+    return run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+"""
+Local stand-in for Wunderground's station history pages.
+
+Serves /dashboard/pws/{station}/table/{date}/{date}/daily and the
+/table/{start}/{end}/weekly|monthly range pages from the fixture templates, and
+/v2/pws/history/all?stationId={station}&date={YYYYMMDD} like the PWS history API, with configurable latency, jitter, error rates and truncated bodies.
+
+    python -m benchmarks.standin_server --port 8765 --latency 80 --jitter 40 --rate-429 0.02
+"""
+import argparse
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fixtures
+
+
+class StandinConfig:
+    def __init__(self, latency_ms=0, jitter_ms=0, rate_429=0.0, rate_5xx=0.0, rate_truncated=0.0,
+                 rows=288, padding_kb=400, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_truncated = rate_truncated
+        self.rows = rows
+        self.padding_kb = padding_kb
+        self.seed = seed
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    daily_pattern = re.compile(r'^/dashboard/pws/([^/]+)/table/(\d{4}-\d{2}-\d{2})/\2/daily/?$')
+    range_pattern = re.compile(r'^/dashboard/pws/([^/]+)/table/(\d{4}-\d{2}-\d{2})/(\d{4}-\d{2}-\d{2})/(weekly|monthly)/?$')
+
+    def __init__(self, address, config=None):
+        super().__init__(address, StandinHandler)
+        self.config = config or StandinConfig()
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.stats = Counter()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def json_api_url(self):
+        return f'{self.base_url}/v2/pws/history/all'
+
+    def station_url(self, station):
+        return f'{self.base_url}/dashboard/pws/{station}'
+
+    def page(self, station, date_string, end_string=None):
+        # pages only depend on the station and dates, the padding is shared between them
+        key = (station, date_string, end_string)
+        with self.lock:
+            content = self.pages.get(key)
+        if content is None:
+            seed = zlib.crc32(f'{station}/{date_string}/{end_string}'.encode())
+            if end_string is None:
+                content = fixtures.daily_page(rows=self.config.rows, padding_kb=self.config.padding_kb, seed=seed)
+            else:
+                start = datetime.strptime(date_string, '%Y-%m-%d').date()
+                days = (datetime.strptime(end_string, '%Y-%m-%d').date() - start).days + 1
+                content = fixtures.monthly_page(start, days=days, padding_kb=self.config.padding_kb, seed=seed)
+            with self.lock:
+                self.pages[key] = content
+        return content
+
+    def history_json(self, station, date_string):
+        key = ('json', station, date_string)
+        with self.lock:
+            content = self.pages.get(key)
+        if content is None:
+            seed = zlib.crc32(f'{station}/{date_string}/json'.encode())
+            content = fixtures.history_json(date_string, rows=self.config.rows, seed=seed)
+            with self.lock:
+                self.pages[key] = content
+        return content
+
+    def draw(self):
+        """Returns the fault to inject for the next request, or None."""
+        with self.lock:
+            roll = self.random.random()
+            delay = max(0.0, self.config.latency_ms + self.random.uniform(-1, 1) * self.config.jitter_ms) / 1000
+        config = self.config
+        for fault, rate in (('429', config.rate_429), ('5xx', config.rate_5xx), ('truncated', config.rate_truncated)):
+            if roll < rate:
+                return fault, delay
+            roll -= rate
+        return None, delay
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def start(self):
+        """Serves in a background thread, returns the thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        if path == '/v2/pws/history/all':
+            return self.history_json()
+        match = server.daily_pattern.match(path)
+        if match:
+            station, date_string = match.groups()
+            end_string = None
+        else:
+            match = server.range_pattern.match(path)
+            if not match:
+                server.count('404')
+                return self.reply(404, b'not found')
+            station, date_string, end_string, _ = match.groups()
+        try:
+            start = datetime.strptime(date_string, '%Y-%m-%d')
+            if end_string is not None and not timedelta(0) <= datetime.strptime(end_string, '%Y-%m-%d') - start <= timedelta(days=31):
+                raise ValueError(end_string)
+        except ValueError:
+            server.count('404')
+            return self.reply(404, b'not found')
+
+        fault, delay = server.draw()
+        time.sleep(delay)
+        if fault == '429':
+            server.count('429')
+            return self.reply(429, b'too many requests', {'Retry-After': '1'})
+        if fault == '5xx':
+            server.count('503')
+            return self.reply(503, b'service unavailable')
+
+        content = server.page(station, date_string, end_string)
+        if fault == 'truncated':
+            server.count('truncated')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content[:len(content) // 3])
+            self.close_connection = True
+            return
+        etag = f'"{zlib.crc32(content):08x}"'
+        if self.headers.get('If-None-Match') == etag:
+            server.count('304')
+            return self.reply(304, b'', {'ETag': etag})
+        server.count('200')
+        return self.reply(200, content, {'ETag': etag})
+
+    def history_json(self):
+        server = self.server
+        query = parse_qs(urlsplit(self.path).query)
+        station = query.get('stationId', [''])[0]
+        try:
+            day = datetime.strptime(query.get('date', [''])[0], '%Y%m%d')
+            if not station:
+                raise ValueError(station)
+        except ValueError:
+            server.count('400')
+            return self.reply(400, b'{"errors": [{"error": {"code": "CDN-0001"}}]}', content_type='application/json')
+
+        fault, delay = server.draw()
+        time.sleep(delay)
+        if fault == '429':
+            server.count('429')
+            return self.reply(429, b'too many requests', {'Retry-After': '1'})
+        if fault == '5xx':
+            server.count('503')
+            return self.reply(503, b'service unavailable')
+        if day.date() > datetime.now().date():
+            # the API answers days without observations with an empty 204
+            server.count('204')
+            return self.reply(204, b'')
+        server.count('200')
+        return self.reply(200, server.history_json(station, day.strftime('%Y-%m-%d')), content_type='application/json')
+
+    def reply(self, status, body, headers=None, content_type='text/html; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=50, help='mean response latency in ms')
+    parser.add_argument('--jitter', type=float, default=25, help='latency jitter in ms (uniform +/-)')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--rate-truncated', type=float, default=0.0, help='share of truncated bodies')
+    parser.add_argument('--rows', type=int, default=288, help='observation rows per daily page')
+    parser.add_argument('--padding-kb', type=int, default=400, help='markup around the history table')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def config_from_args(args):
+    return StandinConfig(latency_ms=args.latency, jitter_ms=args.jitter, rate_429=args.rate_429,
+                         rate_5xx=args.rate_5xx, rate_truncated=args.rate_truncated,
+                         rows=args.rows, padding_kb=args.padding_kb, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), config_from_args(args))
+    print(f'Serving station pages on {server.base_url}/dashboard/pws/<station>/table/<date>/<date>/daily')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(server.stats))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,117 @@ END_DATE = yesterday
 
 UNIT_SYSTEM = "imperial"
 FIND_FIRST_DATE = False
+# Dates probed concurrently while searching the first date
+FIRST_DATE_PROBES = 4
+
+# Number of stations scraped in parallel
+MAX_WORKERS = 8
+# Number of dates fetched in parallel per station (1 = sequential)
+DATE_WINDOW = 8
+
+# History pages requested per station: "daily" (one page per date), "weekly" or
+# "monthly" (one page per range, about 7x/30x fewer requests). Range pages only
+# carry daily statistics, so OBSERVATION_STORE_DIR is filled in daily mode only.
+FETCH_MODE = "daily"
+
+# Where station history comes from: "html" (history pages) or "json" (PWS history API)
+SOURCE = "html"
+# Per station overrides of SOURCE, e.g. {"IAGUAD73": "json"}
+STATION_SOURCES = {}
+# PWS history API used by the "json" source, the key is read from the environment
+JSON_API_URL = "https://api.weather.com/v2/pws/history/all"
+JSON_API_KEY = os.environ.get('WU_API_KEY')
+
+# Processes parsing the fetched pages while the threads above keep fetching
+# (0 = parse in the fetching threads), e.g. os.cpu_count() for large backfills
+PARSE_PROCESSES = 0
+# Pages fetched or being fetched but not yet parsed, fetchers wait when it is full
+PARSE_QUEUE_SIZE = 32
+
+# HTTP transport shared by all stations
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 10
+# Connection pools kept (one per host) and connections kept per pool
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = MAX_WORKERS * DATE_WINDOW
+# Retries of a failed request (network error, 429, 5xx) with jittered exponential
+# backoff starting at HTTP_BACKOFF seconds; Retry-After longer than HTTP_RETRY_AFTER_MAX
+# is not waited for and the date fails
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_BACKOFF_MAX = 30
+HTTP_RETRY_AFTER_MAX = 120
+# Requests per second per host: starts at HTTP_RATE, halves on 429/503 and grows
+# back by HTTP_RATE_INCREASE per success, between HTTP_RATE_MIN and HTTP_RATE_MAX
+HTTP_RATE = 10
+HTTP_RATE_INCREASE = 0.5
+HTTP_RATE_MIN = 0.5
+HTTP_RATE_MAX = 50
+HTTP_BURST = 20
+# Consecutive failures after which a host is considered down, and for how many seconds
+CIRCUIT_FAILURES = 10
+CIRCUIT_COOLDOWN = 60
+
+# On-disk cache of daily history pages
+PAGE_CACHE = True
+CACHE_DIR = os.path.join('.cache', 'pages')
+# Days newer than this are always downloaded again
+CACHE_REVALIDATE_DAYS = 3
+# Eviction limits (None = no limit)
+CACHE_MAX_AGE_DAYS = None
+CACHE_MAX_MB = 500
+
+# SQLite file recording every scraped date (None = no progress tracking)
+PROGRESS_DB = os.path.join('.cache', 'progress.sqlite')
+# Only fetch dates that are missing or failed in PROGRESS_DB, rebuild the rest from it
+RESUME = False
+
+# SQLite job queue of backfills, drained by job_worker.py (several workers may share it)
+JOB_QUEUE_DB = os.path.join('.cache', 'jobs.sqlite')
+# Seconds a worker holds claimed dates without renewing, adjacent dates claimed at once
+JOB_LEASE_SECONDS = 600
+JOB_MAX_DAYS = 31
+# Attempts of a date before it stays failed, first retry delay in seconds (doubles)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 60
+
+# Daemon mode (scraper_daemon.py): every station is polled once a day for the day that
+# just closed, DAEMON_DELAY minutes after its local midnight plus a random stagger of
+# up to DAEMON_JITTER minutes
+DAEMON_DELAY = 20
+DAEMON_JITTER = 30
+# A station without data for the day yet is polled again every DAEMON_RETRY_DELAY
+# minutes, at most DAEMON_RETRIES times
+DAEMON_RETRY_DELAY = 15
+DAEMON_RETRIES = 8
+# IANA time zone of stations whose midnight differs from this machine's, e.g. {"IAGUAD73": "America/Puerto_Rico"}
+STATION_TIMEZONES = {}
+# Minutes between polls of the current day with scraper_daemon.py --intraday: only the
+# rows added since the last poll are parsed and only stations with new rows are published
+INTRADAY_INTERVAL = 10
+# Last row and running summary of the current day of every station
+INTRADAY_STATE = os.path.join('.cache', 'intraday.json')
+
+# Directory of the columnar 5-minute observation store (None = don't keep observations)
+OBSERVATION_STORE_DIR = None
+# SQLite database of daily summaries and observation rows with range queries
+# (None = no database), e.g. os.path.join('.cache', 'observations.sqlite');
+# job_worker.py export writes the station JSON files from it
+OBSERVATION_DB = None
+
+# Directory of the per-run metrics report and Prometheus textfile (None = no report)
+METRICS_DIR = 'metrics'
+# Station id to scrape under cProfile/tracemalloc, e.g. "IAGUAD73" (None = no profiling)
+PROFILE_STATION = None
 
 # Output directory for JSON files (relative to this script)
 # This should point to the weather-game/backend/data directory
-OUTPUT_DIR = os.path.join('..', 'weather-game', 'backend', 'data')
\ No newline at end of file
+OUTPUT_DIR = os.path.join('..', 'weather-game', 'backend', 'data')
+# Also write index-<date>.json holding the summaries of all stations in one file
+OUTPUT_INDEX = False
+# How changed JSON files are committed to the weather-game repository:
+# "plumbing" (only the changed files are staged, rejected pushes are rebased and retried)
+# or "porcelain" (git add/status/commit/pull --rebase/push)
+GIT_PUBLISH = "plumbing"
+# Fetch + rebase + push retries after a push rejected as non-fast-forward
+GIT_PUSH_RETRIES = 5
@@ -0,0 +1,162 @@
+"""
+Backfill worker: drains the job queue in config.JOB_QUEUE_DB.
+
+    python job_worker.py enqueue --start 2020-01-01 --end 2023-12-31   # backfill every station of stations.txt
+    python job_worker.py enqueue --daily                                # yesterday, runs ahead of any backfill
+    python job_worker.py work --threads 4                               # scrape until the queue is empty
+    python job_worker.py status
+    python job_worker.py export --start 2020-01-01 --end 2023-12-31     # JSON files from OBSERVATION_DB
+
+Any number of workers can drain the same queue, on this machine or on others sharing
+the queue file. Scraped days are recorded in the progress store (and the observation
+store and database when configured). JSON files are published by weather_scraper.py,
+or generated from OBSERVATION_DB by the export command without scraping again.
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import config
+import weather_scraper
+from util.JobQueue import JobQueue
+from util.Metrics import metrics
+
+
+def parse_date(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def open_queue():
+    return JobQueue(config.JOB_QUEUE_DB, lease_seconds=config.JOB_LEASE_SECONDS,
+                    max_attempts=config.JOB_MAX_ATTEMPTS, retry_delay=config.JOB_RETRY_DELAY)
+
+
+def enqueue(queue, args):
+    urls = weather_scraper.read_stations(args.stations)
+
+    if args.daily:
+        start_date = end_date = date.today() - timedelta(days=1)
+        priority = JobQueue.PRIORITY_DAILY
+    else:
+        if not args.start or not args.end:
+            raise SystemExit('enqueue needs --start and --end, or --daily')
+        start_date, end_date = args.start, args.end
+        priority = args.priority
+
+    days = sum(queue.enqueue(url, start_date, end_date, priority, force=args.force) for url in urls)
+    print(f'Queued {days} date(s) of {len(urls)} station(s) from {start_date} to {end_date} at priority {priority}')
+
+
+def run_task(queue, task):
+    """
+    Scrapes the dates of a claimed task and marks each of them done or failed.
+    A day without data (not published yet) fails like an error, so it is retried
+    after the retry delay until the attempts run out.
+    """
+    renewed = time.monotonic()
+    try:
+        for date_string, daily_summary, error in weather_scraper.scrap_days(task.url, task.start_date, task.end_date):
+            if error is None and not weather_scraper.has_data(daily_summary):
+                error = LookupError(f'no data for {date_string} yet')
+            if error is None:
+                queue.complete(task, date_string)
+            else:
+                queue.fail(task, date_string, error)
+            metrics.count('jobs_total', status='done' if error is None else 'failed')
+            # keep the lease of the remaining dates well before it runs out
+            if time.monotonic() - renewed > queue.lease_seconds / 3:
+                queue.extend(task)
+                renewed = time.monotonic()
+    finally:
+        # dates left over by an exception go back to the queue
+        queue.release(task)
+
+
+def work(queue, args):
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    def worker(number):
+        name = f'{owner}:{number}'
+        while True:
+            task = queue.claim(name, args.max_days)
+            if task is None:
+                if not args.wait:
+                    return
+                time.sleep(args.poll)
+                continue
+            print(f'{name} claimed {task}')
+            try:
+                run_task(queue, task)
+            except Exception as e:
+                print(f'Error running {task}: {e}')
+                metrics.count('errors_total', type=type(e).__name__)
+
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(max(1, args.threads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    weather_scraper.PARSE_POOL.close()
+    if weather_scraper.METRICS_DIR:
+        print(f'Run metrics written to {metrics.write(weather_scraper.METRICS_DIR)}')
+
+
+def status(queue, args):
+    counts = queue.counts()
+    if not counts:
+        print('The queue is empty')
+        return
+    print(f'{"status":<10}{"priority":>10}{"dates":>10}')
+    for (job_status, priority), count in sorted(counts.items(), key=lambda item: (item[0][0], -item[0][1])):
+        print(f'{job_status:<10}{priority:>10}{count:>10}')
+    for station, date_string, error in queue.failures():
+        print(f'  failed {station} {date_string}: {error}')
+
+
+def export(queue, args):
+    stations = weather_scraper.read_stations(args.stations)
+    json_files = weather_scraper.export_stations(stations, args.start, args.end)
+    if args.push:
+        weather_scraper.publish(json_files, args.end)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = commands.add_parser('enqueue', help='queue the dates of every station')
+    enqueue_parser.add_argument('--start', type=parse_date, help='first date, YYYY-MM-DD')
+    enqueue_parser.add_argument('--end', type=parse_date, help='last date, YYYY-MM-DD')
+    enqueue_parser.add_argument('--daily', action='store_true', help="queue yesterday at daily priority")
+    enqueue_parser.add_argument('--priority', type=int, default=JobQueue.PRIORITY_BACKFILL)
+    enqueue_parser.add_argument('--stations', help='file of station urls (default stations.txt)')
+    enqueue_parser.add_argument('--force', action='store_true', help='queue dates that are already done again')
+
+    work_parser = commands.add_parser('work', help='claim and scrape queued dates')
+    work_parser.add_argument('--threads', type=int, default=config.MAX_WORKERS, help='tasks run in parallel')
+    work_parser.add_argument('--max-days', type=int, default=config.JOB_MAX_DAYS, help='adjacent dates claimed at once')
+    work_parser.add_argument('--wait', action='store_true', help='keep polling when the queue is empty')
+    work_parser.add_argument('--poll', type=float, default=30, help='seconds between polls with --wait')
+
+    commands.add_parser('status', help='print the number of dates per status')
+
+    export_parser = commands.add_parser('export', help='write the station JSON files from OBSERVATION_DB')
+    export_parser.add_argument('--start', type=parse_date, required=True, help='first date, YYYY-MM-DD')
+    export_parser.add_argument('--end', type=parse_date, required=True, help='last date, YYYY-MM-DD')
+    export_parser.add_argument('--stations', help='file of station urls (default stations.txt)')
+    export_parser.add_argument('--push', action='store_true', help='commit and push the changed files')
+
+    args = parser.parse_args()
+    queue = open_queue()
+    try:
+        {'enqueue': enqueue, 'work': work, 'status': status, 'export': export}[args.command](queue, args)
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
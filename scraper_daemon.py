@@ -0,0 +1,168 @@
+"""
+Daemon mode: stays running and publishes every station's day shortly after it closes.
+
+    python scraper_daemon.py                  # catch up on yesterday, then poll after every midnight
+    python scraper_daemon.py --no-catch-up    # wait for the next midnight
+    python scraper_daemon.py --once           # publish the stations due now and exit
+    python scraper_daemon.py --intraday       # also publish the current day every INTRADAY_INTERVAL minutes
+
+HTTP sessions, the page cache, the parse pool and the per-station schedule stay warm
+between polls. Stations are polled DAEMON_DELAY minutes after their local midnight
+(STATION_TIMEZONES) staggered by up to DAEMON_JITTER minutes; a station whose page has
+no data for the day yet is polled again every DAEMON_RETRY_DELAY minutes.
+Changes to the stations file are picked up while running.
+
+With --intraday the current day's history page of every station is fetched every
+INTRADAY_INTERVAL minutes as well; only the rows added since the previous poll are
+parsed and only the stations with new rows are written and published, under the
+name of the current day (replaced by the complete day once it closed).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+import weather_scraper
+from util.Intraday import Intraday
+from util.Metrics import metrics
+from util.Scheduler import Scheduler
+from util.Utils import Utils
+
+# longest sleep between checks, so stations file changes and Ctrl-C are noticed
+MAX_SLEEP = 60
+
+
+def sync_stations(scheduler, path, urls, catch_up, stagger=None):
+    """Adds the stations new in path and drops the removed ones, returns the current urls."""
+    current = weather_scraper.read_stations(path)
+    for url in current:
+        if url not in urls:
+            scheduler.add(url, catch_up, stagger)
+    for url in urls:
+        if url not in current:
+            scheduler.remove(url)
+    return current
+
+
+def poll(scheduler, due):
+    """Scrapes the due (url, date_string) pairs, publishes the days with data and reschedules."""
+    by_date = {}
+    for url, date_string in due:
+        by_date.setdefault(date_string, []).append(url)
+
+    for date_string, urls in sorted(by_date.items()):
+        day = datetime.strptime(date_string, '%Y-%m-%d').date()
+        # a retry must fetch the page again, not reuse an empty day from the progress store
+        results = weather_scraper.scrap_stations(urls, start_date=day, end_date=day, resume=False)
+
+        ready = []
+        for url, (station_name, summary) in zip(urls, results):
+            if weather_scraper.has_data(summary):
+                ready.append((url, station_name, summary))
+            elif scheduler.retry(url):
+                print(f'{station_name}: no data for {date_string} yet, polling again later')
+                metrics.count('daemon_polls_total', status='retry')
+            else:
+                print(f'{station_name}: still no data for {date_string}, giving up on it')
+                metrics.count('daemon_polls_total', status='gave_up')
+        if not ready:
+            continue
+
+        json_files = weather_scraper.save_stations([(name, summary) for _, name, summary in ready], end_date=day)
+        if weather_scraper.publish(json_files, day):
+            published = time.time()
+            for url, _, _ in ready:
+                scheduler.done(url)
+                metrics.count('daemon_polls_total', status='published')
+                metrics.observe('day_closed_to_published_seconds', published - scheduler.closed_at(url, date_string))
+        else:
+            # JSON files are written, the next poll pushes them again
+            for url, _, _ in ready:
+                scheduler.retry(url)
+
+
+def intraday_poll(scheduler, intraday, urls):
+    """Merges the new rows of every station's current day and publishes the stations that changed."""
+    now = time.time()
+
+    def update(url):
+        day = scheduler.local_date(url, now)
+        try:
+            return day, url.split('/')[-1], weather_scraper.scrap_today(url, intraday, day)
+        except Exception as e:
+            print(f'Error polling the current day of {url}: {e}')
+            metrics.count('errors_total', type=type(e).__name__)
+            return day, None, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(weather_scraper.MAX_WORKERS, len(urls)))) as executor:
+        updates = list(executor.map(update, urls))
+    intraday.save()
+
+    by_date = {}
+    for day, station_name, summary in updates:
+        if summary is not None:
+            by_date.setdefault(day, []).append((station_name, summary))
+    print(f'Current day: {sum(len(results) for results in by_date.values())} of {len(urls)} station(s) have new rows')
+    for day, results in sorted(by_date.items()):
+        weather_scraper.publish(weather_scraper.save_stations(results, end_date=day), day)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', help=f'file of station urls (default {weather_scraper.STATIONS_FILE})')
+    parser.add_argument('--no-catch-up', action='store_true', help="don't publish the last closed day on start")
+    parser.add_argument('--once', action='store_true', help='poll the stations due now once and exit')
+    parser.add_argument('--intraday', action='store_true', help='also publish the current day as it fills up')
+    args = parser.parse_args()
+
+    path = args.stations or weather_scraper.STATIONS_FILE
+    scheduler = Scheduler.from_config()
+    # --once polls every station right away
+    urls = sync_stations(scheduler, path, [], not args.no_catch_up, stagger=0 if args.once else None)
+    stations_mtime = os.path.getmtime(path)
+    intraday = Intraday.from_config() if args.intraday else None
+    next_intraday = 0
+    print(f'Daemon started with {len(urls)} station(s)')
+
+    if weather_scraper.PARSE_POOL.processes:
+        # the parse processes are started once and reused by every poll
+        weather_scraper.PARSE_POOL.start()
+    try:
+        while True:
+            mtime = os.path.getmtime(path)
+            if mtime != stations_mtime:
+                stations_mtime = mtime
+                urls = sync_stations(scheduler, path, urls, catch_up=True)
+                print(f'Stations file changed, now polling {len(urls)} station(s)')
+
+            due = scheduler.due()
+            if due:
+                poll(scheduler, due)
+            polled_intraday = intraday is not None and time.time() >= next_intraday
+            if polled_intraday:
+                intraday_poll(scheduler, intraday, urls)
+                next_intraday = time.time() + config.INTRADAY_INTERVAL * 60
+            if due or polled_intraday:
+                # Keep the page cache within its configured limits
+                Utils.cache.evict()
+                if weather_scraper.METRICS_DIR:
+                    metrics.write(weather_scraper.METRICS_DIR)
+            if args.once:
+                break
+            if not due:
+                wait = scheduler.seconds_until_next()
+                if intraday is not None:
+                    wait = min(wait if wait is not None else MAX_SLEEP, max(0.0, next_intraday - time.time()))
+                time.sleep(MAX_SLEEP if wait is None else min(wait, MAX_SLEEP))
+    except KeyboardInterrupt:
+        print('Daemon stopped')
+    finally:
+        weather_scraper.PARSE_POOL.close()
+        if weather_scraper.METRICS_DIR:
+            print(f'Run metrics written to {metrics.write(weather_scraper.METRICS_DIR)}')
+
+
+if __name__ == '__main__':
+    main()
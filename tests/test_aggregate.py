@@ -0,0 +1,79 @@
+import itertools
+
+import pytest
+
+from benchmarks import fixtures
+from util.Aggregate import Aggregate
+from util.Parser import Parser
+from util.UnitConverter import ConvertToSystem
+from util.Utils import Utils
+
+
+def observation_columns():
+    """Timestamps and converted columns of three days of the fixture pages, in time order."""
+    pages = {name: content for name, kind, _, content in fixtures.corpus() if kind == 'daily'}
+    converter = ConvertToSystem('metric')
+    timestamps = []
+    columns = {}
+    for date_string, name in (('2024-01-14', 'daily_medium'), ('2024-01-15', 'daily_missing'),
+                              ('2024-01-16', 'daily_small')):
+        doc = Parser.parse_page(pages[name])
+        day = converter.convert_columns(converter.columns_from_rows(Parser.iter_html_table(date_string, [doc])))
+        timestamps += [Utils.observation_timestamp(date, time) for date, time in zip(day['Date'], day['Time'])]
+        for field, values in day.items():
+            if field not in ('Date', 'Time'):
+                columns.setdefault(field, []).extend(values)
+    return timestamps, columns
+
+
+def aggregate(period, timestamps, columns, start, end):
+    result = Aggregate(period)
+    result.add_observations(timestamps[start:end], {field: values[start:end] for field, values in columns.items()})
+    return result
+
+
+def snapshot(aggregate):
+    # sums of floats depend on the order they were added in
+    return {bucket: {field: pytest.approx(summary) for field, summary in fields.items()}
+            for bucket, fields in aggregate.to_dict().items()}
+
+
+@pytest.fixture(scope='module')
+def observations():
+    return observation_columns()
+
+
+@pytest.mark.parametrize('period', ['hour', 'day'])
+def test_merge_in_any_order_equals_whole_input(observations, period):
+    timestamps, columns = observations
+    whole = aggregate(period, timestamps, columns, 0, len(timestamps))
+    # cuts inside an hour and inside a day, so partial buckets are merged
+    cuts = [0, 37, 301, 590, len(timestamps)]
+    parts = [(cuts[i], cuts[i + 1]) for i in range(len(cuts) - 1)]
+
+    for order in itertools.permutations(parts):
+        merged = Aggregate(period)
+        for start, end in order:
+            merged.merge(aggregate(period, timestamps, columns, start, end))
+        assert merged.to_dict() == snapshot(whole)
+
+
+def test_merge_is_associative(observations):
+    timestamps, columns = observations
+    thirds = [(0, 200), (200, 450), (450, len(timestamps))]
+
+    def part(i):
+        return aggregate('hour', timestamps, columns, *thirds[i])
+
+    left = part(0).merge(part(1)).merge(part(2))
+    right = part(0).merge(part(1).merge(part(2)))
+    assert left.to_dict() == snapshot(right)
+
+
+def test_rollup_of_merged_hours_equals_daily_aggregate(observations):
+    timestamps, columns = observations
+    hours = aggregate('hour', timestamps, columns, 300, len(timestamps)).merge(
+        aggregate('hour', timestamps, columns, 0, 300))
+    days = aggregate('day', timestamps, columns, 0, len(timestamps))
+    assert hours.rollup('day').to_dict() == snapshot(days)
+    assert hours.rollup('month').to_dict() == snapshot(days.rollup('month'))
@@ -0,0 +1,46 @@
+import math
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from util.FirstDateFinder import FirstDateFinder
+
+START = date(2020, 1, 1)
+END = date(2020, 12, 31)
+
+
+class Station:
+    """Has data from `first` on, counts the probes of every date."""
+    def __init__(self, first):
+        self.first = first
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def probe(self, day):
+        with self.lock:
+            self.calls[day] = self.calls.get(day, 0) + 1
+        return self.first is not None and day >= self.first
+
+
+@pytest.mark.parametrize('probes', [1, 3, 8])
+def test_finds_the_first_date_probing_each_date_once(probes):
+    span = (END - START).days
+    for offset in (0, 1, 2, 100, span - 1, span):
+        station = Station(START + timedelta(days=offset))
+        assert FirstDateFinder(station.probe, probes).find(START, END) == station.first
+        assert set(station.calls.values()) == {1}
+        # galloping plus search, not a scan of the range
+        assert len(station.calls) <= 4 * math.ceil(math.log2(span + 1)) + probes
+
+
+def test_start_date_before_the_first_date_with_data_of_the_range():
+    station = Station(date(2019, 6, 1))
+    assert FirstDateFinder(station.probe).find(START, END) == START
+
+
+def test_no_data_at_the_end_date():
+    station = Station(None)
+    assert FirstDateFinder(station.probe, 4).find(START, END) is None
+    assert list(station.calls) == [END]
+    assert FirstDateFinder(station.probe).find(END, START) is None
@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from util.GitHelper import GitHelper
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+
+def git(cwd, *args):
+    return subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True, check=True).stdout.strip()
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """A bare remote holding one commit of backend/data, and a function that clones it."""
+    for variable in ('GIT_AUTHOR_NAME', 'GIT_COMMITTER_NAME'):
+        monkeypatch.setenv(variable, 'scraper')
+    for variable in ('GIT_AUTHOR_EMAIL', 'GIT_COMMITTER_EMAIL'):
+        monkeypatch.setenv(variable, 'scraper@example.com')
+    bare = tmp_path / 'remote.git'
+    git(tmp_path, 'init', '-q', '--bare', '-b', 'main', str(bare))
+
+    def clone(name):
+        path = tmp_path / name
+        git(tmp_path, 'clone', '-q', str(bare), str(path))
+        return path
+
+    seed = clone('seed')
+    git(seed, 'checkout', '-q', '-b', 'main')
+    write(seed, 'backend/data/index.json', '{}')
+    git(seed, 'add', '-A')
+    git(seed, 'commit', '-q', '-m', 'Initial data')
+    git(seed, 'push', '-q', 'origin', 'main')
+    return bare, clone
+
+
+def write(repo, path, content):
+    path = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def remote_files(bare):
+    return set(git(bare, 'ls-tree', '-r', '--name-only', 'main').split())
+
+
+def test_rejected_push_is_rebased_and_retried(remote):
+    bare, clone = remote
+    first, second = clone('first'), clone('second')
+    write(first, 'backend/data/A_2024-01-01.json', '{"MaxTemp": 1}')
+    write(second, 'backend/data/B_2024-01-01.json', '{"MaxTemp": 2}')
+
+    assert GitHelper.publish(str(first), ['backend/data/A_2024-01-01.json'], '2024-01-01')
+    # second is behind the remote now, its first push is rejected
+    assert GitHelper.publish(str(second), ['backend/data/B_2024-01-01.json'], '2024-01-01')
+
+    assert {'backend/data/A_2024-01-01.json', 'backend/data/B_2024-01-01.json'} <= remote_files(bare)
+    assert git(bare, 'rev-list', '--count', 'main') == '3'
+
+
+def test_concurrent_publishes_all_land(remote):
+    bare, clone = remote
+    names = [f'S{i}' for i in range(4)]
+    clones = {name: clone(name) for name in names}
+    for name, path in clones.items():
+        write(path, f'backend/data/{name}_2024-01-01.json', '{}')
+
+    barrier = threading.Barrier(len(names))
+    results = {}
+
+    def publish(name):
+        barrier.wait()
+        results[name] = GitHelper.publish(str(clones[name]), [f'backend/data/{name}_2024-01-01.json'],
+                                          '2024-01-01', push_retries=10)
+
+    threads = [threading.Thread(target=publish, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(results.values()), results
+    assert {f'backend/data/{name}_2024-01-01.json' for name in names} <= remote_files(bare)
+    assert git(bare, 'rev-list', '--count', 'main') == str(1 + len(names))
@@ -0,0 +1,65 @@
+import math
+import re
+
+from benchmarks import fixtures
+from util.Intraday import Intraday
+from util.ParsePool import ParsePool
+from util.Parser import Parser
+
+DATE = '2024-01-15'
+ROW = re.compile(rb'<tr><td><strong>.*?</tr>')
+
+
+def partial(page, rows):
+    """The page as it looked when only the first `rows` rows of the history table were published."""
+    table_rows = ROW.findall(page)
+    return page.replace(b''.join(table_rows), b''.join(table_rows[:rows]))
+
+
+def poll(intraday, page):
+    """What scrap_today does with a fetched page, returns (summary, number of new rows) or None when unchanged."""
+    digest = Intraday.digest(page)
+    state = intraday.state('ISTATION1', DATE)
+    if state['digest'] == digest:
+        return None
+    columns, last_minute = ParsePool.parse_new_rows(page, DATE, state['last_minute'])
+    summary = intraday.add('ISTATION1', DATE, digest, columns, last_minute)
+    return summary, len(columns['Time']) if columns else 0
+
+
+def expected_summary(page):
+    converter = ParsePool.converter('imperial')
+    doc = Parser.parse_page(page)
+    columns = converter.convert_columns(converter.columns_from_rows(Parser.iter_html_table(DATE, [doc])))
+
+    def values(column):
+        return [value for value in columns[column] if isinstance(value, float) and not math.isnan(value)]
+
+    return {"MaxTemp": round(max(values('Temperature')), 2), "MinTemp": round(min(values('Temperature')), 2),
+            "MaxGust": round(max(values('Gust')), 2), "SumPrec": round(max(values('Precip_Accum')), 2)}
+
+
+def test_only_new_rows_are_merged(tmp_path):
+    page = fixtures.daily_page(rows=288, padding_kb=5, seed=2)
+    intraday = Intraday(str(tmp_path / 'intraday.json'))
+    assert poll(intraday, partial(page, 100)) == (expected_summary(partial(page, 100)), 100)
+    assert poll(intraday, partial(page, 100)) is None
+    assert poll(intraday, partial(page, 250)) == (expected_summary(partial(page, 250)), 150)
+    # a page with a new digest but no new rows leaves the summary as it is
+    assert poll(intraday, partial(page, 250) + b'<!-- ad -->') == (None, 0)
+    assert poll(intraday, page) == (expected_summary(page), 38)
+
+    intraday.save()
+    restored = Intraday(str(tmp_path / 'intraday.json'))
+    assert restored.summary('ISTATION1') == expected_summary(page)
+    assert restored.state('ISTATION1', DATE)['last_minute'] == 287 * 5
+
+
+def test_a_new_day_starts_over():
+    page = fixtures.daily_page(rows=48, padding_kb=5, seed=1)
+    intraday = Intraday()
+    poll(intraday, page)
+    state = intraday.state('ISTATION1', '2024-01-16')
+    assert state['last_minute'] == -1 and state['fields'] == {}
+    # rows parsed for the previous day are dropped
+    assert intraday.add('ISTATION1', DATE, 'digest', None, 0) is None
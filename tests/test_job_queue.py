@@ -0,0 +1,104 @@
+import time
+from datetime import date
+
+import job_worker
+import weather_scraper
+from util.JobQueue import JobQueue
+
+URL = 'https://www.wunderground.com/dashboard/pws/ISTATION1'
+EMPTY = {"MaxTemp": None, "MinTemp": None, "MaxGust": None, "SumPrec": None}
+SUMMARY = {"MaxTemp": 20.0, "MinTemp": 10.0, "MaxGust": 5.0, "SumPrec": 0.0}
+
+
+def scrap_days(summaries):
+    """scrap_days stand-in yielding the summaries of {date_string: summary}."""
+    def scrap(url, start_date, end_date):
+        for date_string in sorted(summaries):
+            yield date_string, summaries[date_string], None
+    return scrap
+
+
+def test_days_without_data_are_retried_until_the_attempts_run_out(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), max_attempts=2, retry_delay=0)
+    queue.enqueue(URL, date(2024, 1, 1), date(2024, 1, 2), JobQueue.PRIORITY_DAILY)
+    monkeypatch.setattr(weather_scraper, 'scrap_days', scrap_days({'2024-01-01': SUMMARY, '2024-01-02': EMPTY}))
+
+    job_worker.run_task(queue, queue.claim('worker'))
+    assert queue.counts() == {('done', JobQueue.PRIORITY_DAILY): 1, ('pending', JobQueue.PRIORITY_DAILY): 1}
+
+    task = queue.claim('worker')
+    assert task.dates == ['2024-01-02']
+    monkeypatch.setattr(weather_scraper, 'scrap_days', scrap_days({'2024-01-02': EMPTY}))
+    job_worker.run_task(queue, task)
+    assert queue.counts() == {('done', JobQueue.PRIORITY_DAILY): 1, ('failed', JobQueue.PRIORITY_DAILY): 1}
+    assert queue.failures() == [('ISTATION1', '2024-01-02', 'LookupError: no data for 2024-01-02 yet')]
+
+
+def station_url(number):
+    return f'https://www.wunderground.com/dashboard/pws/ISTATION{number}'
+
+
+def test_claims_the_most_urgent_contiguous_run(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 10))
+    queue.enqueue(station_url(2), date(2024, 2, 1), date(2024, 2, 1), JobQueue.PRIORITY_DAILY)
+    task = queue.claim('a', max_days=4)
+    assert (task.station, task.dates) == ('ISTATION2', ['2024-02-01'])
+    queue.complete(task, '2024-02-01')
+    task = queue.claim('a', max_days=4)
+    assert (task.station, task.dates) == ('ISTATION1', ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04'])
+
+
+def test_a_station_is_held_by_one_worker(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 10))
+    first = queue.claim('a', max_days=2)
+    # the remaining dates of the station wait for the first worker
+    assert queue.claim('b', max_days=2) is None
+    queue.enqueue(station_url(2), date(2024, 1, 1), date(2024, 1, 1))
+    assert queue.claim('b', max_days=2).station == 'ISTATION2'
+    for date_string in first.dates:
+        queue.complete(first, date_string)
+    assert queue.claim('b', max_days=2).dates == ['2024-01-03', '2024-01-04']
+
+
+def test_expired_leases_are_claimed_again(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), lease_seconds=0.5)
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 2))
+    task = queue.claim('a')
+    time.sleep(0.3)
+    queue.extend(task)
+    time.sleep(0.35)
+    assert queue.claim('b') is None
+    time.sleep(0.3)
+    again = queue.claim('b')
+    assert again.dates == task.dates
+    # the first worker lost the lease, its late results are ignored
+    queue.complete(task, '2024-01-01')
+    assert queue.counts() == {('leased', JobQueue.PRIORITY_BACKFILL): 2}
+
+
+def test_release_gives_dates_back_without_an_attempt(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), max_attempts=1)
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 2))
+    for _ in range(3):
+        task = queue.claim('a')
+        queue.release(task)
+    task = queue.claim('a')
+    queue.fail(task, '2024-01-01', TimeoutError('timed out'))
+    queue.complete(task, '2024-01-02')
+    assert queue.counts() == {('failed', JobQueue.PRIORITY_BACKFILL): 1, ('done', JobQueue.PRIORITY_BACKFILL): 1}
+    # failed dates are queued again by a new enqueue, done ones only with force
+    assert queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 2)) == 2
+    assert queue.counts() == {('pending', JobQueue.PRIORITY_BACKFILL): 1, ('done', JobQueue.PRIORITY_BACKFILL): 1}
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 2), force=True)
+    assert queue.counts() == {('pending', JobQueue.PRIORITY_BACKFILL): 2}
+
+
+def test_failed_dates_wait_for_the_retry_delay(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), retry_delay=60)
+    queue.enqueue(station_url(1), date(2024, 1, 1), date(2024, 1, 1))
+    task = queue.claim('a')
+    queue.fail(task, '2024-01-01', TimeoutError('timed out'))
+    assert queue.counts() == {('pending', JobQueue.PRIORITY_BACKFILL): 1}
+    assert queue.claim('a') is None
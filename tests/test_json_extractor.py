@@ -0,0 +1,24 @@
+import os
+import stat
+
+import pytest
+
+from util.JsonExtractor import JsonExtractor
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='POSIX file modes')
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_rewritten_files_keep_their_mode(tmp_path):
+    path = str(tmp_path / 'ISTATION1.json')
+    assert JsonExtractor.write_if_changed(path, b'{}')
+    # readable by a web server like any file the scraper creates, not 0600 like mkstemp's
+    assert mode(path) == 0o666 & ~JsonExtractor.umask
+    os.chmod(path, 0o640)
+    assert JsonExtractor.write_if_changed(path, b'{"a":1}')
+    assert mode(path) == 0o640
+    assert not JsonExtractor.write_if_changed(path, b'{"a":1}')
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
@@ -0,0 +1,70 @@
+import pytest
+import requests
+
+from benchmarks import fixtures
+from util.JsonHistory import JsonHistory
+
+API_URL = 'https://api.weather.com/v2/pws/history/all'
+KEY = 'secret0123456789'
+
+
+class Response:
+    def __init__(self, status_code=200, content=b'', reason='OK'):
+        self.status_code = status_code
+        self.content = content
+        self.reason = reason
+
+
+class Session:
+    """Answers every request with response, or raises it; records the requests."""
+    def __init__(self, response):
+        self.response = response
+        self.requests = []
+
+    def get(self, url, timeout=None, params=None):
+        self.requests.append((url, params))
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+def test_the_api_key_is_only_sent_with_the_request():
+    history = JsonHistory(API_URL, KEY)
+    url = history.day_url('ISTATION1', '2024-01-15')
+    assert KEY not in url and url.endswith('date=20240115')
+    content = fixtures.history_json('2024-01-15', rows=12)
+    session = Session(Response(content=content))
+    assert history.fetch(session, url) == content
+    assert session.requests == [(url, {'apiKey': KEY})]
+
+
+def test_errors_do_not_quote_the_api_key():
+    history = JsonHistory(API_URL, KEY)
+    url = history.day_url('ISTATION1', '2024-01-15')
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        history.fetch(Session(Response(401, reason='Unauthorized')), url)
+    assert KEY not in str(error.value) and url in str(error.value)
+    refused = requests.exceptions.ConnectionError(f'Max retries exceeded with url: {url}&apiKey={KEY}')
+    with pytest.raises(requests.exceptions.ConnectionError) as error:
+        history.fetch(Session(refused), url)
+    assert KEY not in str(error.value) and '&apiKey=***' in str(error.value)
+
+
+def test_days_without_data():
+    history = JsonHistory(API_URL, KEY)
+    content = history.fetch(Session(Response(204)), history.day_url('ISTATION1', '2024-01-15'))
+    observations = JsonHistory.parse(content)
+    assert observations == []
+    assert JsonHistory.summary(observations) == {"MaxTemp": None, "MinTemp": None, "MaxGust": None, "SumPrec": None}
+
+
+def test_observations_map_to_page_rows():
+    observations = JsonHistory.parse(fixtures.history_json('2024-01-15', rows=24, seed=3))
+    summary = JsonHistory.summary(observations)
+    assert summary["MaxTemp"] == max(observation['imperial']['tempHigh'] for observation in observations)
+    assert summary["SumPrec"] == observations[-1]['imperial']['precipTotal']
+    rows = JsonHistory.rows(observations)
+    assert len(rows) == 24
+    assert rows[1]['Date'] == '2024/01/15' and rows[1]['Time'] == '01:00 AM'
+    assert rows[1]['Temperature'] == f'{observations[1]["imperial"]["tempAvg"]} °F'
+    assert rows[1]['Wind'] in JsonHistory.wind_directions
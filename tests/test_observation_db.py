@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks import fixtures
+from util.ObservationDB import ObservationDB
+from util.Parser import Parser
+from util.UnitConverter import ConvertToSystem
+
+DATE = '2024-01-15'
+START = datetime(2024, 1, 15, tzinfo=timezone.utc).timestamp()
+
+
+def day(system, rows=288, seed=2):
+    """(daily summary in page units, rows converted to system) of a fixture page."""
+    doc = Parser.parse_page(fixtures.daily_page(rows=rows, padding_kb=5, seed=seed))
+    table = Parser.parse_html_table(DATE, [doc])
+    return Parser.parse_summary_table(doc), ConvertToSystem(system).clean_and_convert(table)
+
+
+def test_upserts_replace_rows_instead_of_duplicating_them(tmp_path):
+    db = ObservationDB(str(tmp_path / 'observations.db'))
+    summary, rows = day('imperial')
+    assert db.upsert_day('ISTATION1', DATE, summary, rows) == 288
+    corrected = dict(summary, MaxGust=99.0)
+    db.upsert_day('ISTATION1', DATE, corrected, rows[:10])
+    assert db.connection.execute('SELECT COUNT(*) FROM observations').fetchone()[0] == 288
+    assert db.daily('ISTATION1', DATE, DATE) == {DATE: corrected}
+    db.upsert_day('ISTATION2', DATE, dict(summary, MaxGust=12.5, SumPrec=None))
+    db.upsert_day('ISTATION2', '2024-01-16', dict(summary, MaxGust=15.0, SumPrec=0.5))
+    assert db.summaries(DATE, '2024-01-16', stations=['ISTATION2']) == {
+        'ISTATION2': {"MaxTemp": summary["MaxTemp"], "MinTemp": summary["MinTemp"], "MaxGust": 15.0, "SumPrec": 0.5}}
+    assert db.leaders('MaxGust', DATE, '2024-01-16', limit=2) == [('ISTATION1', DATE, 99.0),
+                                                                  ('ISTATION2', '2024-01-16', 15.0)]
+    db.close()
+
+
+@pytest.mark.parametrize('system', ['imperial', 'metric'])
+def test_observation_summaries_agree_with_the_daily_table(tmp_path, system):
+    db = ObservationDB(str(tmp_path / 'observations.db'), system)
+    summary, rows = day(system)
+    db.upsert_day('ISTATION1', DATE, summary, rows)
+    daily = db.daily('ISTATION1', DATE, DATE)[DATE]
+    observed = db.observation_summaries(START, START + 86400)['ISTATION1'][DATE]
+    # metric rows are stored rounded to two decimals before they are converted back
+    assert observed == pytest.approx(daily, abs=0.02)
+    hours = db.observation_summaries(START, START + 86400, period='hour')['ISTATION1']
+    assert len(hours) == 24
+    assert max(hour["MaxTemp"] for hour in hours.values()) == observed["MaxTemp"]
+    db.close()
+
+
+def test_observation_units_can_not_be_mixed(tmp_path):
+    path = str(tmp_path / 'observations.db')
+    ObservationDB(path, 'metric').close()
+    with pytest.raises(ValueError):
+        ObservationDB(path, 'imperial')
+    ObservationDB(path, 'metric').close()
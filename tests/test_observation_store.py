@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+from util.ObservationStore import ObservationStore
+
+
+def rows(day, hours, temperature=20.0):
+    """Hourly converted rows of a January 2024 day."""
+    return [{'Date': f'2024/01/{day:02d}', 'Time': f'{hour % 12 or 12:02d}:00 {"AM" if hour < 12 else "PM"}',
+             'Temperature': temperature + hour, 'Wind': 'NE', 'Humidity': 'NA'} for hour in hours]
+
+
+def stored(store, station='ISTATION1'):
+    """(timestamp, temperature, wind) of the stored rows of January 2024."""
+    segment = store.open_segment(station, '2024-01')
+    try:
+        return list(zip(segment.columns['Timestamp'], segment.columns['Temperature'], segment.wind()))
+    finally:
+        segment.close()
+
+
+def test_rows_are_appended_in_time_order(tmp_path):
+    store = ObservationStore(str(tmp_path))
+    assert store.append('ISTATION1', rows(1, range(12))) == 12
+    assert store.append('ISTATION1', rows(2, range(24))) == 24
+    result = stored(store)
+    assert len(result) == 36
+    assert [timestamp for timestamp, _, _ in result] == sorted(timestamp for timestamp, _, _ in result)
+    assert result[0][1:] == (20.0, 'NE')
+    segments = store.read_range('ISTATION1', datetime(2024, 1, 2), datetime(2024, 1, 2, 6))
+    assert [len(segment) for segment in segments] == [6]
+    for segment in segments:
+        segment.close()
+
+
+def test_older_rows_are_merged_and_replace_the_same_time(tmp_path):
+    store = ObservationStore(str(tmp_path))
+    store.append('ISTATION1', rows(2, range(24)))
+    # a retried day before the stored one, and a corrected hour of the stored day
+    assert store.append('ISTATION1', rows(1, range(24)) + rows(2, [5], temperature=0.0)) == 25
+    result = stored(store)
+    assert len(result) == 48
+    assert [timestamp for timestamp, _, _ in result] == sorted(timestamp for timestamp, _, _ in result)
+    assert result[24 + 5][1] == 5.0
+    assert store.read_meta('ISTATION1', '2024-01')['generation'] == 1
+    # only the files of the current generation are left
+    assert sorted(os.listdir(tmp_path / 'ISTATION1' / '2024-01')) == sorted(
+        ['meta.json'] + [store.field_file(field, 1) for field in store.typecodes])
+    # storing the same rows again changes nothing
+    assert store.append('ISTATION1', rows(1, range(24))) == 0
+    assert store.read_meta('ISTATION1', '2024-01')['generation'] == 1
+
+
+def append_days(root, days):
+    store = ObservationStore(root)
+    for day in days:
+        store.append('ISTATION1', rows(day, range(24)))
+
+
+def test_concurrent_writers_keep_every_row(tmp_path):
+    root = str(tmp_path)
+    # out of order across writers, so appends and merges interleave
+    threads = [threading.Thread(target=append_days, args=(root, days)) for days in ([5, 1, 9], [2, 7, 3], [8, 4, 6])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = stored(ObservationStore(root))
+    assert len(result) == 9 * 24
+    assert [timestamp for timestamp, _, _ in result] == sorted(timestamp for timestamp, _, _ in result)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_concurrent_processes_keep_every_row(tmp_path):
+    root = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=append_days, args=(root, days)) for days in ([5, 1, 9], [2, 7, 3], [8, 4, 6])]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0, 0, 0]
+    result = stored(ObservationStore(root))
+    assert len(result) == 9 * 24
+    assert len({timestamp for timestamp, _, _ in result}) == 9 * 24
@@ -0,0 +1,89 @@
+import os
+import time
+
+from benchmarks import fixtures
+from util.PageCache import PageCache
+
+URL = 'https://www.wunderground.com/dashboard/pws/ISTATION1/table/2020-01-15/2020-01-15/daily'
+
+
+class Response:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class Session:
+    """Serves the queued responses and records the request headers."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+def test_old_pages_without_rows_are_fetched_again(tmp_path):
+    cache = PageCache(str(tmp_path), revalidate_days=3)
+    empty = fixtures.daily_page(rows=0, padding_kb=1)
+    page = fixtures.daily_page(rows=12, padding_kb=1)
+    session = Session(Response(empty, headers={'ETag': '"empty"'}), Response(page))
+    assert cache.fetch(session, URL) == empty
+    # the day was recorded missing, the rerun has to ask the server again
+    assert cache.fetch(session, URL) == page
+    assert len(session.requests) == 2
+    assert session.requests[1] == {'If-None-Match': '"empty"'}
+    assert cache.fetch(session, URL) == page
+    assert len(session.requests) == 2
+
+
+def test_old_pages_are_served_from_disk(tmp_path):
+    cache = PageCache(str(tmp_path), revalidate_days=3)
+    page = fixtures.daily_page(rows=12, padding_kb=1)
+    session = Session(Response(page))
+    assert cache.fetch(session, URL) == page
+    assert PageCache(str(tmp_path), revalidate_days=3).fetch(Session(), URL) == page
+    assert len(session.requests) == 1
+
+
+def test_recent_pages_are_revalidated(tmp_path):
+    # with a long revalidation window 2020-01-15 is still a recent day
+    cache = PageCache(str(tmp_path), revalidate_days=100000)
+    page = fixtures.daily_page(rows=12, padding_kb=1)
+    session = Session(Response(page, headers={'ETag': '"v1"', 'Last-Modified': 'Wed, 15 Jan 2020 23:59:00 GMT'}),
+                      Response(b'', status_code=304))
+    assert cache.fetch(session, URL) == page
+    assert cache.fetch(session, URL) == page
+    assert session.requests == [{}, {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 15 Jan 2020 23:59:00 GMT'}]
+    # stored while the day was recent, so never served without asking once the day aged
+    aged = PageCache(str(tmp_path), revalidate_days=3)
+    assert aged.get('ISTATION1', '2020-01-15') is None
+    session = Session(Response(b'', status_code=304))
+    assert aged.fetch(session, URL) == page
+    assert len(session.requests) == 1
+
+
+def test_other_urls_are_not_cached(tmp_path):
+    cache = PageCache(str(tmp_path), revalidate_days=3)
+    url = 'https://www.wunderground.com/dashboard/pws/ISTATION1/table/2020-01-01/2020-01-31/monthly'
+    session = Session(Response(b'a'), Response(b'b'))
+    assert cache.fetch(session, url) == b'a'
+    assert cache.fetch(session, url) == b'b'
+    assert os.listdir(tmp_path) == []
+
+
+def test_evict_drops_the_least_recently_used_pages(tmp_path):
+    cache = PageCache(str(tmp_path), revalidate_days=3, max_bytes=1)
+    for day in ('2020-01-01', '2020-01-02'):
+        cache.put('ISTATION1', day, fixtures.daily_page(rows=12, padding_kb=1))
+    old = time.time() - 3600
+    os.utime(cache.path('ISTATION1', '2020-01-01'), (old, old))
+    cache.max_bytes = os.path.getsize(cache.path('ISTATION1', '2020-01-02'))
+    assert cache.evict() == 1
+    assert os.listdir(tmp_path / 'ISTATION1') == ['2020-01-02.html.gz']
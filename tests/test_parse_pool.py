@@ -0,0 +1,42 @@
+from datetime import date
+
+import pytest
+
+from benchmarks import fixtures
+from util.ParsePool import ParsePool
+from util.Parser import Parser
+
+
+def page_text(content):
+    return Parser.parse_page(content).text_content()
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = ParsePool(processes=1, queue_size=2)
+    yield pool
+    pool.close()
+
+
+def test_fragment_parses_like_the_page():
+    content = fixtures.daily_page(rows=12, padding_kb=5, seed=1)
+    fragment = Parser.history_fragment(content)
+    assert fragment is not None and len(fragment) < len(content)
+    # the worker gets only the fragment and has to decode it as UTF-8 all the same
+    assert Parser.parse_page(fragment).text_content() == Parser.parse_page(content).text_content()
+    assert '°F' in Parser.parse_page(fragment).text_content()
+    assert Parser.history_fragment(b'<html><body>no history</body></html>') is None
+
+
+def test_pool_parses_like_inline(pool):
+    """The pages carry °F and w/m² units, which must survive the trip through the worker."""
+    daily = fixtures.daily_page(rows=48, padding_kb=5, seed=2)
+    inline = ParsePool(processes=0)
+    assert pool.run(page_text, daily) == page_text(daily)
+    for args in (('html', daily, '2024-01-15', 'metric', True), ('html', daily, '2024-01-15', 'imperial', True)):
+        assert pool.run(ParsePool.parse_day, *args) == inline.run(ParsePool.parse_day, *args)
+    assert (pool.run(ParsePool.parse_new_rows, daily, '2024-01-15', 120)
+            == inline.run(ParsePool.parse_new_rows, daily, '2024-01-15', 120))
+    monthly = fixtures.monthly_page(date(2024, 1, 1), days=31, padding_kb=5, seed=6)
+    assert (pool.run(ParsePool.parse_range, monthly, '2024-01-01', 'monthly')
+            == inline.run(ParsePool.parse_range, monthly, '2024-01-01', 'monthly'))
@@ -0,0 +1,79 @@
+import re
+import unicodedata
+from datetime import datetime
+
+import lxml.html as lh
+import pytest
+
+from benchmarks import fixtures
+from util.Parser import Parser
+from util.UnitConverter import ConvertToSystem
+
+
+def reference_summary_table(doc):
+    """parse_summary_table before the single-pass rewrite: one XPath query per label."""
+    summary = {"MaxTemp": None, "MinTemp": None, "MaxGust": None, "SumPrec": None}
+    for label, high_key, low_key in (("Temperature", "MaxTemp", "MinTemp"), ("Wind Gust", "MaxGust", None),
+                                     ("Precipitation", "SumPrec", None)):
+        rows = doc.xpath(f'//tr[.//span[contains(text(), "{label}")] or .//*[contains(text(), "{label}")]]')
+        if not rows:
+            continue
+        tds = rows[0].xpath('.//td')
+        matches = [re.search(r'([\d.]+)', td.text_content().strip()) for td in tds[:2 if low_key else 1]]
+        if len(matches) < (2 if low_key else 1) or not all(matches):
+            continue
+        values = [float(match.group(1)) for match in matches]
+        if low_key:
+            summary[high_key], summary[low_key] = max(values), min(values)
+        else:
+            summary[high_key] = values[0]
+    return summary
+
+
+def reference_html_table(date_string, doc):
+    """parse_html_table before the streaming records: one dict per row, keyed by the header cells."""
+    table_rows = [tr for tr in doc.xpath('//tr') if len(tr) == 12]
+    if not table_rows:
+        return []
+    headers = [header.text for header in table_rows[0]]
+    rows = []
+    for tr in table_rows[1:]:
+        row = {}
+        for i, td in enumerate(tr.getchildren()):
+            content = unicodedata.normalize("NFKD", td.text_content())
+            if i == 0:
+                row['Date'] = datetime.strptime(date_string, "%Y-%m-%d").strftime('%Y/%m/%d')
+                row['Time'] = datetime.strptime(content, "%I:%M %p").strftime('%I:%M %p')
+            else:
+                row[Parser.format_key(headers[i])] = content
+        rows.append(row)
+    return rows
+
+
+html_pages = [pytest.param(kind, date_string, content, id=name)
+              for name, kind, date_string, content in fixtures.corpus() if kind != 'json']
+daily_pages = [page for page in html_pages if page.values[0] == 'daily']
+
+
+@pytest.mark.parametrize('kind, date_string, content', html_pages)
+def test_summary_table_matches_reference(kind, date_string, content):
+    expected = reference_summary_table(lh.fromstring(content))
+    assert Parser.parse_summary_table(lh.fromstring(content)) == expected
+    assert Parser.parse_summary_table(Parser.parse_page(content)) == expected
+
+
+@pytest.mark.parametrize('kind, date_string, content', daily_pages)
+def test_history_table_matches_reference(kind, date_string, content):
+    expected = reference_html_table(date_string, lh.fromstring(content))
+    doc = Parser.parse_page(content)
+    assert Parser.parse_html_table(date_string, [doc]) == expected
+    assert [dict(record.items()) for record in Parser.iter_html_table(date_string, [doc])] == expected
+
+
+@pytest.mark.parametrize('kind, date_string, content', daily_pages)
+def test_records_convert_like_row_dicts(kind, date_string, content):
+    converter = ConvertToSystem('metric')
+    doc = Parser.parse_page(content)
+    expected = converter.clean_and_convert(reference_html_table(date_string, lh.fromstring(content)))
+    columns = converter.convert_columns(converter.columns_from_rows(Parser.iter_html_table(date_string, [doc])))
+    assert ConvertToSystem.rows_from_columns(columns) == expected
@@ -0,0 +1,25 @@
+from util.ProgressStore import ProgressStore
+
+SUMMARY = {"MaxTemp": 20.0, "MinTemp": 10.0, "MaxGust": 5.0, "SumPrec": 0.0}
+
+
+def test_misses_and_failures_never_overwrite_a_done_day(tmp_path):
+    path = str(tmp_path / 'progress.db')
+    # two processes sharing the file
+    first, second = ProgressStore(path), ProgressStore(path)
+    first.record_success('ISTATION1', '2024-01-01', SUMMARY)
+    second.record_missing('ISTATION1', '2024-01-01')
+    second.record_failure('ISTATION1', '2024-01-01', TimeoutError('timed out'))
+    assert first.completed('ISTATION1', '2024-01-01', '2024-01-31') == {'2024-01-01': SUMMARY}
+    assert second.failed('ISTATION1', '2024-01-01', '2024-01-31') == {}
+
+
+def test_missing_and_failed_days_are_replaced(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.db'))
+    store.record_missing('ISTATION1', '2024-01-02')
+    store.record_failure('ISTATION1', '2024-01-02', TimeoutError('timed out'))
+    assert store.failed('ISTATION1', '2024-01-01', '2024-01-31') == {'2024-01-02': 'TimeoutError: timed out'}
+    store.record_missing('ISTATION1', '2024-01-02')
+    assert store.failed('ISTATION1', '2024-01-01', '2024-01-31') == {}
+    store.record_success('ISTATION1', '2024-01-02', SUMMARY)
+    assert store.completed('ISTATION1', '2024-01-01', '2024-01-31') == {'2024-01-02': SUMMARY}
@@ -0,0 +1,94 @@
+import pytest
+
+from util.RateLimiter import CircuitOpenError, HostLimiter
+
+
+class Clock:
+    """Fake monotonic clock, sleeping advances it."""
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def limiter(**options):
+    clock = Clock()
+    return HostLimiter('example.com', clock=clock, sleep=clock.sleep, **options), clock
+
+
+def test_requests_are_spaced_after_the_burst():
+    host, clock = limiter(rate=2.0, burst=2)
+    for _ in range(2):
+        host.acquire()
+    assert clock.slept == []
+    host.acquire()
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_rate_is_halved_when_throttled_and_grows_back():
+    host, clock = limiter(rate=4.0, min_rate=1.5, max_rate=4.2, increase=0.1)
+    host.throttled()
+    assert host.rate == 2.0
+    host.throttled()
+    assert host.rate == 1.5
+    for _ in range(30):
+        host.success()
+    assert host.rate == 4.2
+
+
+def test_retry_after_pauses_the_host():
+    host, clock = limiter(rate=10.0, burst=10)
+    host.throttled(retry_after=30)
+    host.acquire()
+    assert clock.slept == [pytest.approx(30)]
+    assert not host.is_open
+
+
+def test_circuit_opens_after_consecutive_failures():
+    host, clock = limiter(failure_threshold=3, cooldown=60)
+    host.failure()
+    host.failure()
+    host.success()
+    host.failure()
+    host.failure()
+    host.acquire()
+    host.failure()
+    assert host.is_open
+    with pytest.raises(CircuitOpenError):
+        host.acquire()
+
+
+@pytest.mark.parametrize('trial_outcome', ['failure', 'refused'])
+def test_half_open_trial(trial_outcome):
+    host, clock = limiter(failure_threshold=1, cooldown=60)
+    host.failure()
+    clock.now += 61
+    # a single trial request gets through, the others fail until it answers
+    host.acquire()
+    with pytest.raises(CircuitOpenError):
+        host.acquire()
+    getattr(host, trial_outcome)()
+    assert host.is_open
+    with pytest.raises(CircuitOpenError):
+        host.acquire()
+
+    clock.now += 61
+    host.acquire()
+    host.success()
+    assert not host.is_open
+    host.acquire()
+
+
+def test_throttled_answers_outside_a_trial_do_not_open_the_circuit():
+    host, clock = limiter(failure_threshold=1)
+    host.acquire()
+    host.throttled()
+    host.refused()
+    assert not host.is_open
+    host.acquire()
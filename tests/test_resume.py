@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+import weather_scraper
+from util.ProgressStore import ProgressStore
+
+URL = 'https://www.wunderground.com/dashboard/pws/ISTATION1'
+EMPTY = {"MaxTemp": None, "MinTemp": None, "MaxGust": None, "SumPrec": None}
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    """weather_scraper with a progress store in tmp_path and scrap_day serving `pages` ({date: summary or error})."""
+    for name, value in (('PROGRESS_DB', str(tmp_path / 'progress.db')), ('PROGRESS', None),
+                        ('OBSERVATION_DB_PATH', None), ('OBSERVATION_DB', None), ('OBSERVATION_STORE', None),
+                        ('FIND_FIRST_DATE', False), ('FETCH_MODE', 'daily'), ('SOURCE', 'html'),
+                        ('STATION_SOURCES', {})):
+        monkeypatch.setattr(weather_scraper, name, value)
+    pages = {}
+    fetched = []
+
+    def scrap_day(session, url, date_string=None, timeout=None, source='html'):
+        fetched.append(date_string)
+        if isinstance(pages[date_string], Exception):
+            raise pages[date_string]
+        return pages[date_string], None
+
+    monkeypatch.setattr(weather_scraper, 'scrap_day', scrap_day)
+    yield pages, fetched
+    if weather_scraper.PROGRESS is not None:
+        weather_scraper.PROGRESS.close()
+
+
+def test_resume_fetches_only_missing_and_failed_days(scraper):
+    pages, fetched = scraper
+    pages.update({'2024-01-01': {"MaxTemp": 20.0, "MinTemp": 10.0, "MaxGust": 5.0, "SumPrec": 1.0},
+                  '2024-01-02': EMPTY, '2024-01-03': TimeoutError('timed out')})
+    weather_scraper.scrap_station(URL, start_date=date(2024, 1, 1), end_date=date(2024, 1, 3), resume=True)
+    assert fetched == ['2024-01-01', '2024-01-02', '2024-01-03']
+    assert isinstance(weather_scraper.PROGRESS, ProgressStore)
+
+    fetched.clear()
+    pages.update({'2024-01-02': {"MaxTemp": 25.0, "MinTemp": 12.0, "MaxGust": 7.0, "SumPrec": 0.5},
+                  '2024-01-03': {"MaxTemp": 22.0, "MinTemp": 8.0, "MaxGust": 9.0, "SumPrec": 0.0}})
+    summary = weather_scraper.scrap_station(URL, start_date=date(2024, 1, 1), end_date=date(2024, 1, 3), resume=True)
+    assert fetched == ['2024-01-02', '2024-01-03']
+    assert summary == {"MaxTemp": 25.0, "MinTemp": 8.0, "MaxGust": 9.0, "SumPrec": 1.5}
+
+    fetched.clear()
+    weather_scraper.scrap_station(URL, start_date=date(2024, 1, 1), end_date=date(2024, 1, 3), resume=True)
+    assert fetched == []
+    weather_scraper.scrap_station(URL, start_date=date(2024, 1, 1), end_date=date(2024, 1, 3), resume=False)
+    assert fetched == ['2024-01-01', '2024-01-02', '2024-01-03']
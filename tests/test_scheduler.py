@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, timezone
+
+from util.Scheduler import Scheduler
+
+# 2024-01-15 10:00 UTC, 23:00 in Auckland (UTC+13 in January)
+NOW = datetime(2024, 1, 15, 10, tzinfo=timezone.utc).timestamp()
+UTC_URL = 'https://www.wunderground.com/dashboard/pws/ISTATION1'
+NZ_URL = 'https://www.wunderground.com/dashboard/pws/ISTATION2'
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler(clock, **options):
+    options = {'delay': 1200, 'jitter': 0, 'retry_delay': 900, 'retries': 2, **options}
+    return Scheduler(timezones={'ISTATION1': 'UTC', 'ISTATION2': 'Pacific/Auckland'}, clock=clock,
+                     rng=random.Random(0), **options)
+
+
+def test_catch_up_polls_the_last_closed_local_day_at_once():
+    clock = Clock(NOW)
+    schedule = scheduler(clock)
+    schedule.add(UTC_URL, stagger=0)
+    schedule.add(NZ_URL, stagger=0)
+    assert sorted(schedule.due()) == [(UTC_URL, '2024-01-14'), (NZ_URL, '2024-01-14')]
+
+
+def test_days_are_due_after_their_local_midnight():
+    clock = Clock(NOW)
+    schedule = scheduler(clock)
+    schedule.add(UTC_URL, catch_up=False)
+    schedule.add(NZ_URL, catch_up=False)
+    assert schedule.due() == []
+    # Auckland's 2024-01-15 closed at 11:00 UTC, UTC's at midnight
+    assert schedule.seconds_until_next() == 3600 + 1200
+    clock.now = NOW + 3600 + 1200
+    assert schedule.due() == [(NZ_URL, '2024-01-15')]
+    clock.now = datetime(2024, 1, 16, 0, 20, tzinfo=timezone.utc).timestamp()
+    assert schedule.due() == [(NZ_URL, '2024-01-15'), (UTC_URL, '2024-01-15')]
+    assert schedule.closed_at(UTC_URL, '2024-01-15') == datetime(2024, 1, 16, tzinfo=timezone.utc).timestamp()
+
+
+def test_days_without_data_are_retried_then_skipped():
+    clock = Clock(NOW)
+    schedule = scheduler(clock)
+    schedule.add(UTC_URL, stagger=0)
+    for _ in range(2):
+        assert schedule.retry(UTC_URL)
+        assert schedule.due() == []
+        clock.now += 900 * 1.2
+        assert schedule.due() == [(UTC_URL, '2024-01-14')]
+    # out of retries: on to the day that closes next
+    assert not schedule.retry(UTC_URL)
+    assert schedule.entries[UTC_URL]['date'] == '2024-01-15'
+    assert schedule.entries[UTC_URL]['attempts'] == 0
+
+
+def test_done_moves_on_to_the_next_day():
+    clock = Clock(NOW)
+    schedule = scheduler(clock)
+    schedule.add(UTC_URL, stagger=0)
+    schedule.done(UTC_URL)
+    assert schedule.due() == []
+    assert schedule.entries[UTC_URL] == {'due': datetime(2024, 1, 16, 0, 20, tzinfo=timezone.utc).timestamp(),
+                                         'date': '2024-01-15', 'attempts': 0}
+    schedule.remove(UTC_URL)
+    assert schedule.seconds_until_next() is None
@@ -0,0 +1,198 @@
+import math
+import time
+
+
+class Summary:
+    """
+    Mergeable statistics of one series: count, sum, min, max, mean and the last
+    value by key (e.g. by timestamp). Merging the summaries of two parts of a series
+    gives the summary of the whole series, in any order (up to float rounding of the sum).
+    """
+
+    __slots__ = ('count', 'total', 'min', 'max', 'last', 'last_key')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+        self.last_key = None
+
+    def add(self, value, key=None):
+        """Adds a number; None, NaN and 'NA' are missing values and ignored."""
+        if not isinstance(value, (int, float)) or math.isnan(value):
+            return
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if key is None or self.last_key is None or key >= self.last_key:
+            self.last = value
+            self.last_key = key
+
+    def merge(self, other):
+        """Adds the values summarized by other, returns self."""
+        if not other.count:
+            return self
+        self.count += other.count
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+        # without keys the merged summary is taken to follow this one
+        if other.last_key is None or self.last_key is None or other.last_key >= self.last_key:
+            self.last = other.last
+            self.last_key = other.last_key
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.total, 'min': self.min, 'max': self.max,
+                'mean': self.mean, 'last': self.last, 'last_key': self.last_key}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.count = data['count']
+        summary.total = data['sum']
+        summary.min = data['min']
+        summary.max = data['max']
+        summary.last = data['last']
+        summary.last_key = data['last_key']
+        return summary
+
+
+class Aggregate:
+    """
+    Mergeable summaries of named fields per bucket: an hour ('YYYY-MM-DD HH'),
+    a day ('YYYY-MM-DD'), a month ('YYYY-MM') or the whole input ('all').
+
+    Accumulator fields are running totals that restart every day (Precip_Accum):
+    within a day they are summarized by their last value, over longer periods by
+    the sum of the daily last values. Partial aggregates of the same period merge
+    into the aggregate of their combined input; accumulators have to be merged at
+    day or hour level, before rolling up past a day.
+    """
+
+    periods = ('hour', 'day', 'month', None)
+    # length of the bucket key of each period
+    key_lengths = {'hour': 13, 'day': 10, 'month': 7}
+    time_formats = {'hour': '%Y-%m-%d %H', 'day': '%Y-%m-%d', 'month': '%Y-%m'}
+    seconds = {'hour': 3600, 'day': 86400}
+
+    # daily summary key -> statistic of the days reported as the station summary
+    summary_statistics = {"MaxTemp": 'max', "MinTemp": 'min', "MaxGust": 'max', "SumPrec": 'sum'}
+    round_to_decimals = 2
+
+    def __init__(self, period='day', accumulators=('Precip_Accum',)):
+        if period not in self.periods:
+            raise ValueError(f'unknown period {period}')
+        self.period = period
+        self.accumulators = frozenset(accumulators)
+        self.buckets = {}
+
+    def bucket_key(self, timestamp):
+        """Bucket of an ObservationStore timestamp (station local time as UTC seconds)."""
+        if self.period is None:
+            return 'all'
+        return time.strftime(self.time_formats[self.period], time.gmtime(timestamp))
+
+    def summary(self, bucket, field):
+        fields = self.buckets.get(bucket)
+        if fields is None:
+            fields = self.buckets[bucket] = {}
+        summary = fields.get(field)
+        if summary is None:
+            summary = fields[field] = Summary()
+        return summary
+
+    def add(self, bucket, field, value, key=None):
+        self.summary(bucket, field).add(value, key)
+
+    def add_daily_summary(self, date_string, daily_summary):
+        """Adds a daily summary (MaxTemp, MinTemp, MaxGust, SumPrec) of one day."""
+        bucket = date_string if self.period == 'day' else self.coarsen_key(date_string, self.period)
+        for key, value in daily_summary.items():
+            self.add(bucket, key, value)
+
+    def add_observations(self, timestamps, columns):
+        """
+        Adds observation columns: {field: sequence of numbers, NaN when missing}
+        aligned with timestamps, e.g. the columns of an ObservationSegment.
+        Rows must be of the same station and in time order.
+        """
+        step = self.seconds.get(self.period)
+        bucket = None
+        bucket_end = None
+        fields = [(field, column) for field, column in columns.items() if field not in ('Timestamp', 'Wind')]
+        for i, timestamp in enumerate(timestamps):
+            if step is None or bucket_end is None or timestamp >= bucket_end:
+                bucket = self.bucket_key(timestamp)
+                if step is not None:
+                    bucket_end = (timestamp // step + 1) * step
+            for field, column in fields:
+                value = column[i]
+                if value == value:
+                    self.summary(bucket, field).add(value, timestamp)
+
+    def merge(self, other):
+        """Adds the buckets of an aggregate of the same period, returns self."""
+        if other.period != self.period:
+            raise ValueError(f'can not merge {other.period} buckets into {self.period} buckets')
+        for bucket, fields in other.buckets.items():
+            for field, summary in fields.items():
+                self.summary(bucket, field).merge(summary)
+        return self
+
+    @classmethod
+    def coarsen_key(cls, key, period):
+        return key[:cls.key_lengths[period]] if period else 'all'
+
+    def rollup(self, period):
+        """Returns a new aggregate of the same fields over coarser buckets."""
+        if self.periods.index(period) < self.periods.index(self.period):
+            raise ValueError(f'can not roll {self.period} buckets up to {period}')
+        if self.period == 'hour' and period not in ('hour', 'day'):
+            # accumulators restart every day, take their daily value first
+            return self.rollup('day').rollup(period)
+
+        result = Aggregate(period, self.accumulators)
+        for bucket, fields in self.buckets.items():
+            target = self.coarsen_key(bucket, period)
+            for field, summary in fields.items():
+                if field in self.accumulators and self.period == 'day' and period != 'day':
+                    # total of the day, keyed by its last reading
+                    result.summary(target, field).add(summary.last, summary.last_key)
+                else:
+                    result.summary(target, field).merge(summary)
+        return result
+
+    def values(self, bucket, statistics=None):
+        """
+        Returns {field: value} of a bucket, statistics maps each field to
+        min/max/sum/mean/count/last (default summary_statistics).
+        Fields without values are None.
+        """
+        statistics = statistics or self.summary_statistics
+        fields = self.buckets.get(bucket, {})
+        result = {}
+        for field, statistic in statistics.items():
+            summary = fields.get(field)
+            value = None
+            if summary is not None and summary.count:
+                value = summary.total if statistic == 'sum' else getattr(summary, statistic)
+            if isinstance(value, float):
+                value = round(value, self.round_to_decimals)
+            result[field] = value
+        return result
+
+    def to_dict(self):
+        return {bucket: {field: summary.to_dict() for field, summary in fields.items()}
+                for bucket, fields in sorted(self.buckets.items())}
@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+
+class FirstDateFinder:
+    """
+    Finds the first date with data of one station.
+
+    Assumes a station has data on every day from its first date on. Gallops backwards
+    from the upper bound (1, 2, 4, ... days) until a day without data brackets the
+    first date, then narrows the bracket with a k-ary search probing `probes` dates
+    concurrently. Probe results are memoized, so no date is fetched twice.
+    One finder per station, instances share no state.
+    """
+
+    def __init__(self, probe, probes=1):
+        """
+        probe: function(date) -> bool, True when the station has data on that date
+        probes: number of dates probed concurrently per step
+        """
+        self.probe = probe
+        self.probes = max(1, probes)
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def has_data(self, day):
+        with self.lock:
+            if day in self.results:
+                return self.results[day]
+        result = self.probe(day)
+        with self.lock:
+            self.results[day] = result
+        return result
+
+    def probe_all(self, days):
+        """Probes days concurrently, returns their results in order."""
+        days = [day for day in days]
+        if self.probes == 1 or len(days) == 1:
+            return [self.has_data(day) for day in days]
+        with ThreadPoolExecutor(max_workers=min(self.probes, len(days))) as executor:
+            return list(executor.map(self.has_data, days))
+
+    def find(self, start_date, end_date):
+        """
+        Returns the first date between start_date and end_date (inclusive)
+        with data, or None if end_date has no data.
+        """
+        if end_date < start_date or not self.has_data(end_date):
+            return None
+
+        # Gallop backwards: `high` has data, look for a day without data below it
+        high = end_date
+        low = None
+        step = 1
+        while low is None:
+            candidates = []
+            for _ in range(self.probes):
+                candidate = max(start_date, high - timedelta(days=step))
+                if candidates and candidate == candidates[-1]:
+                    break
+                candidates.append(candidate)
+                step *= 2
+            for candidate, result in zip(candidates, self.probe_all(candidates)):
+                if result:
+                    high = candidate
+                else:
+                    low = candidate
+                    break
+            if low is None and high == start_date:
+                return start_date
+
+        # k-ary search: `low` has no data, `high` has data
+        while (high - low).days > 1:
+            span = (high - low).days
+            count = min(self.probes, span - 1)
+            candidates = sorted({low + timedelta(days=span * (i + 1) // (count + 1)) for i in range(count)})
+            for candidate, result in zip(candidates, self.probe_all(candidates)):
+                if result:
+                    high = candidate
+                    break
+                low = candidate
+        return high
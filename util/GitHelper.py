@@ -1,7 +1,11 @@
 import subprocess
 import os
+import random
+import time
 from datetime import date
 
+from util.Metrics import metrics
+
 
 class GitHelper:
     """Helper class for automating git operations on the weather-game repository"""
@@ -39,22 +43,30 @@ class GitHelper:
                 print(f"Error: Not a git repository: {repo_path}")
                 return False
 
+            if not files_to_add:
+                # "git add -A --" without paths would stage the whole work tree
+                print("No changed files to commit")
+                return True
+
             print(f"Committing to repository: {repo_path}")
 
-            # Stage all changes in backend/data directory (including deletions)
-            # This handles both new files and deleted old files
-            data_dir_result = subprocess.run(
-                ['git', 'add', '-A', 'backend/data'],
-                cwd=repo_path,
-                capture_output=True,
-                text=True
-            )
+            # Stage the files whose content changed and the files deleted from their
+            # directories (old data files); unchanged files are never rewritten, so there
+            # is nothing else to add
+            files_to_add = [*files_to_add, *GitHelper.deleted_files(repo_path, files_to_add)]
+            with metrics.timer('git_step_seconds', step='add'):
+                data_dir_result = subprocess.run(
+                    ['git', 'add', '-A', '--', *files_to_add],
+                    cwd=repo_path,
+                    capture_output=True,
+                    text=True
+                )
 
             if data_dir_result.returncode != 0:
-                print(f"Error staging backend/data directory: {data_dir_result.stderr}")
+                print(f"Error staging changed files: {data_dir_result.stderr}")
                 return False
 
-            print(f"Staged all changes in backend/data/ (including additions and deletions)")
+            print(f"Staged {len(files_to_add)} changed file(s)")
 
             # Verify new files exist
             for file in files_to_add:
@@ -64,24 +76,26 @@ class GitHelper:
                 else:
                     print(f"  Warning: File does not exist: {file_path}")
 
-            # Check if there are changes to commit in backend/data
-            status_result = subprocess.run(
-                ['git', 'status', '--porcelain', 'backend/data'],
-                cwd=repo_path,
-                capture_output=True,
-                text=True
-            )
+            # Check if there are changes to commit in the staged files
+            with metrics.timer('git_step_seconds', step='status'):
+                status_result = subprocess.run(
+                    ['git', 'status', '--porcelain', '--', *files_to_add],
+                    cwd=repo_path,
+                    capture_output=True,
+                    text=True
+                )
 
             changes_to_commit = status_result.stdout.strip()
 
             if changes_to_commit:
                 # There are changes - commit them
-                commit_result = subprocess.run(
-                    ['git', 'commit', '-m', commit_message],
-                    cwd=repo_path,
-                    capture_output=True,
-                    text=True
-                )
+                with metrics.timer('git_step_seconds', step='commit'):
+                    commit_result = subprocess.run(
+                        ['git', 'commit', '-m', commit_message],
+                        cwd=repo_path,
+                        capture_output=True,
+                        text=True
+                    )
 
                 if commit_result.returncode != 0:
                     print(f"Error committing:")
@@ -96,13 +110,15 @@ class GitHelper:
 
             # Pull before pushing to sync with remote
             print("Pulling latest changes from remote...")
-            pull_result = subprocess.run(
-                ['git', 'pull', '--rebase'],
-                cwd=repo_path,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            with metrics.timer('git_step_seconds', step='pull'):
+                pull_result = subprocess.run(
+                    # other unstaged changes in the work tree must not stop the rebase
+                    ['git', 'pull', '--rebase', '--autostash'],
+                    cwd=repo_path,
+                    capture_output=True,
+                    text=True,
+                    timeout=30
+                )
 
             if pull_result.returncode != 0:
                 print(f"Warning: Pull had issues:")
@@ -114,13 +130,14 @@ class GitHelper:
 
             # Push
             print("Pushing to remote...")
-            push_result = subprocess.run(
-                ['git', 'push'],
-                cwd=repo_path,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
+            with metrics.timer('git_step_seconds', step='push'):
+                push_result = subprocess.run(
+                    ['git', 'push'],
+                    cwd=repo_path,
+                    capture_output=True,
+                    text=True,
+                    timeout=30
+                )
 
             if push_result.returncode != 0:
                 print(f"Error pushing: {push_result.stderr}")
@@ -135,3 +152,154 @@ class GitHelper:
         except Exception as e:
             print(f"Error during git operations: {e}")
             return False
+
+    @staticmethod
+    def git(repo_path, *args, input=None, timeout=None):
+        return subprocess.run(['git', *args], cwd=repo_path, input=input, capture_output=True, text=True,
+                              timeout=timeout)
+
+    @staticmethod
+    def deleted_files(repo_path, files):
+        """Tracked files deleted from the work tree in the directories of files."""
+        directories = sorted({os.path.dirname(file) or '.' for file in files})
+        result = GitHelper.git(repo_path, 'ls-files', '--deleted', '-z', '--', *directories)
+        if result.returncode != 0:
+            return []
+        return [file for file in result.stdout.split('\0') if file and file not in files]
+
+    @staticmethod
+    def publish(repo_path, files_to_add, commit_date, push_retries=5):
+        """
+        Commits files_to_add and pushes, without scanning the whole work tree.
+
+        The index entries of the listed files, and of the files deleted from their
+        directories, are refreshed by a single `git update-index`, the commit is built with write-tree/commit-tree and
+        HEAD is moved with update-ref. A push rejected because the remote moved
+        on is fetched, rebased and retried up to push_retries times.
+
+        Args:
+            repo_path: Path to the git repository
+            files_to_add: List of file paths (relative to repo) that changed
+            commit_date: Date object or string for the commit message
+            push_retries: Number of fetch + rebase + push retries
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if isinstance(commit_date, date):
+            date_str = commit_date.strftime('%Y-%m-%d')
+        else:
+            date_str = str(commit_date)
+
+        commit_message = f"Add data for {date_str}"
+
+        try:
+            if not os.path.exists(os.path.join(repo_path, '.git')):
+                print(f"Error: Not a git repository: {repo_path}")
+                return False
+
+            if not files_to_add:
+                print("No changed files to commit")
+                return True
+
+            print(f"Committing to repository: {repo_path}")
+
+            # Only the listed paths and the directories holding them are looked at,
+            # --remove drops the ones that were deleted
+            files_to_add = [*files_to_add, *GitHelper.deleted_files(repo_path, files_to_add)]
+            with metrics.timer('git_step_seconds', step='update-index'):
+                index_result = GitHelper.git(repo_path, 'update-index', '--add', '--remove', '-z', '--stdin',
+                                             input=''.join(f'{file}\0' for file in files_to_add))
+            if index_result.returncode != 0:
+                print(f"Error staging changed files: {index_result.stderr}")
+                return False
+            print(f"Staged {len(files_to_add)} changed file(s)")
+
+            with metrics.timer('git_step_seconds', step='commit'):
+                tree = GitHelper.git(repo_path, 'write-tree')
+                if tree.returncode != 0:
+                    print(f"Error writing tree: {tree.stderr}")
+                    return False
+                tree = tree.stdout.strip()
+
+                head = GitHelper.git(repo_path, 'rev-parse', '--verify', '-q', 'HEAD').stdout.strip()
+                head_tree = GitHelper.git(repo_path, 'rev-parse', '--verify', '-q', 'HEAD^{tree}').stdout.strip()
+
+                if tree == head_tree:
+                    print("No new changes to commit (files already committed)")
+                else:
+                    parents = ['-p', head] if head else []
+                    commit = GitHelper.git(repo_path, 'commit-tree', tree, *parents, '-m', commit_message)
+                    if commit.returncode != 0:
+                        print(f"Error committing: {commit.stderr}")
+                        return False
+                    commit = commit.stdout.strip()
+                    # fails instead of losing a commit if HEAD moved in the meantime
+                    update = GitHelper.git(repo_path, 'update-ref', '-m', f'commit: {commit_message}',
+                                           'HEAD', commit, head or '')
+                    if update.returncode != 0:
+                        print(f"Error updating HEAD: {update.stderr}")
+                        return False
+                    print(f"Committed: {commit_message}")
+
+            return GitHelper.push_with_retry(repo_path, push_retries)
+
+        except subprocess.TimeoutExpired:
+            print("Error: Git push timed out")
+            return False
+        except Exception as e:
+            print(f"Error during git operations: {e}")
+            return False
+
+    @staticmethod
+    def upstream(repo_path):
+        """Returns (remote, remote ref) the current branch pushes to, or None on a detached HEAD."""
+        branch = GitHelper.git(repo_path, 'symbolic-ref', '--short', '-q', 'HEAD').stdout.strip()
+        if not branch:
+            return None
+        remote = GitHelper.git(repo_path, 'config', f'branch.{branch}.remote').stdout.strip() or 'origin'
+        merge = GitHelper.git(repo_path, 'config', f'branch.{branch}.merge').stdout.strip() or f'refs/heads/{branch}'
+        return remote, merge
+
+    @staticmethod
+    def push_with_retry(repo_path, retries=5):
+        """
+        Pushes HEAD to the upstream of the current branch. When the push is rejected
+        as non-fast-forward or loses the remote ref lock (another run pushed first), fetches the remote branch,
+        rebases onto it and pushes again, with a growing random pause in between.
+        """
+        upstream = GitHelper.upstream(repo_path)
+        if upstream is None:
+            print("Error: HEAD is not on a branch, nothing to push")
+            return False
+        remote, merge = upstream
+
+        for attempt in range(retries + 1):
+            print("Pushing to remote...")
+            with metrics.timer('git_step_seconds', step='push'):
+                push_result = GitHelper.git(repo_path, 'push', remote, f'HEAD:{merge}', timeout=30)
+            if push_result.returncode == 0:
+                print("Pushed to remote successfully")
+                return True
+
+            # a push that loses the race for the remote ref lock is rejected the same way
+            rejected = any(reason in push_result.stderr for reason in
+                           ('non-fast-forward', 'fetch first', 'cannot lock ref', 'failed to update ref'))
+            if not rejected or attempt == retries:
+                print(f"Error pushing: {push_result.stderr}")
+                return False
+
+            print(f"Push rejected, remote has new commits; rebasing (retry {attempt + 1}/{retries})")
+            metrics.count('git_push_retries_total')
+            with metrics.timer('git_step_seconds', step='pull'):
+                fetch_result = GitHelper.git(repo_path, 'fetch', remote, merge, timeout=30)
+                if fetch_result.returncode != 0:
+                    print(f"Error fetching: {fetch_result.stderr}")
+                    return False
+                rebase_result = GitHelper.git(repo_path, 'rebase', '--autostash', 'FETCH_HEAD')
+                if rebase_result.returncode != 0:
+                    print(f"Error rebasing onto {remote} {merge}: {rebase_result.stderr or rebase_result.stdout}")
+                    GitHelper.git(repo_path, 'rebase', '--abort')
+                    return False
+            time.sleep(random.uniform(0, min(10.0, 0.5 * 2 ** attempt)))
+        return False
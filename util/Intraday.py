@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+
+import config
+from util.Aggregate import Summary
+from util.JsonExtractor import JsonExtractor
+
+
+class Intraday:
+    """
+    Running summary of the current day of every station, kept up to date from
+    repeated fetches of the day's history page.
+
+    Every station remembers the date, the minute of its newest row, a digest of the
+    last page and the Summary of the columns behind the daily statistics. A page
+    that did not change is not parsed, a page that did is only parsed down to the
+    newest known row, and the new rows are merged into the running summaries.
+    The state starts over when the station's date changes.
+    """
+
+    # daily summary key -> (column, statistic); Precip_Accum accumulates since
+    # midnight, its highest value is the day total
+    statistics = {
+        "MaxTemp": ('Temperature', 'max'),
+        "MinTemp": ('Temperature', 'min'),
+        "MaxGust": ('Gust', 'max'),
+        "SumPrec": ('Precip_Accum', 'max'),
+    }
+    round_to_decimals = 2
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path
+        self.lock = threading.Lock()
+        # station -> {'date': 'YYYY-MM-DD', 'last_minute': int, 'digest': str, 'fields': {column: Summary}}
+        self.stations = {}
+        if state_path:
+            self.load()
+
+    @classmethod
+    def from_config(cls):
+        return cls(config.INTRADAY_STATE)
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f'Error reading intraday state {self.state_path}: {e}')
+            return
+        for station, state in data.items():
+            state['fields'] = {column: Summary.from_dict(summary) for column, summary in state['fields'].items()}
+            self.stations[station] = state
+
+    def save(self):
+        if not self.state_path:
+            return
+        with self.lock:
+            data = {station: {**state, 'fields': {column: summary.to_dict() for column, summary in state['fields'].items()}}
+                    for station, state in sorted(self.stations.items())}
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        JsonExtractor.write_if_changed(self.state_path, JsonExtractor.encode(data))
+
+    def state(self, station, date_string):
+        """Returns the state of station for date_string, a new one on a new day."""
+        with self.lock:
+            state = self.stations.get(station)
+            if state is None or state['date'] != date_string:
+                state = self.stations[station] = {'date': date_string, 'last_minute': -1, 'digest': None, 'fields': {}}
+            return state
+
+    def add(self, station, date_string, digest, columns, last_minute):
+        """
+        Merges the new rows of a page (ParsePool.parse_new_rows columns, None without
+        new rows) into the running summaries of station.
+        Returns the updated daily summary, or None when nothing changed.
+        """
+        with self.lock:
+            state = self.stations.get(station)
+            if state is None or state['date'] != date_string:
+                # the day changed while the page was parsed
+                return None
+            state['digest'] = digest
+            if columns is None:
+                return None
+            for column in {column for column, _ in self.statistics.values()}:
+                values = columns.get(column)
+                if values is None:
+                    continue
+                summary = state['fields'].get(column)
+                if summary is None:
+                    summary = state['fields'][column] = Summary()
+                for value in values:
+                    summary.add(value)
+            state['last_minute'] = last_minute
+            return self.values(state)
+
+    def summary(self, station):
+        """The daily summary (MaxTemp, MinTemp, MaxGust, SumPrec) of station so far, or None."""
+        with self.lock:
+            state = self.stations.get(station)
+            return self.values(state) if state else None
+
+    @classmethod
+    def values(cls, state):
+        result = {}
+        for key, (column, statistic) in cls.statistics.items():
+            summary = state['fields'].get(column)
+            value = getattr(summary, statistic) if summary is not None and summary.count else None
+            result[key] = round(value, cls.round_to_decimals) if isinstance(value, float) else value
+        return result
@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class Task:
+    """A claimed run of adjacent dates of one station."""
+
+    def __init__(self, station, url, dates, priority, owner):
+        self.station = station
+        self.url = url
+        self.dates = dates
+        self.priority = priority
+        self.owner = owner
+
+    @property
+    def start_date(self):
+        return datetime.strptime(self.dates[0], '%Y-%m-%d').date()
+
+    @property
+    def end_date(self):
+        return datetime.strptime(self.dates[-1], '%Y-%m-%d').date()
+
+    def __repr__(self):
+        return f'Task({self.station} {self.dates[0]}..{self.dates[-1]}, priority {self.priority})'
+
+
+class JobQueue:
+    """
+    Durable queue of (station, date) jobs in a SQLite file, drained by any number of
+    worker processes sharing the file (several machines need a filesystem with working
+    file locks, e.g. not most NFS setups).
+
+    Workers claim the most urgent ready job together with the adjacent ready dates of
+    the same station and priority (up to max_days), so one worker scrapes a contiguous
+    run over one keep-alive connection. A station is held by at most one worker at a
+    time, so its days are written to the stores by a single writer. Claimed jobs are leased: a worker that dies
+    stops renewing its lease and the jobs become claimable again once it expires.
+    Failed jobs are retried with exponential delay until max_attempts, then stay failed
+    until they are enqueued again.
+    """
+
+    # higher runs first, yesterday's data is always ahead of historical backfill
+    PRIORITY_DAILY = 100
+    PRIORITY_BACKFILL = 0
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            station TEXT NOT NULL,
+            date TEXT NOT NULL,
+            url TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            lease_expires REAL,
+            not_before REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (station, date)
+        )
+    '''
+    index = 'CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, date)'
+    # pending jobs whose retry delay passed, and leased jobs whose worker went away
+    ready = "((status = 'pending' AND not_before <= :now) OR (status = 'leased' AND lease_expires < :now))"
+    # stations another worker holds a live lease on
+    busy = "station IN (SELECT station FROM jobs WHERE status = 'leased' AND lease_expires >= :now)"
+
+    def __init__(self, db_path, lease_seconds=600, max_attempts=5, retry_delay=60):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(self.schema)
+            self.connection.execute(self.index)
+
+    @staticmethod
+    def now_string():
+        return datetime.now().isoformat(timespec='seconds')
+
+    def transaction(self, function, *args):
+        """Runs function(cursor, *args) in a write transaction, serialized across processes."""
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(cursor, *args)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def enqueue(self, weather_station_url, start_date, end_date, priority=PRIORITY_BACKFILL, force=False):
+        """
+        Adds a job for every date from start_date to end_date (inclusive).
+        Dates already queued keep the higher of both priorities; failed dates are
+        queued again. Dates already done are only queued again with force.
+        Returns the number of dates of the range.
+        """
+        weather_station_url = weather_station_url.strip()
+        station = weather_station_url.split('/')[-1]
+        updated_at = self.now_string()
+        rows = [(station, (start_date + timedelta(i)).strftime('%Y-%m-%d'), weather_station_url, priority, updated_at)
+                for i in range((end_date - start_date).days + 1)]
+        requeue = "status IN ('failed', 'done')" if force else "status = 'failed'"
+
+        def insert(cursor):
+            cursor.executemany(
+                "INSERT INTO jobs (station, date, url, priority, status, updated_at) VALUES (?, ?, ?, ?, 'pending', ?) "
+                "ON CONFLICT (station, date) DO UPDATE SET "
+                "url = excluded.url, priority = max(priority, excluded.priority), updated_at = excluded.updated_at", rows)
+            cursor.executemany(
+                f"UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0, error = NULL "
+                f"WHERE station = ? AND date = ? AND {requeue}", [(row[0], row[1]) for row in rows])
+
+        self.transaction(insert)
+        return len(rows)
+
+    def claim(self, owner, max_days=31):
+        """
+        Leases the most urgent ready job of a station no other worker holds, and the
+        ready dates following it for the same station and priority, up to max_days
+        contiguous dates. Returns a Task, or None when no job is ready.
+        """
+        def claim_run(cursor):
+            now = time.time()
+            head = cursor.execute(
+                f'SELECT station, date, url, priority FROM jobs WHERE {self.ready} AND NOT {self.busy} '
+                'ORDER BY priority DESC, date, station LIMIT 1', {'now': now}).fetchone()
+            if head is None:
+                return None
+            station, first_date, url, priority = head
+            candidates = cursor.execute(
+                f'SELECT date FROM jobs WHERE station = :station AND priority = :priority AND date >= :date '
+                f'AND {self.ready} ORDER BY date LIMIT :limit',
+                {'station': station, 'priority': priority, 'date': first_date, 'now': now, 'limit': max_days}).fetchall()
+
+            # keep the contiguous run starting at the head
+            dates = []
+            expected = datetime.strptime(first_date, '%Y-%m-%d').date()
+            for (date_string,) in candidates:
+                if date_string != expected.strftime('%Y-%m-%d'):
+                    break
+                dates.append(date_string)
+                expected += timedelta(1)
+
+            cursor.executemany(
+                "UPDATE jobs SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE station = ? AND date = ?",
+                [(owner, now + self.lease_seconds, self.now_string(), station, date_string) for date_string in dates])
+            return Task(station, url, dates, priority, owner)
+
+        return self.transaction(claim_run)
+
+    def extend(self, task):
+        """Renews the lease of the dates of task that are still leased by its owner."""
+        def renew(cursor):
+            cursor.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE station = ? AND owner = ? AND status = 'leased' "
+                "AND date BETWEEN ? AND ?",
+                (time.time() + self.lease_seconds, task.station, task.owner, task.dates[0], task.dates[-1]))
+        self.transaction(renew)
+
+    def complete(self, task, date_string):
+        def done(cursor):
+            cursor.execute(
+                "UPDATE jobs SET status = 'done', owner = NULL, lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE station = ? AND date = ? AND owner = ? AND status = 'leased'",
+                (self.now_string(), task.station, date_string, task.owner))
+        self.transaction(done)
+
+    def fail(self, task, date_string, error):
+        """Queues a failed date again after a growing delay, or marks it failed after max_attempts."""
+        def failed(cursor):
+            row = cursor.execute(
+                "SELECT attempts FROM jobs WHERE station = ? AND date = ? AND owner = ? AND status = 'leased'",
+                (task.station, date_string, task.owner)).fetchone()
+            if row is None:
+                return
+            attempts = row[0]
+            status = 'failed' if attempts >= self.max_attempts else 'pending'
+            not_before = time.time() + self.retry_delay * 2 ** (attempts - 1)
+            cursor.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL, not_before = ?, error = ?, "
+                "updated_at = ? WHERE station = ? AND date = ?",
+                (status, not_before, f'{type(error).__name__}: {error}', self.now_string(), task.station, date_string))
+        self.transaction(failed)
+
+    def release(self, task):
+        """Returns the dates of task that are still leased to the queue, without counting an attempt."""
+        def give_back(cursor):
+            cursor.execute(
+                "UPDATE jobs SET status = 'pending', owner = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                "WHERE station = ? AND owner = ? AND status = 'leased' AND date BETWEEN ? AND ?",
+                (task.station, task.owner, task.dates[0], task.dates[-1]))
+        self.transaction(give_back)
+
+    def counts(self):
+        """Returns {(status, priority): number of jobs}."""
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT status, priority, COUNT(*) FROM jobs GROUP BY status, priority').fetchall()
+        return {(status, priority): count for status, priority, count in rows}
+
+    def failures(self, limit=20):
+        """Returns [(station, date, error)] of the jobs that used up their attempts."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT station, date, error FROM jobs WHERE status = 'failed' ORDER BY station, date LIMIT ?",
+                (limit,)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,11 +1,121 @@
+import hashlib
 import json
 import os
+import stat
+import tempfile
 from datetime import date
 
+from util.Metrics import metrics
+
 
 class JsonExtractor:
     """Saves weather summary statistics to JSON files"""
 
+    # mkstemp creates 0600 files, new files get the mode open() would give them;
+    # the umask can only be read by setting it, so once at import before any writer thread
+    umask = os.umask(0)
+    os.umask(umask)
+    new_file_mode = 0o666 & ~umask
+
+    @staticmethod
+    def date_string(end_date):
+        # Convert date to string if needed
+        if isinstance(end_date, date):
+            return end_date.strftime('%Y-%m-%d')
+        return str(end_date)
+
+    @staticmethod
+    def encode(data) -> bytes:
+        # compact separators: smaller files and faster to write than indented JSON
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def write_if_changed(path, content: bytes) -> bool:
+        """
+        Atomically replaces path with content (temp file + rename) unless it
+        already holds the same content. Returns True if the file was written.
+        A replaced file keeps its permissions.
+        """
+        mode = JsonExtractor.new_file_mode
+        try:
+            with open(path, 'rb') as f:
+                mode = stat.S_IMODE(os.fstat(f.fileno()).st_mode)
+                if hashlib.sha256(f.read()).digest() == hashlib.sha256(content).digest():
+                    return False
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    @staticmethod
+    def load_index(path) -> dict:
+        """The summaries of an index file, {} when it does not exist or is not readable."""
+        try:
+            with open(path, 'rb') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Error reading index file {path}, writing it again: {e}")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def save_summaries(summaries, end_date, output_dir=None, index=False):
+        """
+        Saves the summaries of all stations in one batch.
+
+        Args:
+            summaries: Dictionary of station id -> summary (stations with None are skipped)
+            end_date: End date as date object or string (YYYY-MM-DD)
+            output_dir: Optional directory to save the JSON files (default: current directory)
+            index: Also merge the summaries into index-<date>.json, which keeps the
+                   stations saved by earlier batches of the same date
+
+        Returns:
+            Paths of the files whose content changed (unchanged files are not rewritten)
+        """
+        end_date_str = JsonExtractor.date_string(end_date)
+        output_dir = output_dir or '.'
+        os.makedirs(output_dir, exist_ok=True)
+
+        # serialize everything first, so a failing station can not leave a partial batch
+        files = {}
+        for station_id, summary_data in sorted(summaries.items()):
+            if summary_data is None:
+                continue
+            files[os.path.join(output_dir, f"{station_id}_{end_date_str}.json")] = JsonExtractor.encode(summary_data)
+        if index and files:
+            index_path = os.path.join(output_dir, f"index-{end_date_str}.json")
+            combined = JsonExtractor.load_index(index_path)
+            combined.update((station_id, summary_data) for station_id, summary_data in summaries.items()
+                            if summary_data is not None)
+            files[index_path] = JsonExtractor.encode(dict(sorted(combined.items())))
+
+        changed = []
+        for json_filepath, content in files.items():
+            try:
+                if JsonExtractor.write_if_changed(json_filepath, content):
+                    changed.append(json_filepath)
+                    metrics.count('json_files_total', status='written')
+                else:
+                    metrics.count('json_files_total', status='unchanged')
+            except OSError as e:
+                print(f"Error writing JSON file {json_filepath}: {e}")
+                metrics.count('json_files_total', status='failed')
+        print(f"JSON files: {len(changed)} written, {len(files) - len(changed)} unchanged or failed")
+        return changed
+
     @staticmethod
     def save_summary_to_json(summary_data, station_id, end_date, output_dir=None):
         """
@@ -20,11 +130,7 @@ class JsonExtractor:
         Returns:
             Path to the created JSON file
         """
-        # Convert date to string if needed
-        if isinstance(end_date, date):
-            end_date_str = end_date.strftime('%Y-%m-%d')
-        else:
-            end_date_str = str(end_date)
+        end_date_str = JsonExtractor.date_string(end_date)
 
         # Create JSON filename
         json_filename = f"{station_id}_{end_date_str}.json"
@@ -38,8 +144,7 @@ class JsonExtractor:
 
         # Write JSON file
         try:
-            with open(json_filepath, 'w') as jsonfile:
-                json.dump(summary_data, jsonfile, indent=4)
+            JsonExtractor.write_if_changed(json_filepath, JsonExtractor.encode(summary_data))
             print(f"JSON file created: {json_filepath}")
             return json_filepath
         except Exception as e:
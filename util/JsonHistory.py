@@ -0,0 +1,138 @@
+import json
+from datetime import datetime, timedelta
+
+import requests
+
+import config
+from util.Metrics import metrics
+
+
+class JsonHistory:
+    """
+    Station history from the JSON PWS history endpoint (api.weather.com/v2/pws/history/all)
+    instead of the rendered history pages.
+
+    One request per station and day returns the observations as compact JSON. They are
+    mapped to the same structures the HTML path produces: the daily summary of
+    Parser.parse_summary_table and the rows of Parser.parse_html_table.
+    Values are requested in imperial units ("units=e"), like the pages.
+    The API key is only added to the request itself: the day URLs that are logged and
+    stored with failures do not contain it, and neither do the errors fetch raises.
+    """
+
+    # 16 point compass the history pages use for the Wind column
+    wind_directions = ['North', 'NNE', 'NE', 'ENE', 'East', 'ESE', 'SE', 'SSE',
+                       'South', 'SSW', 'SW', 'WSW', 'West', 'WNW', 'NW', 'NNW']
+    # row column -> (observation key, whether it is in the "imperial" block, unit shown on the page),
+    # in the column order of the history table
+    row_fields = (
+        ('Temperature', 'tempAvg', True, '°F'),
+        ('Dew_Point', 'dewptAvg', True, '°F'),
+        ('Humidity', 'humidityAvg', False, '%'),
+        ('Wind', 'winddirAvg', False, None),
+        ('Speed', 'windspeedAvg', True, 'mph'),
+        ('Gust', 'windgustHigh', True, 'mph'),
+        ('Pressure', 'pressureMax', True, 'in'),
+        ('Precip_Rate', 'precipRate', True, 'in'),
+        ('Precip_Accum', 'precipTotal', True, 'in'),
+        ('UV', 'uvHigh', False, ''),
+        ('Solar', 'solarRadiationHigh', False, 'w/m²'),
+    )
+
+    def __init__(self, api_url, api_key=None):
+        self.api_url = api_url
+        self.api_key = api_key
+
+    @classmethod
+    def from_config(cls):
+        return cls(api_url=config.JSON_API_URL, api_key=config.JSON_API_KEY)
+
+    def day_url(self, station_name, date_string):
+        """URL of a station day, without the API key."""
+        day = date_string.replace('-', '')
+        return f'{self.api_url}?stationId={station_name}&format=json&units=e&numericPrecision=decimal&date={day}'
+
+    def redact(self, text):
+        return text.replace(self.api_key, '***') if self.api_key else text
+
+    def date_url_generator(self, station_name, start_date, end_date):
+        """Yields (date_string, url) like Utils.date_url_generator."""
+        for i in range((end_date - start_date).days + 1):
+            date_string = (start_date + timedelta(i)).strftime("%Y-%m-%d")
+            yield date_string, self.day_url(station_name, date_string)
+
+    def fetch(self, session, url, timeout=None):
+        """
+            Returns the response body of a day_url, b'' when the station has no data for
+            the day (204). Raises on HTTP error statuses.
+        """
+        params = {'apiKey': self.api_key} if self.api_key else None
+        try:
+            with metrics.timer('fetch_seconds'):
+                response = session.get(url, timeout=timeout, params=params)
+        except requests.exceptions.RequestException as e:
+            # connection errors quote the request URL
+            raise type(e)(self.redact(str(e))) from None
+        metrics.count('responses_total', status=response.status_code)
+        metrics.observe('response_bytes', len(response.content))
+        if response.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{response.status_code} Error: {response.reason} for url: {url}',
+                                                response=response)
+        return response.content
+
+    @staticmethod
+    def parse(content) -> list:
+        """Returns the observations of a response in time order."""
+        if not content or not content.strip():
+            return []
+        observations = json.loads(content).get('observations') or []
+        return sorted(observations, key=lambda observation: observation.get('epoch') or 0)
+
+    @staticmethod
+    def summary(observations) -> dict:
+        """
+        The daily summary of Parser.parse_summary_table: highest and lowest temperature,
+        highest gust and the precipitation accumulated over the day.
+        """
+        def values(key):
+            return [value for value in ((observation.get('imperial') or {}).get(key) for observation in observations)
+                    if value is not None]
+
+        highs, lows, gusts, totals = values('tempHigh'), values('tempLow'), values('windgustHigh'), values('precipTotal')
+        return {
+            "MaxTemp": max(highs) if highs else None,
+            "MinTemp": min(lows) if lows else None,
+            "MaxGust": max(gusts) if gusts else None,
+            # precipTotal accumulates since midnight, its highest value is the day total
+            "SumPrec": max(totals) if totals else None,
+        }
+
+    @classmethod
+    def rows(cls, observations) -> list:
+        """The rows of Parser.parse_html_table, ready for ConvertToSystem.clean_and_convert."""
+        rows = []
+        for observation in observations:
+            try:
+                local_time = datetime.strptime(observation['obsTimeLocal'], '%Y-%m-%d %H:%M:%S')
+            except (KeyError, TypeError, ValueError):
+                continue
+            imperial = observation.get('imperial') or {}
+            row = {'Date': local_time.strftime('%Y/%m/%d'), 'Time': local_time.strftime('%I:%M %p')}
+            for column, key, in_imperial, unit in cls.row_fields:
+                value = (imperial if in_imperial else observation).get(key)
+                row[column] = cls.wind_direction(value) if unit is None else cls.display(value, unit)
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def display(value, unit):
+        # same shape as a page cell ("45.2 °F"), empty when missing
+        if value is None:
+            return ''
+        return f'{value} {unit}' if unit else str(value)
+
+    @classmethod
+    def wind_direction(cls, degrees):
+        if degrees is None:
+            return ''
+        return cls.wind_directions[int((degrees % 360) / 22.5 + 0.5) % 16]
@@ -0,0 +1,211 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the quantile (max for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, bound in enumerate(self.buckets):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def report(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'min': self.min,
+            'max': self.max,
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe counters and histograms of one scraper run.
+
+    Counters and histograms are identified by name and labels, e.g.
+    metrics.count('errors_total', type='HTTPError') or
+    with metrics.timer('git_step_seconds', step='push'): ...
+    """
+
+    prefix = 'weather_scraper_'
+    seconds_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    bytes_buckets = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=None, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                if buckets is None:
+                    buckets = self.bytes_buckets if name.endswith('_bytes') else self.seconds_buckets
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def label_string(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{str(value)}"' for name, value in pairs) + '}'
+
+    def report(self):
+        with self.lock:
+            return {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'duration_seconds': round(time.time() - self.started, 3),
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'histograms': [
+                    dict({'name': name, 'labels': dict(labels)}, **histogram.report())
+                    for (name, labels), histogram in sorted(self.histograms.items())
+                ],
+            }
+
+    def prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = self.prefix + name
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} counter')
+                    typed.add(metric)
+                lines.append(f'{metric}{self.label_string(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = self.prefix + name
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} histogram')
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{self.label_string(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{metric}_bucket{self.label_string(labels, [("le", "+Inf")])} {histogram.count}')
+                lines.append(f'{metric}_sum{self.label_string(labels)} {histogram.sum}')
+                lines.append(f'{metric}_count{self.label_string(labels)} {histogram.count}')
+            lines.append(f'# TYPE {self.prefix}last_run_timestamp_seconds gauge')
+            lines.append(f'{self.prefix}last_run_timestamp_seconds {int(self.started)}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def write_atomic(path, text):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def write(self, metrics_dir):
+        """
+        Writes the run report as metrics_dir/run_<timestamp>.json and the Prometheus
+        textfile as metrics_dir/weather_scraper.prom (replaced on every run).
+        Returns the path of the JSON report.
+        """
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.started))
+        json_path = os.path.join(metrics_dir, f'run_{stamp}.json')
+        self.write_atomic(json_path, json.dumps(self.report(), indent=4))
+        self.write_atomic(os.path.join(metrics_dir, 'weather_scraper.prom'), self.prometheus())
+        return json_path
+
+    @staticmethod
+    def profile(output_dir, name, function, *args, **kwargs):
+        """
+        Runs function under cProfile and tracemalloc. Writes output_dir/profile_<name>.pstats
+        and a text summary (top functions and allocation sites) to profile_<name>.txt.
+        Only the calling thread is profiled.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        profiler = cProfile.Profile()
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        profiler.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+            profiler.dump_stats(os.path.join(output_dir, f'profile_{name}.pstats'))
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+            summary.write(f'\nPeak traced memory: {peak / 1024:.1f} KB\nTop allocation sites:\n')
+            for stat in snapshot.statistics('lineno')[:15]:
+                summary.write(f'  {stat}\n')
+            with open(os.path.join(output_dir, f'profile_{name}.txt'), 'w') as f:
+                f.write(summary.getvalue())
+            print(f'Profile of {name} written to {output_dir}')
+
+
+# metrics of the current run, shared by every module
+metrics = Metrics()
@@ -0,0 +1,214 @@
+import math
+import os
+import sqlite3
+import threading
+
+from util.Aggregate import Aggregate
+from util.ObservationStore import ObservationStore
+from util.UnitConverter import ConvertToSystem
+from util.Utils import Utils
+
+
+class ObservationDB:
+    """
+    Indexed SQLite (WAL) database of daily summaries and observation rows.
+
+        daily         (station, date)      -> MaxTemp, MinTemp, MaxGust, SumPrec of the day
+        observations  (station, timestamp) -> one column per ObservationStore field
+
+    Both tables are clustered on their key (WITHOUT ROWID), so per-station ranges
+    are read in key order; the date/timestamp indexes cover the cross-station
+    queries. Writes are upserts, reruns over overlapping dates replace the rows
+    they scraped again instead of duplicating them.
+    Timestamps are station local time as UTC seconds, like in ObservationStore.
+
+    The daily table holds the summaries as the history pages show them (imperial, like
+    the station JSON files), the observation rows are in `unit_system` (UNIT_SYSTEM),
+    which the file records and refuses to mix. observation_summaries converts its
+    results to the units of the daily table, so both queries agree.
+    """
+
+    # daily summary key -> column of the daily table, and its SQL aggregate over a date range
+    daily_columns = {"MaxTemp": 'max_temp', "MinTemp": 'min_temp', "MaxGust": 'max_gust', "SumPrec": 'sum_prec'}
+    range_aggregates = {"MaxTemp": 'MAX(max_temp)', "MinTemp": 'MIN(min_temp)', "MaxGust": 'MAX(max_gust)',
+                        "SumPrec": 'SUM(sum_prec)'}
+    # daily summary key -> SQL aggregate of the observation rows of a bucket; Precip_Accum
+    # accumulates since midnight, its highest value of a day is the day total
+    observation_aggregates = {"MaxTemp": 'MAX(temperature)', "MinTemp": 'MIN(temperature)',
+                              "MaxGust": 'MAX(gust)', "SumPrec": 'MAX(precip_accum)'}
+    # observation row key -> column
+    observation_columns = dict({'Wind': 'wind'}, **{field: field.lower() for field in ObservationStore.numeric_fields})
+    # daily summary key -> measure, for converting observation aggregates to the units of the pages
+    summary_measures = {"MaxTemp": 'temperature', "MinTemp": 'temperature', "MaxGust": 'speed',
+                        "SumPrec": 'precipitation'}
+    round_to_decimals = Aggregate.round_to_decimals
+
+    schema = (
+        '''
+        CREATE TABLE IF NOT EXISTS daily (
+            station TEXT NOT NULL,
+            date TEXT NOT NULL,
+            max_temp REAL,
+            min_temp REAL,
+            max_gust REAL,
+            sum_prec REAL,
+            PRIMARY KEY (station, date)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS daily_by_date ON daily (date, station, max_temp, min_temp, max_gust, sum_prec)',
+        '''
+        CREATE TABLE IF NOT EXISTS observations (
+            station TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            ''' + ''.join(f'{column} {"TEXT" if column == "wind" else "REAL"}, '
+                          for column in observation_columns.values()) + '''
+            PRIMARY KEY (station, timestamp)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS observations_by_time ON observations (timestamp, station, temperature, gust, precip_accum)',
+        'CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+    )
+
+    def __init__(self, db_path, unit_system='imperial'):
+        if unit_system not in ConvertToSystem.supported_systems:
+            raise ValueError(f'unit system {unit_system} not supported')
+        self.db_path = db_path
+        self.unit_system = unit_system
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # station threads share one connection, writes are serialized by the lock;
+        # worker processes sharing the file wait for each other's writes
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                self.connection.execute(statement)
+            self.connection.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('observation_units', ?)",
+                                    (unit_system,))
+            stored_units = self.connection.execute(
+                "SELECT value FROM settings WHERE key = 'observation_units'").fetchone()[0]
+            self.connection.commit()
+        if stored_units != unit_system:
+            raise ValueError(f'{db_path} holds {stored_units} observation rows, not {unit_system}')
+
+    @staticmethod
+    def number(value):
+        # 'NA', NaN and None are stored as NULL
+        return value if isinstance(value, (int, float)) and not math.isnan(value) else None
+
+    def upsert_day(self, station, date_string, summary, rows=None):
+        """
+        Stores the summary of one day and, optionally, its observation rows as
+        returned by ConvertToSystem.clean_and_convert, in one transaction.
+        Returns the number of observation rows written.
+        """
+        daily = (station, date_string, *[self.number(summary.get(key)) for key in self.daily_columns])
+        columns = list(self.observation_columns.items())
+        observations = []
+        for row in rows or ():
+            try:
+                timestamp = Utils.observation_timestamp(row['Date'], row['Time'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            observations.append((station, timestamp, *[row.get(key) if key == 'Wind' else self.number(row.get(key))
+                                                      for key, _ in columns]))
+        names = [column for _, column in columns]
+
+        with self.lock:
+            with self.connection:
+                self.connection.execute(
+                    'INSERT INTO daily (station, date, max_temp, min_temp, max_gust, sum_prec) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (station, date) DO UPDATE SET max_temp = excluded.max_temp, '
+                    'min_temp = excluded.min_temp, max_gust = excluded.max_gust, sum_prec = excluded.sum_prec',
+                    daily)
+                if observations:
+                    self.connection.executemany(
+                        f'INSERT INTO observations (station, timestamp, {", ".join(names)}) '
+                        f'VALUES (?, ?, {", ".join("?" * len(names))}) ON CONFLICT (station, timestamp) DO UPDATE SET '
+                        + ', '.join(f'{name} = excluded.{name}' for name in names),
+                        observations)
+        return len(observations)
+
+    def values(self, row):
+        """{MaxTemp, MinTemp, MaxGust, SumPrec} of a query row in range_aggregates order."""
+        return {key: round(value, self.round_to_decimals) if isinstance(value, float) else value
+                for key, value in zip(self.range_aggregates, row)}
+
+    @staticmethod
+    def station_filter(stations, column='station'):
+        if stations is None:
+            return '', []
+        stations = list(stations)
+        return f' AND {column} IN ({", ".join("?" * len(stations))})', stations
+
+    def summaries(self, start_date, end_date, stations=None):
+        """
+        Returns {station: summary} of the days from start_date to end_date (inclusive)
+        with the statistics of Aggregate.summary_statistics, i.e. the content of the
+        station JSON files. stations limits the result to these station ids.
+        """
+        where, parameters = self.station_filter(stations)
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT station, {", ".join(self.range_aggregates.values())} FROM daily '
+                f'WHERE date BETWEEN ? AND ?{where} GROUP BY station ORDER BY station',
+                [str(start_date), str(end_date), *parameters]).fetchall()
+        return {row[0]: self.values(row[1:]) for row in rows}
+
+    def daily(self, station, start_date, end_date):
+        """Returns {date_string: summary} of the stored days of station."""
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT date, {", ".join(self.daily_columns.values())} FROM daily '
+                'WHERE station = ? AND date BETWEEN ? AND ? ORDER BY date',
+                (station, str(start_date), str(end_date))).fetchall()
+        return {row[0]: self.values(row[1:]) for row in rows}
+
+    def leaders(self, key, start_date, end_date, limit=10):
+        """
+        Returns [(station, date_string, value)] of the days with the highest value of
+        key (lowest for MinTemp) between start_date and end_date, over all stations.
+        """
+        column = self.daily_columns[key]
+        order = 'ASC' if key == 'MinTemp' else 'DESC'
+        with self.lock:
+            return self.connection.execute(
+                f'SELECT station, date, {column} FROM daily WHERE date BETWEEN ? AND ? AND {column} IS NOT NULL '
+                f'ORDER BY {column} {order}, date, station LIMIT ?',
+                (str(start_date), str(end_date), limit)).fetchall()
+
+    def observation_summaries(self, start, end, stations=None, period='day'):
+        """
+        Returns {station: {bucket: summary}} computed from the observation rows with
+        start <= timestamp < end, per 'hour' or 'day' bucket (keys as in Aggregate).
+        SumPrec is the accumulated precipitation at the end of the bucket, the day
+        total for days. Values are in the units of the daily table.
+        """
+        where, parameters = self.station_filter(stations)
+        step = Aggregate.seconds[period]
+        # integer buckets, formatting the key per row in SQL costs more than the query
+        with self.lock:
+            rows = self.connection.execute(
+                f'SELECT station, timestamp / {step} AS bucket, {", ".join(self.observation_aggregates.values())} '
+                f'FROM observations WHERE timestamp >= ? AND timestamp < ?{where} '
+                'GROUP BY station, bucket ORDER BY station, bucket',
+                [int(start), int(end), *parameters]).fetchall()
+        keys = Aggregate(period)
+        result = {}
+        for row in rows:
+            result.setdefault(row[0], {})[keys.bucket_key(row[1] * step)] = self.values(self.page_units(row[2:]))
+        return result
+
+    def page_units(self, row):
+        """Converts a query row of observation aggregates (range_aggregates order) to the (imperial) units of the daily table."""
+        if self.unit_system == 'imperial':
+            return row
+        return [ConvertToSystem.imperial_transforms[self.summary_measures[key]](value) if value is not None else None
+                for key, value in zip(self.range_aggregates, row)]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,348 @@
+import bisect
+import calendar
+import json
+import math
+import mmap
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+
+from util.Aggregate import Aggregate
+from util.Utils import Utils
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class ObservationSegment:
+    """
+    One station-month of observations, memory-mapped read-only.
+    `columns` maps each field to a memoryview over the mapped file, so reading
+    does not copy or parse anything.
+    """
+
+    def __init__(self, station, month, columns, wind_codes, maps):
+        self.station = station
+        self.month = month
+        self.columns = columns
+        self.wind_codes = wind_codes
+        self._maps = maps
+
+    def __len__(self):
+        return len(self.columns['Timestamp'])
+
+    def wind(self):
+        """Decodes the Wind column back to direction strings."""
+        return [self.wind_codes[code] for code in self.columns['Wind']]
+
+    def close(self):
+        for column in self.columns.values():
+            column.release()
+        for m in self._maps:
+            m.close()
+        self.columns = {}
+        self._maps = []
+
+
+class ObservationStore:
+    """
+    Columnar on-disk store of observation rows, one directory per station and month:
+
+        {root}/{station}/{YYYY-MM}/Timestamp.i64   int64 seconds, station local time as UTC
+        {root}/{station}/{YYYY-MM}/{field}.f64     float64 per numeric field, NaN when missing
+        {root}/{station}/{YYYY-MM}/Wind.u8         uint8 codes into meta.json "wind_codes"
+        {root}/{station}/{YYYY-MM}/meta.json       row count, authoritative over file sizes
+
+    Rows are kept in time order, one row per timestamp. Rows newer than the last stored
+    row of their month are appended; older ones (retried or out-of-order days) are merged
+    in, replacing the stored row of the same time, by writing the month's columns again
+    as a new generation ({field}.{generation}.{ext}) that meta.json switches to at once.
+    Writers of a station-month are serialized by a lock held across threads and processes.
+    """
+
+    numeric_fields = ('Temperature', 'Dew_Point', 'Humidity', 'Speed', 'Gust', 'Pressure',
+                      'Precip_Rate', 'Precip_Accum', 'UV', 'Solar')
+    typecodes = dict({'Timestamp': 'q', 'Wind': 'B'}, **{field: 'd' for field in numeric_fields})
+    extensions = {'q': 'i64', 'd': 'f64', 'B': 'u8'}
+
+    # (root, station, month) -> lock of the writers in this process
+    _locks = {}
+    _locks_guard = threading.Lock()
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def month_key(timestamp: int) -> str:
+        return time.strftime('%Y-%m', time.gmtime(timestamp))
+
+    @classmethod
+    def field_file(cls, field, generation=0):
+        extension = cls.extensions[cls.typecodes[field]]
+        return f'{field}.{generation}.{extension}' if generation else f'{field}.{extension}'
+
+    def segment_dir(self, station, month):
+        return os.path.join(self.root, station, month)
+
+    @contextmanager
+    def segment_lock(self, station, month):
+        """Exclusive lock of a station-month, across the threads and processes writing to root."""
+        with self._locks_guard:
+            lock = self._locks.setdefault((os.path.abspath(self.root), station, month), threading.Lock())
+        with lock:
+            os.makedirs(os.path.join(self.root, station), exist_ok=True)
+            with open(os.path.join(self.root, station, f'{month}.lock'), 'a+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            # LK_LOCK gives up after 10 seconds
+                            continue
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @staticmethod
+    def number(value) -> float:
+        return float(value) if isinstance(value, (int, float)) else math.nan
+
+    def read_meta(self, station, month):
+        path = os.path.join(self.segment_dir(station, month), 'meta.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # code 0 is reserved for missing directions
+            return {'rows': 0, 'byteorder': sys.byteorder, 'wind_codes': ['NA']}
+
+    def write_meta(self, station, month, meta):
+        directory = self.segment_dir(station, month)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    def last_timestamp(self, station, month, meta):
+        if meta['rows'] == 0:
+            return None
+        path = os.path.join(self.segment_dir(station, month), self.field_file('Timestamp', meta.get('generation', 0)))
+        with open(path, 'rb') as f:
+            f.seek((meta['rows'] - 1) * 8)
+            last = array('q')
+            last.frombytes(f.read(8))
+        return last[0]
+
+    def read_columns(self, station, month, meta):
+        """Reads the stored rows of a station-month into arrays."""
+        directory = self.segment_dir(station, month)
+        columns = {}
+        for field, typecode in self.typecodes.items():
+            column = array(typecode)
+            if meta['rows']:
+                with open(os.path.join(directory, self.field_file(field, meta.get('generation', 0))), 'rb') as f:
+                    column.fromfile(f, meta['rows'])
+            columns[field] = column
+        return columns
+
+    def encode(self, rows, wind_codes):
+        """Columns of (timestamp, row) pairs, new wind directions are added to wind_codes."""
+        columns = {field: array(typecode) for field, typecode in self.typecodes.items()}
+        for timestamp, row in rows:
+            columns['Timestamp'].append(timestamp)
+            for field in self.numeric_fields:
+                columns[field].append(self.number(row.get(field)))
+            wind = row.get('Wind')
+            wind = wind if isinstance(wind, str) and wind else 'NA'
+            if wind not in wind_codes and len(wind_codes) < 256:
+                wind_codes.append(wind)
+            columns['Wind'].append(wind_codes.index(wind) if wind in wind_codes else 0)
+        return columns
+
+    def append(self, station: str, rows: list) -> int:
+        """
+        Appends rows as returned by ConvertToSystem.clean_and_convert
+        (Date, Time and converted values, 'NA' when missing).
+        A row replaces the stored row of the same time.
+        Returns the number of rows stored (new or changed).
+        """
+        by_month = {}
+        for row in rows:
+            try:
+                timestamp = Utils.observation_timestamp(row['Date'], row['Time'])
+            except (KeyError, ValueError, TypeError):
+                continue
+            by_month.setdefault(self.month_key(timestamp), []).append((timestamp, row))
+
+        stored = 0
+        for month, month_rows in sorted(by_month.items()):
+            with self.segment_lock(station, month):
+                stored += self._append_segment(station, month, month_rows)
+        return stored
+
+    def _append_segment(self, station, month, month_rows):
+        directory = self.segment_dir(station, month)
+        os.makedirs(directory, exist_ok=True)
+        meta = self.read_meta(station, month)
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError(f'segment {directory} was written with {meta["byteorder"]}-endian byte order')
+
+        # the last row of a timestamp wins
+        new_rows = sorted(dict(month_rows).items(), key=lambda item: item[0])
+        last = self.last_timestamp(station, month, meta)
+        if last is not None and new_rows[0][0] <= last:
+            return self._merge_segment(station, month, meta, new_rows)
+
+        columns = self.encode(new_rows, meta['wind_codes'])
+        generation = meta.get('generation', 0)
+        for field, column in columns.items():
+            path = os.path.join(directory, self.field_file(field, generation))
+            with open(path, 'ab') as f:
+                # drop bytes of an earlier append that never made it into meta.json
+                f.truncate(meta['rows'] * column.itemsize)
+                f.write(column.tobytes())
+
+        meta['rows'] += len(new_rows)
+        self.write_meta(station, month, meta)
+        return len(new_rows)
+
+    def _merge_segment(self, station, month, meta, new_rows):
+        """Merges rows that are not all newer than the stored ones, writing the month again."""
+        stored = self.read_columns(station, month, meta)
+        new = self.encode(new_rows, meta['wind_codes'])
+        position = {timestamp: index for index, timestamp in enumerate(stored['Timestamp'])}
+
+        def same(index, stored_index):
+            # byte comparison, so NaN equals NaN
+            return all(stored[field][stored_index:stored_index + 1].tobytes() == column[index:index + 1].tobytes()
+                       for field, column in new.items())
+
+        changed = [index for index, timestamp in enumerate(new['Timestamp'])
+                   if timestamp not in position or not same(index, position[timestamp])]
+        if not changed:
+            return 0
+
+        replaced = {position[timestamp] for timestamp in new['Timestamp'] if timestamp in position}
+        order = sorted([(timestamp, 0, index) for index, timestamp in enumerate(stored['Timestamp'])
+                        if index not in replaced]
+                       + [(timestamp, 1, index) for index, timestamp in enumerate(new['Timestamp'])])
+        sources = (stored, new)
+        columns = {field: array(typecode) for field, typecode in self.typecodes.items()}
+        for _, source, index in order:
+            for field, column in columns.items():
+                column.append(sources[source][field][index])
+
+        # readers keep the previous generation until meta.json points to the new one
+        directory = self.segment_dir(station, month)
+        generation = meta.get('generation', 0) + 1
+        for field, column in columns.items():
+            with open(os.path.join(directory, self.field_file(field, generation)), 'wb') as f:
+                f.write(column.tobytes())
+        meta['rows'] = len(order)
+        meta['generation'] = generation
+        self.write_meta(station, month, meta)
+
+        current = {self.field_file(field, generation) for field in self.typecodes}
+        for name in os.listdir(directory):
+            if name.split('.')[0] in self.typecodes and name not in current:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    # still mapped by a reader on Windows, removed by the next rewrite
+                    pass
+        return len(changed)
+
+    def months(self, station):
+        directory = os.path.join(self.root, station)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name for name in os.listdir(directory) if len(name) == 7)
+
+    def open_segment(self, station, month, attempts=3):
+        """Memory-maps a station-month, returns None if it holds no rows."""
+        meta = self.read_meta(station, month)
+        if meta['rows'] == 0:
+            return None
+        if meta['byteorder'] != sys.byteorder:
+            raise ValueError(f'segment {station}/{month} was written with {meta["byteorder"]}-endian byte order')
+
+        columns = {}
+        maps = []
+        directory = self.segment_dir(station, month)
+        try:
+            for field, typecode in self.typecodes.items():
+                with open(os.path.join(directory, self.field_file(field, meta.get('generation', 0))), 'rb') as f:
+                    m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(m)
+                size = array(typecode).itemsize
+                columns[field] = memoryview(m)[:meta['rows'] * size].cast(typecode)
+        except FileNotFoundError:
+            # a merge replaced the generation after meta.json was read
+            ObservationSegment(station, month, columns, meta['wind_codes'], maps).close()
+            if attempts <= 1:
+                raise
+            return self.open_segment(station, month, attempts - 1)
+        return ObservationSegment(station, month, columns, meta['wind_codes'], maps)
+
+    def read_range(self, station: str, start: datetime, end: datetime) -> list:
+        """
+        Returns the segments of a station overlapping [start, end), each sliced
+        to the time window without copying. Naive datetimes in station local time.
+        Close the segments when done with them.
+        """
+        start_ts = calendar.timegm(start.timetuple())
+        end_ts = calendar.timegm(end.timetuple())
+        first_month = start.strftime('%Y-%m')
+        last_month = end.strftime('%Y-%m')
+
+        segments = []
+        for month in self.months(station):
+            if month < first_month or month > last_month:
+                continue
+            segment = self.open_segment(station, month)
+            if segment is None:
+                continue
+            timestamps = segment.columns['Timestamp']
+            lo = bisect.bisect_left(timestamps, start_ts)
+            hi = bisect.bisect_left(timestamps, end_ts)
+            if lo >= hi:
+                segment.close()
+                continue
+            full_columns = segment.columns
+            segment.columns = {field: column[lo:hi] for field, column in full_columns.items()}
+            for column in full_columns.values():
+                column.release()
+            segments.append(segment)
+        return segments
+
+    def rollup(self, station: str, start: datetime, end: datetime, period: str = 'day') -> Aggregate:
+        """
+        Summarizes the observations of a station in [start, end) per hour, day or month
+        (period None for the whole window), e.g. the monthly precipitation totals:
+        store.rollup(station, start, end, 'month').values('2024-01', {'Precip_Accum': 'sum'})
+        """
+        # accumulators need the daily buckets before rolling up further
+        aggregate = Aggregate('hour' if period == 'hour' else 'day')
+        for segment in self.read_range(station, start, end):
+            try:
+                aggregate.add_observations(segment.columns['Timestamp'], segment.columns)
+            finally:
+                segment.close()
+        return aggregate.rollup(period) if period != aggregate.period else aggregate
@@ -0,0 +1,198 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import config
+from util.Metrics import metrics
+from util.Parser import Parser
+from util.Transport import Transport
+
+
+class PageCache:
+    """
+    Compressed on-disk cache of daily history pages, keyed by station and date.
+
+    Pages of days older than `revalidate_days` never change, so they are served
+    from disk. Pages of recent days are stored with their ETag/Last-Modified and
+    revalidated on every fetch. A page stored while its day was recent is never
+    served without revalidation, so an incomplete day can not be served once it ages.
+    Neither is a page without history rows: the day may not be published yet.
+    """
+
+    # stored pages start with this marker and a JSON line of validators
+    entry_magic = b'#page-cache '
+    url_pattern = re.compile(r'/([^/]+)/table/(\d{4}-\d{2}-\d{2})/\2/daily/?$')
+
+    def __init__(self, cache_dir, revalidate_days=3, max_age_days=None, max_bytes=None, enabled=True):
+        self.cache_dir = cache_dir
+        self.revalidate_days = revalidate_days
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            cache_dir=config.CACHE_DIR,
+            revalidate_days=config.CACHE_REVALIDATE_DAYS,
+            max_age_days=config.CACHE_MAX_AGE_DAYS,
+            max_bytes=config.CACHE_MAX_MB * 1024 * 1024 if config.CACHE_MAX_MB else None,
+            enabled=config.PAGE_CACHE,
+        )
+
+    @classmethod
+    def key_from_url(cls, url):
+        """
+            Returns (station, date_string) for a daily table URL, or None.
+        """
+        match = cls.url_pattern.search(url)
+        if not match:
+            return None
+        return match.group(1), match.group(2)
+
+    def path(self, station, date_string):
+        return os.path.join(self.cache_dir, station, f'{date_string}.html.gz')
+
+    def is_immutable(self, date_string):
+        day = datetime.strptime(date_string, '%Y-%m-%d').date()
+        return date.today() - day > timedelta(days=self.revalidate_days)
+
+    def load(self, station, date_string):
+        """
+            Returns (content, entry) of a stored page, or (None, None).
+            entry holds the response validators and whether the page is final.
+        """
+        if not self.enabled:
+            return None, None
+        path = self.path(station, date_string)
+        try:
+            with gzip.open(path, 'rb') as f:
+                data = f.read()
+        except (OSError, EOFError):
+            return None, None
+        if data.startswith(self.entry_magic):
+            header, _, content = data.partition(b'\n')
+            entry = json.loads(header[len(self.entry_magic):])
+        else:
+            # pages without header were only stored once final
+            content, entry = data, {'final': True}
+        # refresh mtime so size based eviction drops the least recently used pages
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return content, entry
+
+    def get(self, station, date_string):
+        """Returns a stored page that can be served without revalidation, or None."""
+        if not self.is_immutable(date_string):
+            return None
+        content, entry = self.load(station, date_string)
+        if content is None or not entry.get('final') or not Parser.has_history_rows(content):
+            return None
+        return content
+
+    def put(self, station, date_string, content, etag=None, last_modified=None):
+        """
+            Stores a page with its validators. Only pages with history rows fetched
+            once their day was immutable are final, the others are revalidated on
+            every fetch.
+        """
+        if not self.enabled:
+            return
+        final = self.is_immutable(date_string) and Parser.has_history_rows(content)
+        entry = {'final': final, 'etag': etag, 'last_modified': last_modified}
+        path = self.path(station, date_string)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temp file first so concurrent readers never see partial pages
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(self.entry_magic + json.dumps(entry).encode() + b'\n')
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Error writing page cache {path}: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch(self, session, url, timeout=None):
+        """
+            Returns the page content for url, reading through the cache
+            for daily table URLs. Stored pages that are not final are
+            revalidated with If-None-Match/If-Modified-Since.
+            Raises on HTTP error statuses.
+        """
+        key = self.key_from_url(url)
+        stored, entry = None, None
+        headers = None
+        if key:
+            content = self.get(*key)
+            if content is not None:
+                metrics.count('cache_hits_total')
+                return content
+            metrics.count('cache_misses_total')
+            stored, entry = self.load(*key)
+            if stored is not None:
+                headers = Transport.conditional_headers(entry.get('etag'), entry.get('last_modified'))
+
+        with metrics.timer('fetch_seconds'):
+            response = session.get(url, headers=headers or None, timeout=timeout)
+        metrics.count('responses_total', status=response.status_code)
+        metrics.observe('response_bytes', len(response.content))
+
+        if response.status_code == 304 and stored is not None:
+            metrics.count('cache_revalidated_total')
+            self.put(*key, stored, entry.get('etag'), entry.get('last_modified'))
+            return stored
+
+        response.raise_for_status()
+        if key:
+            self.put(*key, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+
+    def evict(self):
+        """
+            Removes pages older than max_age_days, then the least recently
+            used pages until the cache fits in max_bytes.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            for mtime, size, path in entries:
+                if mtime < cutoff:
+                    removed += self._remove(path)
+            entries = [entry for entry in entries if entry[0] >= cutoff]
+
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                removed += self._remove(path)
+                total -= size
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
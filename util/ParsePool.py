@@ -0,0 +1,133 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import config
+from util.JsonHistory import JsonHistory
+from util.Metrics import metrics
+from util.Parser import Parser
+from util.UnitConverter import ConvertToSystem
+
+
+class ParsePool:
+    """
+    Runs the CPU-bound part of a day (page parsing, summary and table extraction,
+    unit conversion) next to the threads doing the network I/O.
+
+    With processes=0 the work runs in the calling thread. Otherwise the fetched bytes
+    are handed to a process pool, so parsing is not serialized by the GIL; of a history
+    page only the <lib-history> fragment is pickled to the worker.
+    Fetchers take a slot() before fetching a page and give it back once the page is
+    parsed, so at most `queue_size` pages are fetched but not yet parsed: when the
+    parse processes fall behind, fetching waits for them instead of piling up pages.
+    Workers return the summary and the converted table as columns (arrays), which
+    pickle much smaller than lists of row dicts.
+    """
+
+    # converters of the worker process, one per unit system
+    converters = {}
+
+    def __init__(self, processes=0, queue_size=32):
+        self.processes = processes
+        self.slots = threading.BoundedSemaphore(max(1, queue_size))
+        self.lock = threading.Lock()
+        self.executor = None
+
+    @classmethod
+    def from_config(cls):
+        return cls(processes=config.PARSE_PROCESSES, queue_size=config.PARSE_QUEUE_SIZE)
+
+    @contextmanager
+    def slot(self):
+        """Place of one page from before its fetch until it is parsed, blocks while the queue is full."""
+        if not self.processes:
+            yield
+            return
+        wait_start = time.perf_counter()
+        self.slots.acquire()
+        metrics.observe('parse_queue_wait_seconds', time.perf_counter() - wait_start)
+        try:
+            yield
+        finally:
+            self.slots.release()
+
+    def run(self, function, *args):
+        """Calls function(*args) inline or in a worker process and returns its result."""
+        if not self.processes:
+            return function(*args)
+        executor = self.executor or self.start()
+        # the scripts and markup around <lib-history> are not worth pickling (JSON passes unchanged)
+        args = [self.fragment(arg) if isinstance(arg, bytes) else arg for arg in args]
+        return executor.submit(function, *args).result()
+
+    @staticmethod
+    def fragment(content):
+        # parse_page finds the fragment again in the worker and parses it as UTF-8
+        fragment = Parser.history_fragment(content)
+        return content if fragment is None else fragment
+
+    def start(self):
+        # started on first use, so importing the scraper (as the spawned workers do) starts nothing
+        with self.lock:
+            if self.executor is None:
+                # spawn: worker processes must not inherit the locks of the fetching threads
+                context = multiprocessing.get_context('spawn')
+                self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            return self.executor
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    @classmethod
+    def converter(cls, unit_system):
+        converter = cls.converters.get(unit_system)
+        if converter is None:
+            converter = cls.converters[unit_system] = ConvertToSystem(unit_system)
+        return converter
+
+    @staticmethod
+    def parse_day(source, content, date_string, unit_system, with_table):
+        """
+        Parses one fetched day of the "html" or "json" source.
+        Returns (daily_summary, columns); columns is the converted history table as
+        returned by ConvertToSystem.convert_columns, None unless with_table is set.
+        """
+        if source == 'json':
+            records = JsonHistory.parse(content)
+            daily_summary = JsonHistory.summary(records)
+            rows = JsonHistory.rows(records) if with_table else None
+        else:
+            doc = Parser.parse_page(content)
+            daily_summary = Parser.parse_summary_table(doc)
+            rows = Parser.iter_html_table(date_string, [doc]) if with_table else None
+        if rows is None:
+            return daily_summary, None
+        converter = ParsePool.converter(unit_system)
+        return daily_summary, converter.convert_columns(converter.columns_from_rows(rows))
+
+    @staticmethod
+    def parse_range(content, start_string, period):
+        """Parses a weekly/monthly page, returns {date_string: daily_summary}."""
+        doc = Parser.parse_page(content)
+        return Parser.range_summaries(Parser.parse_html_table(start_string, [doc], period=period))
+
+    @staticmethod
+    def parse_new_rows(content, date_string, after_minute):
+        """
+        Parses the rows of a daily page newer than after_minute (minutes after midnight).
+        Returns (columns, last_minute): the new rows converted by the imperial converter
+        (the units of the page summary table) in time order, None without new rows,
+        and the minute of the newest row.
+        """
+        doc = Parser.parse_page(content)
+        new_rows = list(Parser.iter_new_observations(date_string, [doc], after_minute))
+        if not new_rows:
+            return None, after_minute
+        converter = ParsePool.converter('imperial')
+        columns = converter.convert_columns(converter.columns_from_rows(row for _, row in reversed(new_rows)))
+        return columns, new_rows[0][0]
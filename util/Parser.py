@@ -1,7 +1,52 @@
+import sys
 import unicodedata
+from collections.abc import Mapping
 from datetime import datetime
 import re
 
+from lxml import etree
+import lxml.html as lh
+
+
+class Observation(Mapping):
+    """
+    One row of the history table, read like a read-only dict.
+
+    The cells are kept in a tuple next to the schema of their table ({key: position}),
+    which is interned: every row of every table with the same columns shares one
+    schema dict, so a row costs two slots and a tuple instead of a dict of its own.
+    """
+    __slots__ = ('schema', 'cells')
+    schemas = {}
+
+    def __init__(self, schema: dict, cells: tuple):
+        self.schema = schema
+        self.cells = cells
+
+    @classmethod
+    def intern_schema(cls, keys) -> dict:
+        keys = tuple(sys.intern(key) for key in keys)
+        schema = cls.schemas.get(keys)
+        if schema is None:
+            schema = cls.schemas[keys] = {key: i for i, key in enumerate(keys)}
+        return schema
+
+    def __getitem__(self, key):
+        return self.cells[self.schema[key]]
+
+    def __iter__(self):
+        return iter(self.schema)
+
+    def __len__(self):
+        return len(self.schema)
+
+    def items(self):
+        # faster than the Mapping default, which looks every key up again
+        return zip(self.schema, self.cells)
+
+    def __repr__(self):
+        return f'Observation({dict(self.items())})'
+
 
 class Parser:
     @staticmethod
@@ -9,6 +54,59 @@ class Parser:
         # Replace white space and delete dots
         return key.replace(' ', '_').replace('.', '')
 
+    # The <lib-history> element holds both the summary tables and the history table
+    history_start_pattern = re.compile(rb'<lib-history[\s>]')
+    history_end_tag = b'</lib-history>'
+    # Wunderground serves UTF-8, the fragment has no <meta charset> to say so
+    fragment_parser = lh.HTMLParser(encoding='utf-8')
+
+    @staticmethod
+    def history_fragment(content: bytes):
+        """The <lib-history> fragment of a page (the page itself when it is one), None when there is none."""
+        start = Parser.history_start_pattern.search(content)
+        if start:
+            end = content.rfind(Parser.history_end_tag, start.start())
+            if end != -1:
+                return content[start.start():end + len(Parser.history_end_tag)]
+        return None
+
+    @staticmethod
+    def has_history_rows(content: bytes) -> bool:
+        """Whether the history table of a page has rows, without parsing the page."""
+        table = content.find(b'<lib-history-table')
+        body = content.find(b'<tbody', table) if table != -1 else -1
+        if body == -1:
+            return False
+        end = content.find(b'</tbody>', body)
+        return content.find(b'<tr', body, end if end != -1 else len(content)) != -1
+
+    @staticmethod
+    def parse_page(content: bytes):
+        """
+        Parses only the <lib-history> fragment of a daily page, skipping the
+        scripts and Angular markup around it.
+        Falls back to parsing the whole page when the fragment is not found.
+        """
+        fragment = Parser.history_fragment(content)
+        if fragment is not None:
+            try:
+                return lh.fromstring(fragment, parser=Parser.fragment_parser)
+            except (etree.ParserError, ValueError):
+                pass
+        return lh.fromstring(content)
+
+    # (row label, key for the first value, key for the second value)
+    # Rows with a second key are High/Low pairs, the others use the first cell only.
+    summary_fields = (
+        ("Temperature", "MaxTemp", "MinTemp"),
+        ("Wind Gust", "MaxGust", None),
+        ("Precipitation", "SumPrec", None),
+    )
+    # Same test the per-label //tr[.//*[contains(text(), ...)]] queries used, scoped to one row
+    row_label_xpath = etree.XPath('.//*[contains(text(), $label)]')
+    td_xpath = etree.XPath('.//td')
+    summary_number_pattern = re.compile(r'([\d.]+)')
+
     @staticmethod
     def parse_summary_table(doc) -> dict:
         """
@@ -23,83 +121,252 @@ class Parser:
         }
 
         try:
-            # Find the Temperature row
-            temp_row = doc.xpath('//tr[.//span[contains(text(), "Temperature")] or .//*[contains(text(), "Temperature")]]')
+            # Single pass over the table rows in document order, keeping the first
+            # row for each label. A row can only match a label that is part of its
+            # text, which keeps the exact XPath test off almost every row.
+            label_rows = {}
+            for row in doc.getroottree().iter('tr'):
+                row_text = row.text_content()
+                for label, _, _ in Parser.summary_fields:
+                    if label not in label_rows and label in row_text and Parser.row_label_xpath(row, label=label):
+                        label_rows[label] = row
+                if len(label_rows) == len(Parser.summary_fields):
+                    break
 
-            if temp_row:
-                temp_tds = temp_row[0].xpath('.//td')
+            for label, first_key, second_key in Parser.summary_fields:
+                row = label_rows.get(label)
+                if row is None:
+                    continue
+                values = Parser.parse_summary_values(row, 2 if second_key else 1)
+                if values is None:
+                    continue
+                if second_key:
+                    # Determine which is high and which is low by comparison
+                    summary_data[first_key] = max(values)
+                    summary_data[second_key] = min(values)
+                else:
+                    summary_data[first_key] = values[0]
 
-                if len(temp_tds) >= 2:
-                    # td[0] = High, td[1] = Low, td[2] = Average
-                    val1_text = temp_tds[0].text_content().strip()
-                    val2_text = temp_tds[1].text_content().strip()
+        except Exception as e:
+            print(f"Error parsing summary table: {e}")
+        return summary_data
 
-                    val1_match = re.search(r'([\d.]+)', val1_text)
-                    val2_match = re.search(r'([\d.]+)', val2_text)
+    @staticmethod
+    def parse_summary_values(row, count: int):
+        """
+        Returns the first number of each of the first `count` cells of a summary row,
+        or None if the row is too short or a cell holds no number.
+        """
+        tds = Parser.td_xpath(row)
+        if len(tds) < count:
+            return None
+        values = []
+        for td in tds[:count]:
+            match = Parser.summary_number_pattern.search(td.text_content().strip())
+            if not match:
+                return None
+            values.append(float(match.group(1)))
+        return values
 
-                    if val1_match and val2_match:
-                        val1 = float(val1_match.group(1))
-                        val2 = float(val2_match.group(1))
+    @staticmethod
+    def parse_html_table(date_string: str, history_table: list, period: str = 'daily') -> dict:
+        """
+        Returns the rows of the history table as dictionaries keyed by column.
+        Daily tables hold one row per observation of date_string; weekly and monthly
+        tables hold one row of statistics per day, date_string is then the first
+        day of the requested range (see parse_range_table).
+        """
+        if period != 'daily':
+            return Parser.parse_range_table(history_table, date_string)
+        return [dict(observation.items()) for observation in Parser.iter_html_table(date_string, history_table)]
 
-                        # Determine which is high and which is low by comparison
-                        summary_data["MaxTemp"] = max(val1, val2)
-                        summary_data["MinTemp"] = min(val1, val2)
+    # raw time cell -> ('%I:%M %p', minutes after midnight), a day has at most 1440
+    # distinct times (288 at 5 minute steps)
+    time_fields_cache = {}
 
-            # Find the Wind Gust row
-            gust_row = doc.xpath('//tr[.//span[contains(text(), "Wind Gust")] or .//*[contains(text(), "Wind Gust")]]')
+    @staticmethod
+    def time_fields(text: str) -> tuple:
+        fields = Parser.time_fields_cache.get(text)
+        if fields is None:
+            time = datetime.strptime(text, "%I:%M %p")
+            fields = (time.strftime('%I:%M %p'), time.hour * 60 + time.minute)
+            if len(Parser.time_fields_cache) < 4096:
+                Parser.time_fields_cache[text] = fields
+        return fields
 
-            if gust_row:
-                gust_tds = gust_row[0].xpath('.//td')
+    @staticmethod
+    def time_string(text: str) -> str:
+        return Parser.time_fields(text)[0]
 
-                if len(gust_tds) >= 1:
-                    high_gust_text = gust_tds[0].text_content().strip()
-                    gust_match = re.search(r'([\d.]+)', high_gust_text)
+    @staticmethod
+    def cell_text(td) -> str:
+        text = td.text_content()
+        # NFKD leaves ASCII unchanged, only units like "°F" and &nbsp; need it
+        return text if text.isascii() else unicodedata.normalize("NFKD", text)
 
-                    if gust_match:
-                        summary_data["MaxGust"] = float(gust_match.group(1))
+    @staticmethod
+    def history_table(doc):
+        """Returns the first table with a row of 12 cells (the daily history table), or None."""
+        for table in doc.getroottree().iter('table'):
+            for tr in table.iter('tr'):
+                if len(tr) == 12:
+                    return table
+        return None
 
-            # Find the Precipitation row
-            precip_row = doc.xpath('//tr[.//span[contains(text(), "Precipitation")] or .//*[contains(text(), "Precipitation")]]')
+    @staticmethod
+    def history_rows(date_string: str, history_table: list):
+        """
+        Returns (schema, day, rows) of the daily history table: the interned
+        Observation schema, date_string as YYYY/MM/DD and the <tr> elements of
+        the observations. None when the page has no history table.
+        """
+        table = Parser.history_table(history_table[0])
+        if table is None:
+            return None
+        table_rows = [tr for tr in table.iter('tr') if len(tr) == 12]
 
-            if precip_row:
-                precip_tds = precip_row[0].xpath('.//td')
+        # set Table Headers
+        schema = Observation.intern_schema(
+            ['Date', 'Time'] + [Parser.format_key(th.text) for th in table_rows[0].getchildren()[1:]])
+        day = datetime.strptime(date_string, "%Y-%m-%d").strftime('%Y/%m/%d')
+        return schema, day, table_rows[1:]
 
-                if len(precip_tds) >= 1:
-                    high_precip_text = precip_tds[0].text_content().strip()
-                    precip_match = re.search(r'([\d.]+)', high_precip_text)
+    @staticmethod
+    def iter_html_table(date_string: str, history_table: list):
+        """
+        Streaming parse_html_table for daily tables: yields one Observation per row,
+        with the keys parse_html_table uses. The date is parsed once per table
+        and the time cells go through time_fields.
+        """
+        found = Parser.history_rows(date_string, history_table)
+        if found is None:
+            return
+        schema, day, table_rows = found
+        cell_text = Parser.cell_text
 
-                    if precip_match:
-                        summary_data["SumPrec"] = float(precip_match.group(1))
+        for tr in table_rows:
+            cells = [cell_text(td) for td in tr.getchildren()]
+            # set date and time in the first 2 columns
+            cells[0] = Parser.time_string(cells[0])
+            yield Observation(schema, (day, *cells))
 
-        except Exception as e:
-            print(f"Error parsing summary table: {e}")
-        return summary_data
+    @staticmethod
+    def iter_new_observations(date_string: str, history_table: list, after_minute: int = -1):
+        """
+        Yields (minute, Observation) of the rows newer than after_minute (minutes
+        after midnight), newest first. The table is walked from its end and only
+        the time cell of each row is read until a known row is reached, so a page
+        fetched again during the day costs the new rows only.
+        """
+        found = Parser.history_rows(date_string, history_table)
+        if found is None:
+            return
+        schema, day, table_rows = found
+        cell_text = Parser.cell_text
+
+        for tr in reversed(table_rows):
+            cells = tr.getchildren()
+            time, minute = Parser.time_fields(cell_text(cells[0]))
+            # rows are in time order, everything before is known
+            if minute <= after_minute:
+                return
+            yield minute, Observation(schema, (day, time, *[cell_text(td) for td in cells[1:]]))
+
+    # Sub headers of the weekly/monthly table under their other spellings
+    range_sub_aliases = {'Max': 'High', 'Min': 'Low', 'Average': 'Avg', 'Total': 'Sum'}
+    range_date_formats = ('%m/%d/%Y', '%Y-%m-%d', '%Y/%m/%d')
+    # daily summary key -> column of the weekly/monthly table
+    range_summary_columns = {
+        "MaxTemp": "Temperature_High",
+        "MinTemp": "Temperature_Low",
+        "MaxGust": "Gust_High",
+        "SumPrec": "Precip_Accum_Sum",
+    }
 
     @staticmethod
-    def parse_html_table(date_string: str, history_table: list) -> dict:
+    def parse_range_table(history_table: list, start_date: str = None) -> list:
+        """
+        Splits a weekly/monthly history table into one record per day:
+        {'Date': 'YYYY/MM/DD', 'Temperature_High': '...', ..., 'Precip_Accum_Sum': '...'}.
+        Columns are named after the two header rows (group headers spanning
+        their High/Avg/Low sub headers), so their order does not matter.
+        start_date (YYYY-MM-DD) supplies the year of dates shown without one.
+        """
+        table, keys = Parser.range_table_columns(history_table[0])
+        if table is None:
+            return []
+        start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
 
-        table_rows = [tr for tr in history_table[0].xpath('//tr') if len(tr) == 12]
-        headers_list = []
-        data_rows = []
+        records = []
+        for tr in table.iter('tr'):
+            cells = tr.getchildren()
+            if len(cells) != len(keys) or cells[0].tag != 'td':
+                continue
+            day = Parser.parse_range_date(cells[0].text_content().strip(), start)
+            if day is None:
+                continue
+            record = {'Date': day.strftime('%Y/%m/%d')}
+            for key, td in zip(keys[1:], cells[1:]):
+                record[key] = unicodedata.normalize("NFKD", td.text_content()).strip()
+            records.append(record)
+        return records
 
-        # set Table Headers
-        for header in table_rows[0]:
-            headers_list.append(header.text)
-
-        for tr in table_rows[1:]:
-            row_dict = {}
-            for i, td in enumerate(tr.getchildren()):
-                td_content = unicodedata.normalize("NFKD", td.text_content())
-
-                # set date and time in the first 2 columns
-                if i == 0:
-                    date = datetime.strptime(date_string, "%Y-%m-%d")
-                    time = datetime.strptime(td_content, "%I:%M %p")
-                    row_dict['Date'] = date.strftime('%Y/%m/%d')
-                    row_dict['Time'] = time.strftime('%I:%M %p')
-                else:
-                    row_dict[Parser.format_key(headers_list[i])] = td_content
+    @staticmethod
+    def range_table_columns(doc):
+        """
+        Returns (table, column keys) of the first table whose header starts
+        with a Date column, or (None, None).
+        """
+        for table in doc.getroottree().iter('table'):
+            header_rows = [tr for tr in table.iter('tr') if len(tr) and tr[0].tag == 'th']
+            if not header_rows or header_rows[0][0].text_content().strip() != 'Date':
+                continue
+            # expand the group headers over the columns they span
+            groups = []
+            for th in header_rows[0]:
+                groups += [Parser.format_key(th.text_content().strip())] * int(th.get('colspan', 1))
+            subs = [''] * len(groups)
+            if len(header_rows) > 1:
+                second = [th.text_content().strip() for th in header_rows[1]]
+                if len(second) == len(groups):
+                    subs = [Parser.range_sub_aliases.get(sub, sub) for sub in second]
+            keys = ['Date'] + [f'{group}_{sub}' if sub else group for group, sub in zip(groups[1:], subs[1:])]
+            return table, keys
+        return None, None
+
+    @staticmethod
+    def parse_range_date(text: str, start=None):
+        for date_format in Parser.range_date_formats:
+            try:
+                return datetime.strptime(text, date_format)
+            except ValueError:
+                pass
+        if start is None:
+            return None
+        # month/day only, the range may cross new year
+        try:
+            day = datetime.strptime(f'{text}/{start.year}', '%m/%d/%Y')
+        except ValueError:
+            return None
+        return day if day >= start else day.replace(year=start.year + 1)
 
-            data_rows.append(row_dict)
-        
-        return data_rows
+    @staticmethod
+    def range_summaries(records: list) -> dict:
+        """
+        Returns {YYYY-MM-DD: daily summary} from parse_range_table records,
+        with the same keys and number parsing as parse_summary_table.
+        Raises ValueError when the table lacks a column of range_summary_columns.
+        """
+        if records:
+            missing = [column for column in Parser.range_summary_columns.values() if column not in records[0]]
+            if missing:
+                raise ValueError(f'history table has no {", ".join(missing)} column, '
+                                 f'found {", ".join(records[0])}')
+        summaries = {}
+        for record in records:
+            summary = {}
+            for key, column in Parser.range_summary_columns.items():
+                match = Parser.summary_number_pattern.search(record.get(column, ''))
+                summary[key] = float(match.group(1)) if match else None
+            summaries[record['Date'].replace('/', '-')] = summary
+        return summaries
@@ -0,0 +1,92 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class ProgressStore:
+    """
+    Persistent per-station, per-date scraping progress (SQLite).
+
+    Every scraped day is recorded with its parsed summary as soon as it is reduced,
+    so a run that dies halfway can resume with only the missing or failed days.
+    A day whose page had no data yet is recorded as missing and fetched again too.
+    """
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS progress (
+            station TEXT NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            summary TEXT,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (station, date)
+        )
+    '''
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # station threads share one connection, writes are serialized by the lock;
+        # worker processes sharing the file wait for each other's writes
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(self.schema)
+            self.connection.commit()
+
+    def _record(self, station, date_string, status, summary, error, keep_done=False):
+        # one conditional upsert, so a process recording a miss or a failure can not
+        # overwrite a day another process has just recorded as done
+        keep = " WHERE progress.status != 'done'" if keep_done else ''
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO progress (station, date, status, summary, error, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (station, date) DO UPDATE SET status = excluded.status, summary = excluded.summary, '
+                'error = excluded.error, updated_at = excluded.updated_at' + keep,
+                (station, date_string, status,
+                 json.dumps(summary) if summary is not None else None,
+                 error, datetime.now().isoformat(timespec='seconds')))
+            self.connection.commit()
+
+    def record_success(self, station, date_string, summary):
+        self._record(station, date_string, 'done', summary, None)
+
+    # neither a failure nor an empty page overwrites a day that was already scraped successfully
+    def record_missing(self, station, date_string):
+        self._record(station, date_string, 'missing', None, None, keep_done=True)
+
+    def record_failure(self, station, date_string, error):
+        self._record(station, date_string, 'failed', None, f'{type(error).__name__}: {error}', keep_done=True)
+
+    def completed(self, station, start_date, end_date):
+        """
+        Returns {date_string: summary} of the days between start_date
+        and end_date (inclusive) that were scraped successfully.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT date, summary FROM progress WHERE station = ? AND status = 'done' "
+                "AND date BETWEEN ? AND ?",
+                (station, str(start_date), str(end_date))).fetchall()
+        return {date_string: json.loads(summary) for date_string, summary in rows}
+
+    def failed(self, station, start_date, end_date):
+        """Returns {date_string: error} of the days that failed on their last attempt."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT date, error FROM progress WHERE station = ? AND status = 'failed' "
+                "AND date BETWEEN ? AND ?",
+                (station, str(start_date), str(end_date))).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import requests
+
+from util.Metrics import metrics
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request while the circuit of its host is open."""
+
+
+class HostLimiter:
+    """
+    Rate control of one host, shared by every thread talking to it.
+
+    Adaptive token bucket: requests are spaced to `rate` per second with bursts of up
+    to `burst`. The rate is halved on every throttled response (429/503) and grows back
+    by `increase` per successful response, between min_rate and max_rate (AIMD).
+    A Retry-After pauses the whole host, not just the request that got it.
+
+    Circuit breaker: after `failure_threshold` consecutive failures (connection errors,
+    timeouts, 5xx) the host is considered down and requests fail immediately for
+    `cooldown` seconds. Then a single trial request is let through; its success closes
+    the circuit, a failure or throttled answer (429/5xx) opens it again for `cooldown`.
+    """
+
+    def __init__(self, host, rate=5.0, burst=10, min_rate=0.2, max_rate=50.0, increase=0.1,
+                 failure_threshold=10, cooldown=60.0, clock=time.monotonic, sleep=time.sleep):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def acquire(self):
+        """
+        Waits for the next request slot of the host.
+        Raises CircuitOpenError while the circuit is open.
+        """
+        with self.lock:
+            now = self.clock()
+            if self.opened_at is not None:
+                if now - self.opened_at < self.cooldown or self.trial_running:
+                    raise CircuitOpenError(f'circuit open for {self.host}')
+                # half-open: this request is the trial
+                self.trial_running = True
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # take the token now, callers queue up behind each other in the deficit
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.paused_until - now, 0.0)
+        if wait > 0:
+            metrics.observe('rate_limit_wait_seconds', wait)
+            self.sleep(wait)
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            self.failures = 0
+            if self.opened_at is not None:
+                print(f'Circuit closed for {self.host}')
+            self.opened_at = None
+            self.trial_running = False
+
+    def throttled(self, retry_after=None):
+        """A 429/503: halves the rate and pauses the host for retry_after seconds."""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self.paused_until = max(self.paused_until, self.clock() + retry_after)
+        metrics.count('http_throttled_total', host=self.host)
+
+    def refused(self):
+        """A 429: not a failure of the host, but a running trial did not get through."""
+        with self.lock:
+            if self.trial_running:
+                self._open('a throttled trial request')
+
+    def failure(self):
+        """A connection error, timeout or server error."""
+        with self.lock:
+            self.failures += 1
+            if self.trial_running:
+                self._open('a failed trial request')
+            elif self.opened_at is None and self.failures >= self.failure_threshold:
+                self._open(f'{self.failures} consecutive failure(s)')
+
+    def _open(self, reason):
+        # called with the lock held; (re)starts the cooldown
+        self.opened_at = self.clock()
+        self.trial_running = False
+        print(f'Circuit opened for {self.host} after {reason}')
+        metrics.count('circuit_open_total', host=self.host)
+
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.opened_at is not None and self.clock() - self.opened_at < self.cooldown
@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+from datetime import datetime, time as day_start, timedelta
+from zoneinfo import ZoneInfo
+
+import config
+
+
+class Scheduler:
+    """
+    Daily poll schedule of the daemon's stations.
+
+    Every station is due once a day for the day that just closed: `delay` seconds
+    after its local midnight plus a random stagger of up to `jitter` seconds, so the
+    stations do not all hit the host at once. A station whose day has no data yet is
+    polled again every `retry_delay` seconds (with +-20% jitter) up to `retries` times,
+    then it is scheduled for the next day.
+    """
+
+    def __init__(self, delay=1200, jitter=1800, retry_delay=900, retries=8, timezones=None,
+                 clock=time.time, rng=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.retries = retries
+        self.timezones = {station: ZoneInfo(name) for station, name in (timezones or {}).items()}
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        # station url -> {'due': timestamp, 'date': 'YYYY-MM-DD', 'attempts': int}
+        self.entries = {}
+
+    @classmethod
+    def from_config(cls):
+        return cls(delay=config.DAEMON_DELAY * 60, jitter=config.DAEMON_JITTER * 60,
+                   retry_delay=config.DAEMON_RETRY_DELAY * 60, retries=config.DAEMON_RETRIES,
+                   timezones=config.STATION_TIMEZONES)
+
+    def timezone(self, url):
+        # None is the time zone of this machine
+        return self.timezones.get(url.split('/')[-1])
+
+    def midnight(self, url, day):
+        """Timestamp of the start of day at the station."""
+        timezone = self.timezone(url)
+        if timezone is None:
+            return datetime.combine(day, day_start()).astimezone().timestamp()
+        return datetime.combine(day, day_start(), tzinfo=timezone).timestamp()
+
+    def local_date(self, url, timestamp):
+        timezone = self.timezone(url)
+        if timezone is None:
+            return datetime.fromtimestamp(timestamp).date()
+        return datetime.fromtimestamp(timestamp, timezone).date()
+
+    def add(self, url, catch_up=True, stagger=None):
+        """
+        Adds a station. With catch_up it is due right away for the last closed day,
+        spread over `stagger` seconds (default jitter), otherwise after its next midnight.
+        """
+        with self.lock:
+            if url in self.entries:
+                return
+            if catch_up:
+                now = self.clock()
+                yesterday = self.local_date(url, now) - timedelta(days=1)
+                self.entries[url] = {'due': now + self.rng.uniform(0, self.jitter if stagger is None else stagger),
+                                     'date': yesterday.strftime('%Y-%m-%d'), 'attempts': 0}
+            else:
+                self.schedule_next(url)
+
+    def remove(self, url):
+        with self.lock:
+            self.entries.pop(url, None)
+
+    def schedule_next(self, url):
+        # the day that closes at the next local midnight
+        today = self.local_date(url, self.clock())
+        due = self.midnight(url, today + timedelta(days=1)) + self.delay + self.rng.uniform(0, self.jitter)
+        self.entries[url] = {'due': due, 'date': today.strftime('%Y-%m-%d'), 'attempts': 0}
+
+    def due(self):
+        """Returns [(url, date_string)] of the stations due now, earliest first."""
+        now = self.clock()
+        with self.lock:
+            ready = sorted((entry['due'], url, entry['date']) for url, entry in self.entries.items()
+                           if entry['due'] <= now)
+        return [(url, date_string) for _, url, date_string in ready]
+
+    def done(self, url):
+        """The day of url is published, the station is due again after its next midnight."""
+        with self.lock:
+            if url in self.entries:
+                self.schedule_next(url)
+
+    def retry(self, url):
+        """
+        The day of url has no data yet: polls it again after retry_delay.
+        Returns False (and moves on to the next day) once the retries are used up.
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return False
+            entry['attempts'] += 1
+            if entry['attempts'] > self.retries:
+                self.schedule_next(url)
+                return False
+            entry['due'] = self.clock() + self.retry_delay * self.rng.uniform(0.8, 1.2)
+            return True
+
+    def seconds_until_next(self):
+        """Seconds until the next station is due (None without stations)."""
+        with self.lock:
+            if not self.entries:
+                return None
+            return max(0.0, min(entry['due'] for entry in self.entries.values()) - self.clock())
+
+    def closed_at(self, url, date_string):
+        """Timestamp at which date_string ended at the station."""
+        day = datetime.strptime(date_string, '%Y-%m-%d').date()
+        return self.midnight(url, day + timedelta(days=1))
@@ -0,0 +1,150 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+
+import config
+from util.Metrics import metrics
+from util.RateLimiter import HostLimiter
+
+
+class Transport:
+    """
+    Shared HTTP transport of the scraper.
+
+    One pooled requests.Session reused by every station and date, so connections
+    (and their TLS handshakes) are kept alive across the whole run. Negotiates
+    gzip/deflate, plus brotli when the brotli package is installed, and applies the
+    configured timeouts to every request that does not set its own.
+    Safe to share between threads.
+
+    Every request goes through the HostLimiter of its host (adaptive rate, circuit
+    breaker). Connection errors, timeouts, truncated bodies, 429 and 5xx responses are
+    retried up to `retries` times with jittered exponential backoff, after waiting out
+    any Retry-After. The last response is returned, so callers still see the status.
+    """
+
+    # throttling responses, they slow the host down
+    throttle_statuses = (429, 503)
+    retry_exceptions = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                        requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)
+
+    def __init__(self, pool_connections=10, pool_maxsize=32, connect_timeout=5, read_timeout=10,
+                 retries=3, backoff=0.5, backoff_max=30.0, retry_after_max=120.0, limiter_options=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.limiter_options = limiter_options or {}
+        self.limiters = {}
+        self.lock = threading.Lock()
+        self.sleep = time.sleep
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # "gzip,deflate" and "br" when urllib3 can decode it
+        self.session.headers['Accept-Encoding'] = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+
+    @classmethod
+    def from_config(cls):
+        return cls(
+            pool_connections=config.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=config.HTTP_POOL_MAXSIZE,
+            connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+            read_timeout=config.HTTP_READ_TIMEOUT,
+            retries=config.HTTP_RETRIES,
+            backoff=config.HTTP_BACKOFF,
+            backoff_max=config.HTTP_BACKOFF_MAX,
+            retry_after_max=config.HTTP_RETRY_AFTER_MAX,
+            limiter_options={
+                'rate': config.HTTP_RATE,
+                'burst': config.HTTP_BURST,
+                'min_rate': config.HTTP_RATE_MIN,
+                'max_rate': config.HTTP_RATE_MAX,
+                'increase': config.HTTP_RATE_INCREASE,
+                'failure_threshold': config.CIRCUIT_FAILURES,
+                'cooldown': config.CIRCUIT_COOLDOWN,
+            },
+        )
+
+    def limiter(self, host):
+        with self.lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = HostLimiter(host, sleep=self.sleep, **self.limiter_options)
+            return limiter
+
+    def get(self, url, headers=None, timeout=None, params=None):
+        """
+            GET through the rate limiter of the host, with retries.
+            Raises CircuitOpenError while the host is considered down and
+            the last network error once the retries are used up.
+        """
+        limiter = self.limiter(urlsplit(url).netloc)
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, params=params, timeout=timeout or self.timeout)
+            except self.retry_exceptions as e:
+                limiter.failure()
+                if last_attempt:
+                    raise
+                reason = type(e).__name__
+            else:
+                status = response.status_code
+                if status in self.throttle_statuses:
+                    retry_after = self.retry_after(response)
+                    limiter.throttled(min(retry_after or 0, self.retry_after_max))
+                    if status >= 500:
+                        limiter.failure()
+                    else:
+                        limiter.refused()
+                    if retry_after and retry_after > self.retry_after_max:
+                        # not worth waiting for, the date fails and is retried by a later run
+                        return response
+                elif status >= 500:
+                    limiter.failure()
+                else:
+                    limiter.success()
+                    return response
+                if last_attempt:
+                    return response
+                reason = str(status)
+            metrics.count('http_retries_total', reason=reason)
+            # full jitter, so retrying threads do not hit the host in lockstep
+            self.sleep(random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt)))
+
+    @staticmethod
+    def retry_after(response):
+        """Seconds of the Retry-After header (delta-seconds or HTTP date), or None."""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def conditional_headers(etag=None, last_modified=None):
+        """Revalidation headers for a stored response, empty when it had no validators."""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def close(self):
+        self.session.close()
@@ -1,10 +1,44 @@
+import math
 import re
+from array import array
 
 
 class ConvertToSystem:
     supported_systems = ["metric", "imperial"]
     round_to_decimals = 2
     extract_numbers_pattern = "\d*\.\d+|\d+"
+    numbers_pattern = re.compile(extract_numbers_pattern)
+
+    # column name -> measure converted by convert_column
+    column_measures = {
+        'Temperature': 'temperature',
+        'Dew_Point': 'temperature',
+        'Humidity': 'humidity',
+        'Speed': 'speed',
+        'Gust': 'speed',
+        'Pressure': 'pressure',
+        'Precip_Rate': 'precipitation',
+        'Precip_Accum': 'precipitation',
+        'UV': 'uv',
+        'Solar': 'solar',
+    }
+    # columns copied without conversion
+    passthrough_columns = ('Date', 'Time', 'Wind')
+
+    # imperial -> metric transforms, measures without one are unit-less
+    metric_transforms = {
+        'temperature': lambda fahrenheit: (fahrenheit - 32) * 5/9,
+        'speed': lambda mph: mph * 1.609,
+        'pressure': lambda inhg: inhg * 33.86389,
+        'precipitation': lambda inches: inches * 25.4,
+    }
+    # metric -> imperial, the inverse of metric_transforms
+    imperial_transforms = {
+        'temperature': lambda celsius: celsius * 9/5 + 32,
+        'speed': lambda kmh: kmh / 1.609,
+        'pressure': lambda hpa: hpa / 33.86389,
+        'precipitation': lambda millimeters: millimeters / 25.4,
+    }
 
     def __init__(self, system: str):
         if system not in self.supported_systems:
@@ -12,130 +46,128 @@ class ConvertToSystem:
         else:
             self.system = system
 
+    @classmethod
+    def extract_number(cls, string) -> float:
+        match = cls.numbers_pattern.search(string) if string and isinstance(string, str) else None
+        return float(match.group()) if match else math.nan
+
+    def convert_column(self, measure: str, strings) -> array:
+        """
+        Converts a whole column of raw strings of one measure
+        (temperature, speed, pressure, ...) to numbers in the target system.
+        Missing values (empty, None or no number) are NaN.
+        """
+        transform = self.metric_transforms.get(measure) if self.system == "metric" else None
+        decimals = self.round_to_decimals
+        # columns repeat a small set of readings, so each distinct string is converted once
+        converted = {}
+        numbers = array('d')
+        for string in strings:
+            try:
+                number = converted[string]
+            except KeyError:
+                number = self.extract_number(string)
+                if transform:
+                    number = round(transform(number), decimals)
+                converted[string] = number
+            except TypeError:
+                # unhashable values hold no reading
+                number = math.nan
+            numbers.append(number)
+        return numbers
+
+    def convert_columns(self, columns: dict) -> dict:
+        """
+        Converts a table given as {column name: list of raw strings}.
+        Numeric columns become arrays of floats with NaN for missing values,
+        Date, Time and Wind are returned unchanged, unknown columns are dropped.
+        """
+        converted = {}
+        for key, values in columns.items():
+            if key in self.column_measures:
+                converted[key] = self.convert_column(self.column_measures[key], values)
+            elif key in self.passthrough_columns:
+                converted[key] = values
+        return converted
+
+    @staticmethod
+    def missing_to_na(value):
+        return 'NA' if isinstance(value, float) and math.isnan(value) else value
+
+    def convert_value(self, measure: str, string):
+        return self.missing_to_na(self.convert_column(measure, [string])[0])
+
     def temperature(self, temp_string: str):
-        try:
-            fahrenheit = float(re.findall(self.extract_numbers_pattern, temp_string)[0]) if temp_string else 'NA'
-            if self.system == "metric":
-                celsius = (fahrenheit - 32) * 5/9
-                return round(celsius, self.round_to_decimals)
-            else:
-                return fahrenheit
-
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
-            
+        return self.convert_value('temperature', temp_string)
+
     def dew_point(self, dew_point_string: str):
-        try:
-            fahrenheit = float(re.findall(self.extract_numbers_pattern, dew_point_string)[0]) if dew_point_string else 'NA'
-            if self.system == "metric":
-                celsius = (fahrenheit - 32) * 5/9
-                return round(celsius, self.round_to_decimals)
-            else:
-                return fahrenheit
-            
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('temperature', dew_point_string)
 
     def humidity(self, humidity_string: str):
-        try:
-            humidity = float(re.findall(self.extract_numbers_pattern, humidity_string)[0]) if humidity_string else 'NA'
-            return humidity
-        
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('humidity', humidity_string)
 
     def speed(self, speed_string: str):
-        try:
-            mph = float(re.findall(self.extract_numbers_pattern, speed_string)[0]) if speed_string else 'NA'
-            if self.system == "metric":
-                kmh = mph * 1.609
-                return round(kmh, self.round_to_decimals)
-            else:
-                return mph
-
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('speed', speed_string)
 
     def pressure(self, pressure_string: str):
-        try:
-            inhg = float(re.findall(self.extract_numbers_pattern, pressure_string)[0]) if pressure_string else 'NA'
-            if self.system == "metric":
-                hpa = inhg * 33.86389
-                return round(hpa, self.round_to_decimals)
-            else:
-                return inhg
-                
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
-    
+        return self.convert_value('pressure', pressure_string)
+
     def precipitation(self, precip_string: str):
-        try:
-            inches = float(re.findall(self.extract_numbers_pattern, precip_string)[0]) if precip_string else 'NA'
-            if self.system == "metric":
-                mm = inches * 25.4
-                return round(mm, self.round_to_decimals)
-            else:
-                return inches
-                
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('precipitation', precip_string)
 
     def uv(self, uv_string: str):
-        try:
-            measure = float(re.findall(self.extract_numbers_pattern, uv_string)[0]) if uv_string else 'NA'
-            return measure
-            
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('uv', uv_string)
 
     def solar(self, solar_string: str):
-        try:
-            measure = float(re.findall(self.extract_numbers_pattern, solar_string)[0]) if solar_string else 'NA'
-            return measure
-            
-        except Exception as e:
-            print(f'{e}! probably caused by an empty row in the data')
-            return 'NA'
+        return self.convert_value('solar', solar_string)
+
+    def columns_from_rows(self, rows) -> dict:
+        """
+        Turns rows into {column name: list of raw strings}, keeping the known columns.
+        rows can be any iterable of dicts or Parser.Observation records (e.g. the
+        Parser.iter_html_table generator), it is read in a single pass.
+        """
+        columns = {}
+        count = 0
+        for row in rows:
+            found = 0
+            for key, value in row.items():
+                values = columns.get(key)
+                if values is not None:
+                    values.append(value)
+                    found += 1
+                elif key in self.column_measures or key in self.passthrough_columns:
+                    columns[key] = [None] * count + [value]
+                    found += 1
+            count += 1
+            if found < len(columns):
+                # the row lacks some columns
+                for values in columns.values():
+                    if len(values) < count:
+                        values.append(None)
+        return columns
+
+    @classmethod
+    def rows_from_columns(cls, columns: dict) -> list:
+        """
+        Turns convert_columns output back into the rows clean_and_convert returns
+        (for tables whose rows all have the same columns).
+        """
+        length = max((len(values) for values in columns.values()), default=0)
+        return [{key: cls.missing_to_na(values[i]) for key, values in columns.items()} for i in range(length)]
 
     def clean_and_convert(self, dict_list: list):
+        """
+        Per-row wrapper around convert_columns: takes rows (dicts or Parser.Observation
+        records) and returns a list of row dicts, missing values are returned as 'NA'.
+        """
+        dict_list = list(dict_list)
+        columns = self.convert_columns(self.columns_from_rows(dict_list))
+
         converted_dict_list = []
-        for dict in dict_list:
-            converted_dict = {}
-            for key, value in dict.items():
-                if key == 'Date':
-                    converted_dict['Date'] = value
-                if key == 'Time':
-                    converted_dict['Time'] = value
-                if key ==  'Temperature':
-                    converted_dict['Temperature'] = self.temperature(value)
-                if key ==  'Dew_Point':
-                    converted_dict['Dew_Point'] = self.dew_point(value)
-                if key ==  'Humidity':
-                    converted_dict['Humidity'] = self.humidity(value)
-                if key ==  'Wind':
-                    converted_dict['Wind'] = value
-                if key ==  'Speed':
-                    converted_dict['Speed'] = self.speed(value)
-                if key ==  'Gust':
-                    converted_dict['Gust'] = self.speed(value)
-                if key ==  'Pressure':
-                    converted_dict['Pressure'] = self.pressure(value)
-                if key ==  'Precip_Rate':
-                    converted_dict['Precip_Rate'] = self.precipitation(value)
-                if key ==  'Precip_Accum':
-                    converted_dict['Precip_Accum'] = self.precipitation(value)
-                if key ==  'UV':
-                    converted_dict['UV'] = self.uv(value)
-                if key ==  'Solar':
-                    converted_dict['Solar'] = self.solar(value)
-
-            converted_dict_list.append(converted_dict)
-
-        return converted_dict_list
\ No newline at end of file
+        for i, row in enumerate(dict_list):
+            converted_dict_list.append({
+                key: self.missing_to_na(columns[key][i]) for key in row if key in columns
+            })
+
+        return converted_dict_list
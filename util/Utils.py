@@ -1,17 +1,48 @@
+import calendar
 import config
-from datetime import timedelta, date
-import lxml.html as lh
-import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, date
+from lxml import etree
+
+from util.FirstDateFinder import FirstDateFinder
+from util.PageCache import PageCache
+from util.Parser import Parser
+from util.Transport import Transport
 
 
 class Utils:
-    session = requests.Session()
+    # shared by every station, Transport applies the configured timeouts
+    session = Transport.from_config()
+    cache = PageCache.from_config()
+    # relative to <lib-history> so it works on the fragment and on the full page
+    data_table_xpath = etree.XPath('//lib-history/div[2]/lib-history-table/div/div/div/table/tbody/tr')
     weather_station_url = None
+    # Date and Time cells -> seconds, a few thousand dates and at most 1440 times
+    time_cache = {}
 
     def __init__(self, session, weather_station_url):
         self.session = session
         self.weather_station_url = weather_station_url
         
+    @classmethod
+    def observation_timestamp(cls, date_string: str, time_string: str) -> int:
+        """
+        Converts the Date ('YYYY/MM/DD') and Time ('hh:mm AM') columns of an observation
+        row to int64 seconds, station local time as UTC; the key of ObservationStore
+        and ObservationDB rows.
+        """
+        day = cls.time_cache.get(date_string)
+        if day is None:
+            day = calendar.timegm(datetime.strptime(date_string, '%Y/%m/%d').timetuple())
+            cls.time_cache[date_string] = day
+        seconds = cls.time_cache.get(time_string)
+        if seconds is None:
+            clock = datetime.strptime(time_string, '%I:%M %p')
+            seconds = clock.hour * 3600 + clock.minute * 60
+            cls.time_cache[time_string] = seconds
+        return day + seconds
+
     @classmethod
     def date_range_generator(cls, start, end = date.today()):
         for i in range(int ((end - start).days) + 1):
@@ -25,6 +56,25 @@ class Utils:
             url = f'{weather_station_url}/table/{date_string}/{date_string}/daily'
             yield date_string, url
     
+    @classmethod
+    def range_url_generator(cls, weather_station_url, start_date, end_date, period='monthly'):
+        """
+            Yields (start_string, end_string, url) of the weekly (Sunday to Saturday)
+            or monthly history pages covering start_date to end_date, clipped to it.
+        """
+        first = start_date
+        while first <= end_date:
+            if period == 'weekly':
+                last = first + timedelta((5 - first.weekday()) % 7)
+            else:
+                next_month = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+                last = next_month - timedelta(1)
+            last = min(last, end_date)
+            start_string = first.strftime("%Y-%m-%d")
+            end_string = last.strftime("%Y-%m-%d")
+            yield start_string, end_string, f'{weather_station_url}/table/{start_string}/{end_string}/{period}'
+            first = last + timedelta(1)
+
     @classmethod
     def date_url_array(cls, date_url_gen):
         date_url_arr = []
@@ -33,60 +83,80 @@ class Utils:
         return date_url_arr
 
     @classmethod
-    def fetch_data_table(cls, url):
+    def windowed_map(cls, func, items, window):
+        """
+            Runs func over items with at most `window` calls in flight and
+            yields (item, result, error) tuples in the order of items.
+            Exactly one of result and error is set for each item.
+        """
+        window = max(1, window)
+        if window == 1:
+            # sequential, in the calling thread
+            for item in items:
+                try:
+                    yield item, func(item), None
+                except Exception as e:
+                    yield item, None, e
+            return
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            pending = deque()
+            for item in items:
+                pending.append((item, executor.submit(func, item)))
+                if len(pending) >= window:
+                    yield cls._resolve(*pending.popleft())
+            while pending:
+                yield cls._resolve(*pending.popleft())
+
+    @staticmethod
+    def _resolve(item, future):
+        try:
+            return item, future.result(), None
+        except Exception as e:
+            return item, None, e
+
+    @classmethod
+    def day_url(cls, weather_station_url, day):
+        date_string = day.strftime("%Y-%m-%d")
+        return f'{weather_station_url}/table/{date_string}/{date_string}/daily'
+
+    @classmethod
+    def fetch_data_table(cls, url, session=None, timeout=None):
         """
             Fetches a weather data url and checks if there are data entries for that date
         """
-        html_string = cls.session.get(url)
-        doc = lh.fromstring(html_string.content)
-        data_table = doc.xpath('//*[@id="main-page-content"]/div/div/div/lib-history/div[2]/lib-history-table/div/div/div/table/tbody/tr')
+        content = cls.cache.fetch(session or cls.session, url, timeout)
+        doc = Parser.parse_page(content)
+        data_table = cls.data_table_xpath(doc)
         if data_table != []:
             return True
         else:
             return False
 
     @classmethod
-    def first_data_url(cls, date_arr, low, high):
-
-        if(high >= low):
-            mid = low + (high - low) // 2
-            print(f"low is {low} - {date_arr[low]}")
-            print(f"high is {high} - {date_arr[high]}")
-            print(f"mid is {mid} - {date_arr[mid]}")
-            print(f"----//----")
-
-            date_string_1 = date_arr[mid].strftime("%Y-%m-%d")
-            date_string_2 = date_arr[mid - 1].strftime("%Y-%m-%d")
-            url_1 = f'{Utils.weather_station_url}/table/{date_string_1}/{date_string_1}/daily'
-            url_2 = f'{Utils.weather_station_url}/table/{date_string_2}/{date_string_2}/daily'
-            data_1 = Utils.fetch_data_table(url_1)
-            data_2 = Utils.fetch_data_table(url_2)
-
-            if((data_1 and not data_2)):
-                # result found, return result
-                print(f'First date found! {date_arr[mid]}')
-                print(url_1)
-                return date_arr[mid]
-            elif(data_1 == True):
-                return Utils.first_data_url(date_arr, low, (mid - 1))
-            elif(data_1 == False):
-                return Utils.first_data_url(date_arr, (mid + 1), high)
-        
-        print(f'\nFirst date not found!')
-        return -1
-
-
-    @classmethod
-    def find_first_data_entry(cls, weather_station_url, start_date):
+    def find_first_data_entry(cls, weather_station_url, start_date, end_date=None, probes=None, session=None, timeout=None):
         """
-            Given a station URL, finds the first date_url where data exists.
+            Given a station URL, finds the first date between start_date and end_date
+            (default today) where data exists. Returns -1 if no date was found.
         """
-        Utils.weather_station_url = weather_station_url
-        date_gen = Utils.date_range_generator(start_date)
-        date_arr = Utils.date_url_array(date_gen)
+        end_date = end_date or date.today()
+        probes = probes or config.FIRST_DATE_PROBES
+
+        def probe(day):
+            url = cls.day_url(weather_station_url, day)
+            has_data = cls.fetch_data_table(url, session, timeout)
+            print(f'{url}: {"data" if has_data else "no data"}')
+            return has_data
 
-        n = len(date_arr)
+        print(f"\n** Searching the first date with data for {weather_station_url} **")
+        finder = FirstDateFinder(probe, probes)
+        try:
+            first_date_with_data = finder.find(start_date, end_date)
+        except Exception as e:
+            print(f'Error searching first date: {e}')
+            first_date_with_data = None
 
-        print("\n** Initializing binary search to find the first date with data **")
-        first_date_with_data = Utils.first_data_url(date_arr, 0, n - 1)
-        return first_date_with_data
\ No newline at end of file
+        if first_date_with_data is None:
+            print(f'\nFirst date not found!')
+            return -1
+        print(f'First date found! {first_date_with_data} ({len(finder.results)} pages probed)')
+        return first_date_with_data
@@ -1,20 +1,29 @@
 # Made with love by Karl
 # Contact me on Telegram: @karlpy
 
-import requests
-import lxml.html as lh
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import config
 
-from util.Parser import Parser
 from util.Utils import Utils
+from util.UnitConverter import ConvertToSystem
+from util.ObservationStore import ObservationStore
+from util.ObservationDB import ObservationDB
+from util.ParsePool import ParsePool
+from util.Aggregate import Aggregate
+from util.ProgressStore import ProgressStore
+from util.Metrics import metrics
+from util.JsonHistory import JsonHistory
+from util.Intraday import Intraday
 from util.JsonExtractor import JsonExtractor
 from util.GitHelper import GitHelper
 
 # configuration
-stations_file = open('stations.txt', 'r')
-URLS = stations_file.readlines()
+# one station url per line, read by read_stations (not at import, so the module can be used as a library)
+STATIONS_FILE = 'stations.txt'
 # Date format: YYYY-MM-DD
 START_DATE = config.START_DATE
 END_DATE = config.END_DATE
@@ -22,87 +31,360 @@ END_DATE = config.END_DATE
 FIND_FIRST_DATE = config.FIND_FIRST_DATE
 # output directory for JSON files
 OUTPUT_DIR = config.OUTPUT_DIR
+# also write index-<date>.json with the summaries of all stations
+OUTPUT_INDEX = config.OUTPUT_INDEX
+# git publish mode and push retries
+GIT_PUBLISH = config.GIT_PUBLISH
+GIT_PUSH_RETRIES = config.GIT_PUSH_RETRIES
+# number of stations scraped in parallel
+MAX_WORKERS = config.MAX_WORKERS
+# number of dates fetched in parallel per station
+DATE_WINDOW = config.DATE_WINDOW
+# "daily", "weekly" or "monthly" history pages
+FETCH_MODE = config.FETCH_MODE
+# "html" or "json" source of every station, STATION_SOURCES overrides it per station
+SOURCE = config.SOURCE
+STATION_SOURCES = config.STATION_SOURCES
+JSON_HISTORY = JsonHistory.from_config()
+# parse processes fed by the fetching threads (PARSE_PROCESSES = 0 parses in the fetching threads)
+PARSE_POOL = ParsePool.from_config()
+# columnar store of the 5-minute observation rows (None = summaries only)
+OBSERVATION_STORE = ObservationStore(config.OBSERVATION_STORE_DIR) if config.OBSERVATION_STORE_DIR else None
+# indexed database of daily summaries and observation rows (None = no database),
+# opened by open_stores() so importing the module creates no files
+OBSERVATION_DB_PATH = config.OBSERVATION_DB
+OBSERVATION_DB = None
+CONVERTER = ConvertToSystem(config.UNIT_SYSTEM)
+# per-date progress of every station, so interrupted runs can resume (opened by open_stores())
+PROGRESS_DB = config.PROGRESS_DB
+PROGRESS = None
+# skip dates already scraped successfully by an earlier run
+RESUME = config.RESUME
+# run report (JSON + Prometheus textfile) directory (None = no report)
+METRICS_DIR = config.METRICS_DIR
+# station id scraped under cProfile/tracemalloc (None = no profiling)
+PROFILE_STATION = config.PROFILE_STATION
 
 
-def scrap_station(weather_station_url):
+_stores_lock = threading.Lock()
+
+
+def open_stores():
+    """Opens PROGRESS and OBSERVATION_DB on first use, when configured."""
+    global PROGRESS, OBSERVATION_DB
+    with _stores_lock:
+        if PROGRESS is None and PROGRESS_DB:
+            PROGRESS = ProgressStore(PROGRESS_DB)
+        if OBSERVATION_DB is None and OBSERVATION_DB_PATH:
+            OBSERVATION_DB = ObservationDB(OBSERVATION_DB_PATH, CONVERTER.system)
+
+
+def scrap_day(session, url, date_string=None, timeout=None, source='html'):
+    """
+    Fetches one day of the "html" (history page) or "json" (PWS history API) source
+    and extracts its summary statistics.
+    Returns (daily_summary, observations); observations are the converted
+    history table rows when OBSERVATION_STORE or OBSERVATION_DB is set, None otherwise.
+    Raises on network errors and HTTP error statuses.
+    """
+    # Fetch in this thread (old days are served from the page cache), parse in PARSE_POOL;
+    # the slot waits for the parse processes before fetching when they are behind
+    with PARSE_POOL.slot():
+        if source == 'json':
+            content = JSON_HISTORY.fetch(session, url, timeout)
+        else:
+            content = Utils.cache.fetch(session, url, timeout)
+        with metrics.timer('parse_seconds'):
+            daily_summary, columns = PARSE_POOL.run(ParsePool.parse_day, source, content, date_string,
+                                                    CONVERTER.system,
+                                                    OBSERVATION_STORE is not None or OBSERVATION_DB is not None)
+    metrics.count('summary_values_total', sum(value is not None for value in daily_summary.values()))
+
+    observations = None
+    if columns is not None:
+        observations = ConvertToSystem.rows_from_columns(columns)
+        metrics.count('rows_extracted_total', len(observations))
+    return daily_summary, observations
+
+
+def scrap_range(session, url, start_string, timeout=None):
+    """
+    Fetches one weekly/monthly history page and splits its table into days.
+    Returns {date_string: daily_summary} for every day row of the page.
+    Raises on network errors and HTTP error statuses.
+    """
+    with PARSE_POOL.slot():
+        content = Utils.cache.fetch(session, url, timeout)
+        with metrics.timer('parse_seconds'):
+            summaries = PARSE_POOL.run(ParsePool.parse_range, content, start_string, FETCH_MODE)
+    metrics.count('summary_values_total', sum(value is not None for summary in summaries.values()
+                                              for value in summary.values()))
+    return summaries
+
+
+def scrap_today(weather_station_url, intraday, day, timeout=None):
+    """
+    Fetches the history page of day (the current day of the station) and merges
+    the rows added since the last call into intraday, an Intraday.
+    Returns the updated daily summary, None when the page has no new rows.
+    Raises on network errors and HTTP error statuses.
+    """
+    weather_station_url = weather_station_url.strip()
+    station_name = weather_station_url.split('/')[-1]
+    date_string, url = next(Utils.date_url_generator(weather_station_url, day, day))
+    with PARSE_POOL.slot():
+        content = Utils.cache.fetch(Utils.session, url, timeout)
+
+        # an unchanged page (e.g. revalidated with a 304) is not parsed again
+        digest = Intraday.digest(content)
+        state = intraday.state(station_name, date_string)
+        if state['digest'] == digest:
+            metrics.count('intraday_pages_total', status='unchanged')
+            return None
+        with metrics.timer('parse_seconds'):
+            columns, last_minute = PARSE_POOL.run(ParsePool.parse_new_rows, content, date_string,
+                                                  state['last_minute'])
+    metrics.count('intraday_pages_total', status='updated' if columns else 'no_new_rows')
+    if columns:
+        metrics.count('intraday_rows_total', len(columns.get('Time', ())))
+    return intraday.add(station_name, date_string, digest, columns, last_minute)
+
+
+def has_data(daily_summary):
+    """Whether a day has data; days of pages without data yet have a summary of None values."""
+    return daily_summary is not None and any(value is not None for value in daily_summary.values())
+
+
+def scrap_days(weather_station_url, start_date, end_date, date_window=None, stored_summaries=None):
+    """
+    Scrapes the days from start_date to end_date of a station and yields
+    (date_string, daily_summary, error) in date order, exactly one of daily_summary
+    and error set. Observations and progress are recorded as days come in.
+    Days in stored_summaries are not fetched again.
+    """
+    open_stores()
+    date_window = date_window or DATE_WINDOW
+    # keep-alive connections are shared with every other station
+    session = Utils.session
+    station_name = weather_station_url.split('/')[-1]
+    source = STATION_SOURCES.get(station_name, SOURCE)
+    stored_summaries = stored_summaries or {}
+
+    def fetch(date_url):
+        date_string, url = date_url
+        if date_string in stored_summaries:
+            return stored_summaries[date_string], None
+        print(f'Scraping data from {url}')
+        return scrap_day(session, url, date_string, source=source)
+
+    def fetch_range(date_range):
+        start_string, end_string, url = date_range
+        days = range_days(start_string, end_string)
+        if all(day in stored_summaries for day in days):
+            return {day: stored_summaries[day] for day in days}
+        print(f'Scraping data from {url}')
+        return scrap_range(session, url, start_string)
+
+    def range_results():
+        # splits every range page into the (date_url, result, error) tuples of its days
+        range_gen = Utils.range_url_generator(weather_station_url, start_date, end_date, FETCH_MODE)
+        for (start_string, end_string, url), summaries, error in Utils.windowed_map(fetch_range, range_gen, date_window):
+            for day in range_days(start_string, end_string):
+                if error is not None:
+                    yield (day, url), None, error
+                elif day in stored_summaries:
+                    yield (day, url), (stored_summaries[day], None), None
+                elif day not in summaries:
+                    # the page is incomplete (or not the expected table), the day is retried
+                    yield (day, url), None, LookupError(f'no row for {day} in the history table')
+                else:
+                    yield (day, url), (summaries[day], None), None
+
+    if source == 'json':
+        # the API serves one day per request, FETCH_MODE only applies to history pages
+        url_gen = JSON_HISTORY.date_url_generator(station_name, start_date, end_date)
+        day_results = Utils.windowed_map(fetch, url_gen, date_window)
+    elif FETCH_MODE == 'daily':
+        url_gen = Utils.date_url_generator(weather_station_url, start_date, end_date)
+        day_results = Utils.windowed_map(fetch, url_gen, date_window)
+    else:
+        day_results = range_results()
+
+    # Dates are fetched date_window at a time but reduced in date order
+    for (date_string, url), result, error in day_results:
+        if error is not None:
+            print(f'Error scraping {url}: {error}')
+            metrics.count('days_total', status='failed')
+            metrics.count('errors_total', type=type(error).__name__)
+            if PROGRESS is not None:
+                PROGRESS.record_failure(station_name, date_string, error)
+            yield date_string, None, error
+            continue
+        daily_summary, observations = result
+        # a page without data yet (or a day missing from a range table) is not recorded as
+        # scraped, so it is fetched again instead of being resumed as an empty day
+        day_has_data = has_data(daily_summary)
+        metrics.count('days_total', status='resumed' if date_string in stored_summaries else
+                      'ok' if day_has_data else 'empty')
+
+        # Rows are appended in date order, the store replaces rows it already has
+        if observations and OBSERVATION_STORE is not None:
+            OBSERVATION_STORE.append(station_name, observations)
+        if date_string not in stored_summaries:
+            if day_has_data and OBSERVATION_DB is not None:
+                with metrics.timer('observation_db_seconds'):
+                    OBSERVATION_DB.upsert_day(station_name, date_string, daily_summary, observations)
+            if PROGRESS is not None:
+                if day_has_data:
+                    PROGRESS.record_success(station_name, date_string, daily_summary)
+                else:
+                    PROGRESS.record_missing(station_name, date_string)
+
+        print(f'Extracted summary for {date_string}: MaxTemp={daily_summary["MaxTemp"]}, MinTemp={daily_summary["MinTemp"]}, MaxGust={daily_summary["MaxGust"]}, SumPrec={daily_summary["SumPrec"]}')
+        yield date_string, daily_summary, None
+
+
+def read_stations(path=None):
+    """Returns the station urls of path (default STATIONS_FILE), one per non-empty line."""
+    with open(path or STATIONS_FILE, 'r') as stations_file:
+        return [url.strip() for url in stations_file if url.strip()]
+
+
+def scrap_station(weather_station_url, date_window=None, start_date=None, end_date=None, resume=None):
     """
     Scrapes weather summary statistics from a weather station URL.
-    Extracts data directly from webpage summary tables and saves to JSON.
+    Extracts data directly from webpage summary tables and returns the
+    summary of the whole date range, saved to JSON by save_stations.
+    date_window overrides DATE_WINDOW, the number of dates fetched in parallel;
+    start_date, end_date and resume override START_DATE, END_DATE and RESUME.
     """
-    session = requests.Session()
-    timeout = 5
-    global START_DATE
-    global END_DATE
-    global FIND_FIRST_DATE
+    # stations run concurrently, so the dates are kept per station
+    start_date = start_date or START_DATE
+    end_date = end_date or END_DATE
+    resume = RESUME if resume is None else resume
+    open_stores()
 
     if FIND_FIRST_DATE:
         # find first date
-        first_date_with_data = Utils.find_first_data_entry(weather_station_url=weather_station_url, start_date=START_DATE)
+        first_date_with_data = Utils.find_first_data_entry(weather_station_url=weather_station_url, start_date=start_date,
+                                                           end_date=end_date, session=Utils.session)
         # if first date found
         if(first_date_with_data != -1):
-            START_DATE = first_date_with_data
+            start_date = first_date_with_data
 
-    url_gen = Utils.date_url_generator(weather_station_url, START_DATE, END_DATE)
     station_name = weather_station_url.split('/')[-1]
 
-    # Track summary statistics across all dates
-    aggregated_summary = {
-        "MaxTemp": None,
-        "MinTemp": None,
-        "MaxGust": None,
-        "SumPrec": None
-    }
+    # Daily summaries of all dates, merged into the station summary at the end
+    daily_aggregate = Aggregate('day')
+    failed_dates = []
+
+    # summaries of the dates an earlier run already scraped
+    stored_summaries = {}
+    if resume and PROGRESS is not None:
+        stored_summaries = PROGRESS.completed(station_name, start_date, end_date)
+        if stored_summaries:
+            print(f'Resuming {station_name}: {len(stored_summaries)} date(s) already scraped')
+
+    for date_string, daily_summary, error in scrap_days(weather_station_url, start_date, end_date,
+                                                        date_window, stored_summaries):
+        if error is not None:
+            failed_dates.append((date_string, error))
+            continue
+        # Aggregate summary data across all dates
+        with metrics.timer('aggregate_seconds'):
+            daily_aggregate.add_daily_summary(date_string, daily_summary)
+
+    if failed_dates:
+        print(f'{len(failed_dates)} date(s) failed for {station_name}:')
+        for date_string, error in failed_dates:
+            print(f'  {date_string}: {type(error).__name__}: {error}')
+
+    # Highest/lowest temperature, highest gust and total precipitation of all dates
+    return daily_aggregate.rollup(None).values('all')
+
+
+def range_days(start_string, end_string):
+    """Date strings from start_string to end_string, both included."""
+    start = datetime.strptime(start_string, '%Y-%m-%d').date()
+    end = datetime.strptime(end_string, '%Y-%m-%d').date()
+    return [day.strftime('%Y-%m-%d') for day in Utils.date_range_generator(start, end)]
 
-    for date_string, url in url_gen:
-        try:
-            print(f'Scraping data from {url}')
-
-            # Fetch the webpage
-            html_string = session.get(url, timeout=timeout)
-            doc = lh.fromstring(html_string.content)
-
-            # Extract summary statistics from the page
-            daily_summary = Parser.parse_summary_table(doc)
-
-            # Aggregate summary data across all dates
-            if daily_summary["MaxTemp"] is not None:
-                if aggregated_summary["MaxTemp"] is None or daily_summary["MaxTemp"] > aggregated_summary["MaxTemp"]:
-                    aggregated_summary["MaxTemp"] = daily_summary["MaxTemp"]
-            if daily_summary["MinTemp"] is not None:
-                if aggregated_summary["MinTemp"] is None or daily_summary["MinTemp"] < aggregated_summary["MinTemp"]:
-                    aggregated_summary["MinTemp"] = daily_summary["MinTemp"]
-            if daily_summary["MaxGust"] is not None:
-                if aggregated_summary["MaxGust"] is None or daily_summary["MaxGust"] > aggregated_summary["MaxGust"]:
-                    aggregated_summary["MaxGust"] = daily_summary["MaxGust"]
-            if daily_summary["SumPrec"] is not None:
-                if aggregated_summary["SumPrec"] is None or daily_summary["SumPrec"] > aggregated_summary["SumPrec"]:
-                    aggregated_summary["SumPrec"] = daily_summary["SumPrec"]
-
-            print(f'Extracted summary: MaxTemp={daily_summary["MaxTemp"]}, MinTemp={daily_summary["MinTemp"]}, MaxGust={daily_summary["MaxGust"]}, SumPrec={daily_summary["SumPrec"]}')
 
+def scrap_stations(urls, max_workers=MAX_WORKERS, start_date=None, end_date=None, resume=None):
+    """
+    Scrapes all stations concurrently on a bounded thread pool.
+    Returns (station name, summary) of every station in the same order as urls
+    (summary None for stations that failed).
+    start_date, end_date and resume are passed on to scrap_station.
+    """
+    urls = [url.strip() for url in urls if url.strip()]
+    if not urls:
+        return []
+
+    def scrap(url):
+        print(url)
+        station_name = url.split('/')[-1]
+        try:
+            with metrics.timer('station_seconds'):
+                if PROFILE_STATION and station_name == PROFILE_STATION:
+                    # dates run in this thread so the profile sees the whole station
+                    return station_name, metrics.profile(METRICS_DIR or '.', station_name, scrap_station, url,
+                                                         date_window=1, start_date=start_date, end_date=end_date,
+                                                         resume=resume)
+                return station_name, scrap_station(url, start_date=start_date, end_date=end_date, resume=resume)
         except Exception as e:
-            print(f'Error scraping {url}: {e}')
+            print(f'Error scraping station {url}: {e}')
+            metrics.count('errors_total', type=type(e).__name__)
+            return station_name, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        return list(executor.map(scrap, urls))
+
+
+def save_stations(results, output_dir=None, end_date=None):
+    """
+    Saves the summaries returned by scrap_stations in one batch, named after
+    end_date (default END_DATE).
+    Returns the JSON files whose content changed.
+    """
+    print(f'Saving summary statistics to JSON for {sum(summary is not None for _, summary in results)} station(s)')
+    with metrics.timer('json_write_seconds'):
+        return JsonExtractor.save_summaries(dict(results), end_date or END_DATE, output_dir or OUTPUT_DIR,
+                                            index=OUTPUT_INDEX)
 
-    # Save aggregated summary statistics to JSON
-    print(f'Saving summary statistics to JSON for {station_name}')
-    json_file = JsonExtractor.save_summary_to_json(aggregated_summary, station_name, END_DATE, OUTPUT_DIR)
-    return json_file
 
+def export_stations(urls=None, start_date=None, end_date=None, output_dir=None):
+    """
+    Saves the JSON files of the stations (default: read_stations()) from OBSERVATION_DB
+    instead of scraping them: the summaries of start_date to end_date (default
+    START_DATE/END_DATE) come from one range query.
+    Returns the JSON files whose content changed.
+    """
+    open_stores()
+    if OBSERVATION_DB is None:
+        raise ValueError('OBSERVATION_DB is not configured')
+    stations = [url.split('/')[-1] for url in (read_stations() if urls is None else urls)]
+    with metrics.timer('observation_db_seconds'):
+        summaries = OBSERVATION_DB.summaries(start_date or START_DATE, end_date or END_DATE, stations)
+    return save_stations([(station, summaries.get(station)) for station in stations], output_dir, end_date)
 
-# Track created JSON files for git commit
-created_json_files = []
 
-for url in URLS:
-    url = url.strip()
-    print(url)
-    json_file = scrap_station(url)
-    if json_file:
+def publish(json_files, end_date=None):
+    """
+    Commits and pushes the given JSON files to the weather-game repository.
+    Returns True if there was nothing to publish or the push succeeded.
+    """
+    if not json_files:
+        print("\nNo JSON files changed.")
+        return True
+
+    # Only files whose content changed are committed
+    created_json_files = []
+    for json_file in json_files:
         # Get just the filename (not the full path) for git add
         json_filename = os.path.basename(json_file)
         created_json_files.append(os.path.join('backend', 'data', json_filename))
 
-# After all scraping is done, commit and push to weather-game repo
-if created_json_files:
     print("\n" + "="*80)
     print("Committing and pushing to weather-game repository...")
     print("="*80)
@@ -110,11 +392,44 @@ if created_json_files:
     # Get the weather-game repo path (one level up from current dir, then weather-game)
     weather_game_repo = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'weather-game')
 
-    success = GitHelper.commit_and_push(weather_game_repo, created_json_files, END_DATE)
+    if GIT_PUBLISH == 'plumbing':
+        success = GitHelper.publish(weather_game_repo, created_json_files, end_date or END_DATE, GIT_PUSH_RETRIES)
+    else:
+        success = GitHelper.commit_and_push(weather_game_repo, created_json_files, end_date or END_DATE)
 
     if success:
         print("\n✓ Successfully committed and pushed weather data!")
     else:
         print("\n✗ Failed to commit and push weather data. Please check errors above.")
-else:
-    print("\nNo JSON files were created.")
\ No newline at end of file
+    return success
+
+
+def run(urls=None, start_date=None, end_date=None, push=True):
+    """
+    Library entry point: scrapes the stations (default: read_stations()) from
+    start_date to end_date (default START_DATE/END_DATE), saves their JSON files
+    and publishes the changed ones unless push is False.
+    Returns (results of scrap_stations, changed JSON files).
+    Sessions, the page cache, PARSE_POOL and the stores stay warm between calls.
+    """
+    open_stores()
+    results = scrap_stations(read_stations() if urls is None else urls, start_date=start_date, end_date=end_date)
+    json_files = save_stations(results, end_date=end_date)
+    if push:
+        publish(json_files, end_date)
+    return results, json_files
+
+
+def main():
+    run()
+
+    PARSE_POOL.close()
+    # Keep the page cache within its configured limits
+    Utils.cache.evict()
+
+    if METRICS_DIR:
+        print(f'Run metrics written to {metrics.write(METRICS_DIR)}')
+
+
+if __name__ == '__main__':
+    main()